@@ -7,32 +7,62 @@ With i18n support (English/Italian)
 from qgis.PyQt.QtCore import (
     Qt, QTimer, pyqtSignal, QSize, QMimeData, QPoint, 
     QByteArray, QBuffer, QIODevice, QRectF, QTranslator,
-    QCoreApplication, QLocale, QSettings
+    QCoreApplication, QLocale, QSettings, QObject, QThread,
+    QAbstractListModel, QModelIndex, QVariant, QSizeF, QMarginsF,
+    QFileSystemWatcher
 )
 from qgis.PyQt.QtWidgets import (
     QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QListWidget, 
-    QListWidgetItem, QToolButton, QMenu, QAction, QInputDialog, 
+    QListWidgetItem, QToolButton, QMenu, QAction, QActionGroup, QInputDialog, 
     QMessageBox, QFileDialog, QApplication, QSizePolicy, QLabel,
     QFrame, QAbstractItemView, QStyle, QStyledItemDelegate,
     QLineEdit, QScrollArea, QGroupBox, QSplitter, QTabWidget,
     QTreeWidget, QTreeWidgetItem, QDialog, QDialogButtonBox,
-    QFormLayout, QComboBox, QSpinBox, QCheckBox, QWidgetAction
+    QFormLayout, QComboBox, QSpinBox, QCheckBox, QWidgetAction,
+    QGridLayout, QListView, QProgressDialog
 )
 from qgis.PyQt.QtGui import (
     QIcon, QColor, QPixmap, QPainter, QFont, QBrush, QPen,
-    QImage, QDrag, QPainterPath
+    QImage, QDrag, QPainterPath, QPdfWriter, QPageSize
 )
 from qgis.core import (
     QgsProject, QgsApplication, Qgis, QgsCoordinateReferenceSystem,
     QgsRectangle, QgsMapSettings, QgsMapRendererParallelJob,
     QgsMapRendererSequentialJob, QgsBookmarkManager, QgsBookmark,
-    QgsReferencedRectangle
+    QgsReferencedRectangle, QgsMapRendererCustomPainterJob, QgsTask,
+    QgsCoordinateTransform, QgsCsException, QgsSpatialIndex, QgsFeature,
+    QgsGeometry, QgsPointXY, QgsVectorLayer, QgsVectorFileWriter,
+    QgsFields, QgsField, QgsWkbTypes, QgsProviderRegistry, QgsDataProvider,
+    QgsDataSourceUri, QgsMessageLog, QgsReadWriteContext
 )
+from qgis.PyQt.QtXml import QDomDocument
 from qgis.gui import QgsMapCanvas
 import os
+import csv
 import json
 import tempfile
 import shutil
+import socket
+import sqlite3
+import hashlib
+import threading
+import zipfile
+import zlib
+import time
+import sys
+import re
+import base64
+import bisect
+import math
+import itertools
+import argparse
+import ctypes
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape as xml_escape, unescape as xml_unescape
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 from pathlib import Path
 from datetime import datetime
 
@@ -74,6 +104,10 @@ class Sketchy:
             'Sync': 'Sincronizza',
             'Sync extent to all projects': 'Sincronizza estensione a tutti i progetti',
             'Extent synced to {0} projects': 'Estensione sincronizzata a {0} progetti',
+            'Link': 'Collega',
+            'Linked navigation: follow this map in all linked projects': 'Navigazione collegata: segui questa mappa in tutti i progetti collegati',
+            'Linked navigation': 'Navigazione collegata',
+            'Each project in its own CRS': 'Ogni progetto nel proprio SR',
             
             # Bookmarks
             'Bookmarks': 'Segnalibri',
@@ -81,6 +115,93 @@ class Sketchy:
             'Add bookmark from current extent': 'Aggiungi segnalibro dall\'estensione corrente',
             'New bookmark': 'Nuovo segnalibro',
             'Go to': 'Vai a',
+            'Filter bookmarks...': 'Filtra segnalibri...',
+            'Import bookmarks...': 'Importa segnalibri...',
+            'Export bookmarks...': 'Esporta segnalibri...',
+            'Import bookmarks': 'Importa segnalibri',
+            'Export bookmarks': 'Esporta segnalibri',
+            '{0} bookmarks imported': '{0} segnalibri importati',
+            '{0} bookmarks exported': '{0} segnalibri esportati',
+            'Unsupported format': 'Formato non supportato',
+            'Missing columns': 'Colonne mancanti',
+            'Invalid bookmark': 'Segnalibro non valido',
+            'Invalid project': 'Progetto non valido',
+            'Catalog': 'Catalogo',
+            'Check datasources': 'Verifica sorgenti dati',
+            'Memory budget...': 'Budget di memoria...',
+            'Memory budget': 'Budget di memoria',
+            'Memory budget for all projects (MB, 0 = unlimited):': 'Budget di memoria per tutti i progetti (MB, 0 = illimitato):',
+            'Memory budget reached: thumbnails of inactive projects were released': 'Budget di memoria raggiunto: le miniature dei progetti inattivi sono state rilasciate',
+            'Panel ready in {0:.0f} ms (interface built in {1:.0f} ms)': 'Pannello pronto in {0:.0f} ms (interfaccia creata in {1:.0f} ms)',
+            'Copy selected layers here': 'Copia qui i layer selezionati',
+            'Move selected layers here': 'Sposta qui i layer selezionati',
+            '{0} has no stored state yet: activate it once first': '{0} non ha ancora uno stato salvato: attivalo prima una volta',
+            'Cannot transfer layers': 'Impossibile trasferire i layer',
+            '{0} layers moved to {1}': '{0} layer spostati in {1}',
+            '{0} layers copied to {1}': '{0} layer copiati in {1}',
+            'The layers are already in {0}': 'I layer sono già in {0}',
+            'Export all projects...': 'Esporta tutti i progetti...',
+            'Export all projects': 'Esporta tutti i progetti',
+            'Folder:': 'Cartella:',
+            'Format:': 'Formato:',
+            'Width (px):': 'Larghezza (px):',
+            'Height (px):': 'Altezza (px):',
+            'DPI:': 'DPI:',
+            'Parallel renders:': 'Rendering paralleli:',
+            'Also export every bookmark': 'Esporta anche ogni segnalibro',
+            'Exporting projects...': 'Esportazione progetti...',
+            '{0} files exported to {1}': '{0} file esportati in {1}',
+            'not exported: {0}': 'non esportati: {0}',
+            'Cancel': 'Annulla',
+            'Checking project files': 'Verifica file dei progetti',
+            'Reloaded after an external change: {0}': 'Ricaricati dopo una modifica esterna: {0}',
+            'Project changed on disk': 'Progetto modificato su disco',
+            '{0} was changed by another program.': '{0} è stato modificato da un altro programma.',
+            '{0} layers added, {1} removed, {2} changed.': '{0} layer aggiunti, {1} rimossi, {2} modificati.',
+            'Your unsaved changes to this project will be lost.': 'Le modifiche non salvate a questo progetto andranno perse.',
+            'Reload': 'Ricarica',
+            'Keep my version': 'Mantieni la mia versione',
+            'Uploading': 'Caricamento',
+            'Waiting': 'In attesa',
+            'Changed on the share': 'Modificato sulla condivisione',
+            'Upload failed': 'Caricamento non riuscito',
+            '{0} to sync': '{0} da sincronizzare',
+            '{0} need attention': '{0} richiedono attenzione',
+            'Uploaded': 'Caricato',
+            'Upload failed, retrying later': 'Caricamento non riuscito, nuovo tentativo più tardi',
+            'Workspace saved, uploading in the background': 'Workspace salvato, caricamento in background',
+            'Workspace changed on the share': 'Workspace modificato sulla condivisione',
+            '{0} was changed by someone else since you opened or saved it.': '{0} è stato modificato da qualcun altro dopo che lo hai aperto o salvato.',
+            'Your version is kept locally until you decide.': 'La tua versione resta salvata in locale finché non decidi.',
+            'Overwrite': 'Sovrascrivi',
+            'Keep their version': 'Mantieni la loro versione',
+            'Decide later': 'Decidi più tardi',
+            'No templates': 'Nessun modello',
+            'Save as template...': 'Salva come modello...',
+            'Save as template': 'Salva come modello',
+            'Delete template': 'Elimina modello',
+            'Template name:': 'Nome del modello:',
+            "Replace the template '{0}'?": "Sostituire il modello '{0}'?",
+            "Delete the template '{0}'?": "Eliminare il modello '{0}'?",
+            'Template saved': 'Modello salvato',
+            'Closed': 'Chiuso',
+            'Ctrl+Shift+T to reopen': 'Ctrl+Maiusc+T per riaprire',
+            'Reopened': 'Riaperto',
+            'Reopen closed project': 'Riapri progetto chiuso',
+            'Recently closed': 'Chiusi di recente',
+            'No closed projects': 'Nessun progetto chiuso',
+            'Switch project': 'Cambia progetto',
+            'Modified': 'Modificato',
+            'Switch project backwards': 'Cambia progetto all\'indietro',
+            'Checking datasources': 'Verifica sorgenti dati in corso',
+            'Missing file': 'File mancante',
+            'Indexing projects': 'Indicizzazione progetti',
+            'Add folder to catalog...': 'Aggiungi cartella al catalogo...',
+            '{0} projects indexed': '{0} progetti indicizzati',
+            'Bookmarks in view...': 'Segnalibri nella vista...',
+            'Go to nearest bookmark': 'Vai al segnalibro più vicino',
+            'No bookmarks in view': 'Nessun segnalibro nella vista',
+            '... and {0} more': '... e altri {0}',
             'bookmark': 'segnalibro',
             'bookmarks': 'segnalibri',
             
@@ -124,137 +245,4520 @@ class Sketchy:
             'There are unsaved projects. Close anyway?': 'Ci sono progetti non salvati. Chiudere comunque?',
             'Cannot open': 'Impossibile aprire',
             'Cannot load': 'Impossibile caricare',
+            'Cannot save': 'Impossibile salvare',
+            'Bookmark': 'Segnalibro',
+            
+            # Storage
+            'Snapshot storage': 'Archiviazione snapshot',
+            'Disk': 'Disco',
+            'RAM disk (tmpfs)': 'Disco RAM (tmpfs)',
+            'Memory': 'Memoria',
+            'Uncompressed snapshots (.qgs)': 'Snapshot non compressi (.qgs)',
+            'Memory quota...': 'Quota di memoria...',
+            'Memory quota (MB):': 'Quota di memoria (MB):',
+            'Storage settings apply the next time the panel is opened': 'Le impostazioni di archiviazione si applicano alla prossima apertura del pannello',
+            
+            # Background open
+            'Preparing project': 'Preparazione progetto',
+            'Loading project': 'Caricamento progetto',
+            'Loading...': 'Caricamento...',
+            'Opened {0} projects': 'Aperti {0} progetti',
+            'Rendering thumbnail': 'Generazione anteprima',
+            
+            # Comparison
+            'Compare projects...': 'Confronta progetti...',
+            'Compare projects': 'Confronta progetti',
+            'Select 2 to 9 projects to compare': 'Seleziona da 2 a 9 progetti da confrontare',
+            'Zoom to canvas extent': 'Zoom all\'estensione della mappa',
         }
     }
     
     _current_locale = None
     
     @classmethod
-    def get_locale(cls):
-        if cls._current_locale is None:
-            locale = QSettings().value('locale/userLocale', 'en_US')
-            cls._current_locale = locale[0:2] if locale else 'en'
-        return cls._current_locale
+    def get_locale(cls):
+        if cls._current_locale is None:
+            locale = QSettings().value('locale/userLocale', 'en_US')
+            cls._current_locale = locale[0:2] if locale else 'en'
+        return cls._current_locale
+    
+    @classmethod
+    def translate(cls, message):
+        locale = cls.get_locale()
+        if locale in cls._translations and message in cls._translations[locale]:
+            return cls._translations[locale][message]
+        return message
+
+
+def tr(message):
+    """Translate a string using the current locale."""
+    return Sketchy.translate(message)
+
+
+SETTINGS_PREFIX = "MultiProjectCanvas/"
+
+
+def setting(key, default, value_type=str):
+    """Read a plugin setting."""
+    return QSettings().value(SETTINGS_PREFIX + key, default, type=value_type)
+
+
+def set_setting(key, value):
+    """Store a plugin setting."""
+    QSettings().setValue(SETTINGS_PREFIX + key, value)
+
+
+def remove_project_file(file_path):
+    """Remove a scratch project file together with its .qgz/.qgs/.qgd variants."""
+    base = os.path.splitext(file_path)[0]
+    for ext in (".qgz", ".qgs", ".qgd"):
+        if os.path.exists(base + ext):
+            try:
+                os.remove(base + ext)
+            except OSError:
+                pass
+
+
+def format_size(num_bytes):
+    """Human readable byte count"""
+    for unit in ("B", "KB", "MB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024.0
+    return f"{num_bytes:.1f} GB"
+
+
+class ThumbnailGenerator:
+    """Generates project thumbnails"""
+    
+    SIZE = QSize(180, 120)
+    
+    @staticmethod
+    def generate(project, canvas, size=QSize(180, 120)):
+        image = QImage(size, QImage.Format_ARGB32)
+        image.fill(QColor(255, 255, 255))
+        
+        settings = QgsMapSettings()
+        settings.setOutputSize(size)
+        settings.setDestinationCrs(canvas.mapSettings().destinationCrs())
+        settings.setExtent(canvas.extent())
+        settings.setLayers(canvas.layers())
+        settings.setBackgroundColor(QColor(255, 255, 255))
+        
+        job = QgsMapRendererSequentialJob(settings)
+        job.start()
+        job.waitForFinished()
+        
+        return QPixmap.fromImage(job.renderedImage())
+    
+    @staticmethod
+    def render_image(layers, crs, extent=None, size=QSize(180, 120), dpi=None):
+        """Render layers synchronously into a QImage (usable from worker threads)"""
+        image = QImage(size, QImage.Format_ARGB32_Premultiplied)
+        image.fill(QColor(255, 255, 255))
+        
+        settings = QgsMapSettings()
+        settings.setOutputSize(size)
+        if dpi:
+            settings.setOutputDpi(dpi)
+            image.setDotsPerMeterX(round(dpi / 0.0254))
+            image.setDotsPerMeterY(round(dpi / 0.0254))
+        settings.setDestinationCrs(crs)
+        settings.setLayers(layers)
+        settings.setExtent(extent if extent is not None and not extent.isEmpty() else settings.fullExtent())
+        settings.setBackgroundColor(QColor(255, 255, 255))
+        
+        painter = QPainter(image)
+        job = QgsMapRendererCustomPainterJob(settings, painter)
+        job.renderSynchronously()
+        painter.end()
+        return image
+    
+    @classmethod
+    def render_project_file(cls, file_path, metadata=None, size=QSize(180, 120)):
+        """Render a project file with a standalone QgsProject, or return None"""
+        project = QgsProject()
+        try:
+            if not project.read(file_path, QgsProject.FlagDontLoadLayouts):
+                return None
+            layers = project.layerTreeRoot().checkedLayers()
+            if not layers:
+                return None
+            crs = project.crs()
+            extent = None
+            if metadata:
+                if metadata.get('crs'):
+                    crs = QgsCoordinateReferenceSystem(metadata['crs'])
+                if metadata.get('extent'):
+                    extent = QgsRectangle(*metadata['extent'])
+            return cls.render_image(layers, crs, extent, size)
+        finally:
+            project.clear()
+    
+    @classmethod
+    def render_project_extents(cls, file_path, extents, size, is_canceled=None, dpi=None, write=None):
+        """Render several (key, extent, crs) views of one project file, read once
+        
+        A None extent renders the full extent of the visible layers. With
+        write, each image is passed to write(key, image) as soon as it is
+        rendered and only its result is kept, so large images do not pile up.
+        """
+        project = QgsProject()
+        images = {}
+        try:
+            if not project.read(file_path, QgsProject.FlagDontLoadLayouts):
+                return images
+            layers = project.layerTreeRoot().checkedLayers()
+            if not layers:
+                return images
+            for key, extent, crs in extents:
+                if is_canceled and is_canceled():
+                    break
+                image = cls.render_image(
+                    layers, QgsCoordinateReferenceSystem(crs) if crs else project.crs(),
+                    QgsRectangle(*extent) if extent else None, size, dpi
+                )
+                images[key] = write(key, image) if write else image
+            return images
+        finally:
+            project.clear()
+
+
+class ProjectXmlReader:
+    """Metadata-only parsing of .qgs/.qgz files, without loading any layer"""
+    
+    SUFFIXES = (".qgs", ".qgz")
+    
+    @staticmethod
+    def read_xml(file_path):
+        if zipfile.is_zipfile(file_path):
+            with zipfile.ZipFile(file_path) as zf:
+                for name in zf.namelist():
+                    if name.lower().endswith(".qgs"):
+                        return zf.read(name)
+            raise ValueError(f"No .qgs document in {file_path}")
+        with open(file_path, "rb") as f:
+            return f.read()
+    
+    @classmethod
+    def read(cls, file_path):
+        return cls.parse(cls.read_xml(file_path))
+    
+    @staticmethod
+    def _extent(element):
+        if element is None:
+            return None
+        try:
+            values = [float(element.findtext(k)) for k in ('xmin', 'ymin', 'xmax', 'ymax')]
+        except (TypeError, ValueError):
+            return None
+        if values[0] == values[2] or values[1] == values[3]:
+            return None
+        return values
+    
+    @classmethod
+    def parse(cls, xml_data):
+        root = ET.fromstring(xml_data)
+        if root.tag != 'qgis':
+            raise ValueError("Not a QGIS project")
+        
+        metadata = {
+            'title': root.findtext('title') or root.get('projectname', ''),
+            'version': root.get('version', ''),
+            'crs': root.findtext('projectCrs/spatialrefsys/authid'),
+            'extent': None,
+            'layers': [],
+            'groups': [
+                node.get('name') for node in root.iter('layer-tree-group') if node.get('name')
+            ],
+            'bookmarks': [
+                node.get('name') for node in root.iter('Bookmark') if node.get('name')
+            ],
+        }
+        
+        canvas = root.find("mapcanvas[@name='theMapCanvas']")
+        if canvas is None:
+            canvas = root.find('mapcanvas')
+        if canvas is not None:
+            metadata['extent'] = cls._extent(canvas.find('extent'))
+            metadata['crs'] = canvas.findtext('destinationsrs/spatialrefsys/authid') or metadata['crs']
+        
+        checked = {
+            node.get('id') for node in root.iter('layer-tree-layer')
+            if node.get('checked') == 'Qt::Checked'
+        }
+        for element in root.findall('projectlayers/maplayer'):
+            layer_id = element.findtext('id')
+            metadata['layers'].append({
+                'id': layer_id,
+                'name': element.findtext('layername') or '',
+                'type': element.get('type', ''),
+                'provider': element.findtext('provider') or '',
+                'source': element.findtext('datasource') or '',
+                'visible': layer_id in checked,
+                'fields': [
+                    field.get('name') for field in element.findall('fieldConfiguration/field')
+                    if field.get('name')
+                ],
+            })
+        return metadata
+    
+    @staticmethod
+    def layer_digests(xml_data):
+        """{layer id: (name, hash of its <maplayer> element)}, to tell which layers changed"""
+        root = ET.fromstring(xml_data)
+        return {
+            element.findtext('id'): (
+                element.findtext('layername') or '',
+                hashlib.sha1(ET.tostring(element)).hexdigest()
+            )
+            for element in root.findall('projectlayers/maplayer')
+        }
+
+
+class LayerTransfer:
+    """Copies layers of the live project into the stored XML of another project
+    
+    Layers are serialized with writeLayerXml, which keeps their style,
+    subset string and joins, and spliced into the receiving document as
+    text: no provider is opened, and since snapshots are chunked at
+    <maplayer> boundaries only the chunks around the insertion points change.
+    """
+    
+    MIME_TYPE = "application/qgis.layertreemodeldata"
+    
+    @staticmethod
+    def layer_ids_from_mime(data):
+        """Ids of the layers in layer tree drag data, groups included"""
+        try:
+            root = ET.fromstring(bytes(data))
+        except ET.ParseError:
+            return []
+        return [node.get('id') for node in root.iter('layer-tree-layer') if node.get('id')]
+    
+    @staticmethod
+    def with_join_layers(project, layers):
+        """The layers followed by the layers their vector joins read from"""
+        result = list(layers)
+        seen = {layer.id() for layer in result}
+        for layer in result:
+            if not isinstance(layer, QgsVectorLayer):
+                continue
+            for join in layer.vectorJoins():
+                join_layer = project.mapLayer(join.joinLayerId())
+                if join_layer is not None and join_layer.id() not in seen:
+                    seen.add(join_layer.id())
+                    result.append(join_layer)
+        return result
+    
+    @staticmethod
+    def serialize(project, layer):
+        """(layer id, <maplayer> XML, <layer-tree-layer> XML) of a live layer"""
+        # No document type: a <!DOCTYPE> line cannot be spliced into <projectlayers>
+        doc = QDomDocument()
+        element = doc.createElement("maplayer")
+        layer.writeLayerXml(element, doc, QgsReadWriteContext())
+        doc.appendChild(element)
+        
+        node = project.layerTreeRoot().findLayer(layer.id())
+        visible = node.isVisible() if node is not None else True
+        tree_node = ET.Element('layer-tree-layer', {
+            'id': layer.id(),
+            'name': layer.name(),
+            'source': layer.source(),
+            'providerKey': layer.providerType(),
+            'checked': "Qt::Checked" if visible else "Qt::Unchecked",
+            'expanded': "1",
+        })
+        return layer.id(), doc.toString(2).strip().encode('utf-8'), ET.tostring(tree_node)
+    
+    @staticmethod
+    def insert(xml_data, entries):
+        """Splice serialized layers into a project document; returns (xml, added ids)
+        
+        Layers whose id is already in the document are skipped. New layers
+        go on top of the layer tree, as QGIS does when adding layers.
+        """
+        existing = {layer['id'] for layer in ProjectXmlReader.parse(xml_data)['layers']}
+        entries = [entry for entry in entries if entry[0] not in existing]
+        if not entries:
+            return xml_data, []
+        
+        maplayers = b"".join(b"\n    " + entry[1] for entry in entries)
+        pos = xml_data.find(b"</projectlayers>")
+        if pos >= 0:
+            xml_data = xml_data[:pos].rstrip() + maplayers + b"\n  " + xml_data[pos:]
+        elif b"<projectlayers/>" in xml_data:
+            xml_data = xml_data.replace(
+                b"<projectlayers/>", b"<projectlayers>" + maplayers + b"\n  </projectlayers>", 1
+            )
+        else:
+            raise ValueError("No <projectlayers> in project document")
+        
+        tree_nodes = b"".join(b"\n    " + entry[2] for entry in entries)
+        match = re.search(rb"<layer-tree-group\b[^>]*?(/?)>", xml_data)
+        if match is None:
+            raise ValueError("No layer tree in project document")
+        if match.group(1):
+            open_tag = match.group(0)[:-2].rstrip() + b">"
+            xml_data = (xml_data[:match.start()] + open_tag + tree_nodes +
+                        b"\n  </layer-tree-group>" + xml_data[match.end():])
+        else:
+            xml_data = xml_data[:match.end()] + tree_nodes + xml_data[match.end():]
+        return xml_data, [entry[0] for entry in entries]
+
+
+class ProjectPrepareTask(QgsTask):
+    """Parses and validates a project file in the background"""
+    
+    prepared = pyqtSignal(object, bool)
+    
+    def __init__(self, file_path, share_cache=None):
+        super().__init__(f"{tr('Preparing project')}: {Path(file_path).name}", QgsTask.CanCancel)
+        self.file_path = file_path
+        self.share_cache = share_cache
+        self.local_path = file_path
+        self.metadata = None
+        self.error = None
+    
+    def run(self):
+        if self.share_cache is not None:
+            try:
+                self.local_path = self.share_cache.fetch(self.file_path)
+            except OSError:
+                self.local_path = self.file_path
+        try:
+            self.metadata = ProjectXmlReader.read(self.local_path)
+        except Exception as e:
+            self.error = str(e)
+            return False
+        return not self.isCanceled()
+    
+    def finished(self, result):
+        self.prepared.emit(self, bool(result))
+
+
+class CatalogIndexTask(QgsTask):
+    """Adds files, or a scanned folder, to the ProjectCatalog in the background"""
+    
+    done = pyqtSignal(object, bool)
+    
+    def __init__(self, catalog_path, paths=(), root=None):
+        super().__init__(tr("Indexing projects"), QgsTask.CanCancel)
+        self.catalog_path = catalog_path
+        self.paths = list(paths)
+        self.root = root
+        self.indexed = 0
+        self.error = None
+    
+    def run(self):
+        catalog = None
+        try:
+            catalog = ProjectCatalog(self.catalog_path)
+            if self.root:
+                self.indexed = catalog.scan(self.root, self.isCanceled, self.setProgress)
+            else:
+                self.indexed = catalog.index_paths(self.paths, self.isCanceled)
+            return not self.isCanceled()
+        except (OSError, sqlite3.Error) as e:
+            self.error = str(e)
+            return False
+        finally:
+            if catalog:
+                catalog.close()
+    
+    def finished(self, result):
+        self.done.emit(self, bool(result))
+
+
+class DatasourceHealth:
+    """Cached health checks of layer datasources
+    
+    Files are stat'ed and opened with their provider to time the open;
+    databases and web services get a plain TCP connection to their host as
+    a stand-in for a real login, made once per host and scan. Checks run
+    on a bounded thread pool and results are reused for ttl seconds.
+    """
+    
+    OK = 'ok'
+    SLOW = 'slow'
+    BROKEN = 'broken'
+    UNKNOWN = 'unknown'
+    
+    SLOW_SECONDS = 2.0
+    CONNECT_TIMEOUT = 3.0
+    MAX_WORKERS = 8
+    FILE_PROVIDERS = ('ogr', 'gdal', 'delimitedtext', 'spatialite', 'mdal', 'pdal', 'gpx')
+    DB_PORTS = {'postgres': 5432, 'postgresraster': 5432, 'mssql': 1433, 'oracle': 1521, 'hana': 30015, 'db2': 50000}
+    LOCAL_PROVIDERS = ('memory', 'virtual')
+    URL_RE = re.compile(r"""url=['"]?([^'"&\s]+)""")
+    
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._results = {}
+        self._lock = threading.Lock()
+    
+    def cached(self, provider, source):
+        with self._lock:
+            result = self._results.get((provider, source))
+        if result and time.time() - result['checked'] < self.ttl:
+            return result
+        return None
+    
+    @staticmethod
+    def file_path(provider, source, base_dir=None):
+        try:
+            path = QgsProviderRegistry.instance().decodeUri(provider, source).get('path')
+        except Exception:
+            path = None
+        path = path or source.split('|')[0]
+        if path.startswith('file:'):
+            path = urlsplit(path).path
+        if base_dir and not os.path.isabs(path):
+            path = os.path.normpath(os.path.join(base_dir, path))
+        return path
+    
+    def _connect(self, host, port):
+        started = time.monotonic()
+        try:
+            with socket.create_connection((host, port), self.CONNECT_TIMEOUT):
+                pass
+        except OSError as e:
+            return self.BROKEN, f"{host}:{port} {e}", time.monotonic() - started
+        seconds = time.monotonic() - started
+        return (self.SLOW if seconds > self.SLOW_SECONDS else self.OK), f"{host}:{port}", seconds
+    
+    def _check_file(self, provider, source, base_dir):
+        path = self.file_path(provider, source, base_dir)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return self.BROKEN, f"{tr('Missing file')}: {path}", 0.0
+        if not os.path.isabs(self.file_path(provider, source)):
+            # Relative sources cannot be opened outside of their project
+            return self.OK, f"{path} ({stat.st_size} B)", 0.0
+        
+        started = time.monotonic()
+        data_provider = QgsProviderRegistry.instance().createProvider(
+            provider, source, QgsDataProvider.ProviderOptions()
+        )
+        seconds = time.monotonic() - started
+        if data_provider is None or not data_provider.isValid():
+            return self.BROKEN, f"{tr('Cannot open')}: {path}", seconds
+        status = self.SLOW if seconds > self.SLOW_SECONDS else self.OK
+        return status, f"{path} ({stat.st_size} B, {seconds:.1f} s)", seconds
+    
+    def _host_of(self, provider, source):
+        if provider in self.DB_PORTS:
+            uri = QgsDataSourceUri(source)
+            if not uri.host():
+                return None
+            return uri.host(), int(uri.port() or self.DB_PORTS[provider])
+        match = self.URL_RE.search(source)
+        if match:
+            url = urlsplit(match.group(1).replace('%3A', ':').replace('%2F', '/'))
+            if url.hostname:
+                return url.hostname, url.port or (443 if url.scheme == 'https' else 80)
+        return None
+    
+    def check(self, provider, source, base_dir=None, host_check=None):
+        if provider in self.LOCAL_PROVIDERS:
+            status, message, seconds = self.OK, "", 0.0
+        elif provider in self.FILE_PROVIDERS:
+            status, message, seconds = self._check_file(provider, source, base_dir)
+        else:
+            host = self._host_of(provider, source)
+            if host is None:
+                status, message, seconds = self.UNKNOWN, "", 0.0
+            else:
+                status, message, seconds = (host_check or self._connect)(*host)
+        result = {'status': status, 'message': message, 'seconds': seconds, 'checked': time.time()}
+        with self._lock:
+            self._results[(provider, source)] = result
+        return result
+    
+    def check_all(self, sources, is_canceled=None):
+        """Check (provider, source, base dir) triples not checked within the TTL"""
+        pending = {}
+        for provider, source, base_dir in sources:
+            if (provider, source) not in pending and self.cached(provider, source) is None:
+                pending[(provider, source)] = base_dir
+        
+        hosts = {}
+        host_locks = {}
+        hosts_lock = threading.Lock()
+        
+        def host_check(host, port):
+            # One connection attempt per host, shared by all its layers
+            with hosts_lock:
+                lock = host_locks.setdefault((host, port), threading.Lock())
+            with lock:
+                if (host, port) not in hosts:
+                    hosts[(host, port)] = self._connect(host, port)
+                return hosts[(host, port)]
+        
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as pool:
+            futures = [
+                pool.submit(self.check, provider, source, base_dir, host_check)
+                for (provider, source), base_dir in pending.items()
+            ]
+            for future in futures:
+                if is_canceled and is_canceled():
+                    for other in futures:
+                        other.cancel()
+                    break
+                future.exception()
+        return len(pending)
+    
+    def summarize(self, layers):
+        """Worst status and problem list of a project's layers, from the cache"""
+        summary = {'status': self.OK, 'broken': 0, 'slow': 0, 'problems': []}
+        for layer in layers:
+            result = self.cached(layer['provider'], layer['source'])
+            if result is None:
+                continue
+            if result['status'] == self.BROKEN:
+                summary['broken'] += 1
+            elif result['status'] == self.SLOW:
+                summary['slow'] += 1
+            else:
+                continue
+            summary['problems'].append((layer['name'], result['status'], result['message']))
+        if summary['broken']:
+            summary['status'] = self.BROKEN
+        elif summary['slow']:
+            summary['status'] = self.SLOW
+        return summary
+
+
+class DatasourceScanTask(QgsTask):
+    """Checks the datasources of several project snapshots in the background"""
+    
+    done = pyqtSignal(object, bool)
+    
+    def __init__(self, health, specs):
+        super().__init__(tr("Checking datasources"), QgsTask.CanCancel)
+        self.health = health
+        self.specs = specs
+        self.summaries = {}
+        self.error = None
+    
+    def run(self):
+        try:
+            layers = {}
+            sources = []
+            for spec in self.specs:
+                if spec['manifest']:
+                    metadata = spec['store'].read_metadata(spec['manifest'])
+                elif spec['file']:
+                    metadata = ProjectXmlReader.read(spec['file'])
+                else:
+                    metadata = None
+                layers[spec['key']] = metadata['layers'] if metadata else []
+                sources.extend((l['provider'], l['source'], spec['base']) for l in layers[spec['key']])
+            
+            self.health.check_all(sources, self.isCanceled)
+            for key, project_layers in layers.items():
+                self.summaries[key] = self.health.summarize(project_layers)
+            return not self.isCanceled()
+        except Exception as e:
+            self.error = str(e)
+            return False
+    
+    def finished(self, result):
+        self.done.emit(self, bool(result))
+
+
+class FileCheckTask(QgsTask):
+    """Compares watched project files with their last known state in the background
+    
+    A file only counts as changed when its content hash differs; changed
+    files are chunked into the snapshot store here, off the GUI thread.
+    """
+    
+    done = pyqtSignal(object, bool)
+    
+    def __init__(self, store, entries):
+        super().__init__(tr("Checking project files"), QgsTask.CanCancel)
+        self.store = store
+        self.entries = entries
+        self.results = {}
+    
+    def run(self):
+        for path, known in self.entries:
+            if self.isCanceled():
+                return False
+            try:
+                self.results[path] = self._check(path, known)
+            except (OSError, ValueError, ET.ParseError, zipfile.BadZipFile):
+                self.results[path] = (known, None)
+        return True
+    
+    def _check(self, path, known):
+        stat = os.stat(path)
+        if known and (known['mtime'], known['size']) == (stat.st_mtime, stat.st_size):
+            return known, None
+        digest = ProjectCatalog._hash(path)
+        if known and known['hash'] == digest:
+            return dict(known, mtime=stat.st_mtime, size=stat.st_size), None
+        
+        xml_data = ProjectXmlReader.read_xml(path)
+        state = {
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'hash': digest,
+            'layers': ProjectXmlReader.layer_digests(xml_data),
+        }
+        if known is None:
+            return state, None
+        change = {
+            'manifest': self.store.ingest(path),
+            'metadata': ProjectXmlReader.parse(xml_data),
+            'diff': ProjectFileWatcher.diff(known['layers'], state['layers']),
+        }
+        return state, change
+    
+    def finished(self, result):
+        self.done.emit(self, bool(result))
+
+
+class ProjectFileWatcher(QObject):
+    """Watches the saved files of open projects for changes made elsewhere
+    
+    Notifications are debounced and checked by a FileCheckTask, so touches
+    that leave the content alone are ignored. A real change is reported
+    with changed(path, change), where change holds a retained snapshot
+    manifest, the new metadata and the layer diff; whoever handles it must
+    release the manifest. Files written by the dock itself are announced
+    with mark_saved() so they only move the baseline.
+    """
+    
+    DEBOUNCE_MS = 1000
+    
+    changed = pyqtSignal(str, object)
+    
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._on_file_changed)
+        self._states = {}
+        self._generations = {}
+        self._dirty = set()
+        self._task = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.DEBOUNCE_MS)
+        self._timer.timeout.connect(self._check)
+    
+    @staticmethod
+    def diff(old_layers, new_layers):
+        """Names of the added, removed and modified layers between two layer_digests()"""
+        return {
+            'added': [new_layers[i][0] for i in new_layers if i not in old_layers],
+            'removed': [old_layers[i][0] for i in old_layers if i not in new_layers],
+            'modified': [new_layers[i][0] for i in new_layers
+                         if i in old_layers and old_layers[i][1] != new_layers[i][1]],
+        }
+    
+    def set_paths(self, paths):
+        paths = {os.path.abspath(p) for p in paths if p}
+        for path in set(self._states) - paths:
+            del self._states[path]
+            self._generations.pop(path, None)
+            self._dirty.discard(path)
+            self.watcher.removePath(path)
+        added = paths - set(self._states)
+        for path in added:
+            self._states[path] = None
+            if os.path.exists(path):
+                self.watcher.addPath(path)
+        if added:
+            self._dirty.update(added)
+            self._timer.start()
+    
+    def mark_saved(self, path):
+        """The dock wrote path itself: take its new content as the baseline"""
+        path = os.path.abspath(path)
+        if path in self._states:
+            self._states[path] = None
+            self._generations[path] = self._generations.get(path, 0) + 1
+            self._dirty.add(path)
+            self._timer.start()
+    
+    def _on_file_changed(self, path):
+        if path in self._states:
+            self._dirty.add(path)
+            self._timer.start()
+    
+    def _check(self):
+        if self._task is not None:
+            self._timer.start()
+            return
+        entries = [(path, self._states[path]) for path in self._dirty if path in self._states]
+        self._dirty.clear()
+        if not entries:
+            return
+        generations = {path: self._generations.get(path, 0) for path, _known in entries}
+        self._task = FileCheckTask(self.store, entries)
+        self._task.done.connect(lambda task, ok: self._on_checked(task, generations))
+        QgsApplication.taskManager().addTask(self._task)
+    
+    def _on_checked(self, task, generations):
+        current = task is self._task
+        if current:
+            self._task = None
+        for path, (state, change) in task.results.items():
+            stale = (not current or path not in self._states or
+                     self._generations.get(path, 0) != generations[path])
+            if stale:
+                if change:
+                    self.store.release(change['manifest'])
+                continue
+            self._states[path] = state
+            # Editors that save by replacing the file drop it from the watcher
+            if os.path.exists(path) and path not in self.watcher.files():
+                self.watcher.addPath(path)
+            if change:
+                self.changed.emit(path, change)
+        if self._dirty:
+            self._timer.start()
+    
+    def stop(self):
+        self._timer.stop()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        files = self.watcher.files()
+        if files:
+            self.watcher.removePaths(files)
+
+
+class ShareUploadTask(QgsTask):
+    """Copies a workspace staged on local disk to its place on a share
+    
+    The chunk folder goes first, skipping chunks the share already holds,
+    and the workspace file last, so readers never see it point at missing
+    chunks. With a baseline (mtime_ns, size) the upload stops with conflict
+    set when the file on the share no longer matches it.
+    """
+    
+    done = pyqtSignal(object, bool)
+    
+    def __init__(self, staged, target, baseline=None):
+        super().__init__(f"{tr('Uploading')}: {Path(target).name}", QgsTask.CanCancel)
+        self.staged = staged
+        self.target = target
+        self.baseline = baseline
+        self.conflict = False
+        self.error = None
+    
+    @staticmethod
+    def remote_state(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    @staticmethod
+    def _copy(source, target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = target + ".part"
+        shutil.copyfile(source, partial)
+        os.replace(partial, target)
+    
+    def run(self):
+        try:
+            if self.baseline is not None and self.remote_state(self.target) not in (None, self.baseline):
+                self.conflict = True
+                return False
+            staged_dir = os.path.dirname(self.staged)
+            target_dir = os.path.dirname(self.target)
+            for dirpath, _dirs, files in os.walk(staged_dir):
+                for file_name in files:
+                    source = os.path.join(dirpath, file_name)
+                    if source == self.staged:
+                        continue
+                    target = os.path.join(target_dir, os.path.relpath(source, staged_dir))
+                    if not (os.path.exists(target) and os.path.getsize(target) == os.path.getsize(source)):
+                        self._copy(source, target)
+                    if self.isCanceled():
+                        return False
+            if self.baseline is not None and self.remote_state(self.target) not in (None, self.baseline):
+                self.conflict = True
+                return False
+            self._copy(self.staged, self.target)
+            self.baseline = self.remote_state(self.target)
+        except OSError as e:
+            self.error = str(e)
+            return False
+        return True
+    
+    def finished(self, result):
+        self.done.emit(self, bool(result))
+
+
+class ShareCache(QObject):
+    """Local read-through cache for projects and workspaces on network shares
+    
+    A file on a share is copied to a local folder under a key made of its
+    path, mtime and size, so reopening an unchanged file only costs a stat.
+    Relative file paths in cached project files are made absolute against
+    the share folder, since QGIS resolves them next to the file it reads.
+    Workspaces saved to a share are written to a local staging folder and
+    uploaded in the background; until then they are listed by pending(),
+    and an upload whose target changed since it was read or last written
+    stops as a conflict instead of overwriting it.
+    """
+    
+    NETWORK_FILESYSTEMS = ('cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'afpfs', 'fuse.sshfs', 'davfs', 'webdav')
+    RELATIVE_PATH = re.compile(rb'(?<=[">])(\.\.?/[^"<]*)')
+    RETRY_MS = 30000
+    
+    pending_changed = pyqtSignal()
+    uploaded = pyqtSignal(str)
+    conflict = pyqtSignal(str)
+    failed = pyqtSignal(str, str)
+    
+    def __init__(self, folder, max_mb=1024, roots=(), parent=None):
+        super().__init__(parent)
+        self.folder = folder
+        self.max_bytes = max_mb * 1024 * 1024
+        self.roots = [os.path.abspath(r.strip()) for r in roots if r.strip()]
+        self._mounts = None
+        self._pinned = frozenset()
+        self._lock = threading.Lock()
+        self._baselines = {}
+        self._uploads = {}
+        self._retry_timer = QTimer(self)
+        self._retry_timer.setSingleShot(True)
+        self._retry_timer.setInterval(self.RETRY_MS)
+        self._retry_timer.timeout.connect(self._retry_failed)
+    
+    @staticmethod
+    def default_folder():
+        return os.path.join(QgsApplication.qgisSettingsDirPath(), "multi_project_canvas", "share_cache")
+    
+    # Reading
+    
+    def _network_mounts(self):
+        if self._mounts is None:
+            mounts = []
+            try:
+                with open("/proc/mounts") as f:
+                    for line in f:
+                        fields = line.split()
+                        if len(fields) > 2 and fields[2] in self.NETWORK_FILESYSTEMS:
+                            mounts.append(fields[1].replace("\\040", " ").rstrip("/"))
+            except OSError:
+                pass
+            self._mounts = mounts
+        return self._mounts
+    
+    def is_remote(self, path):
+        """Whether path is on a share: a UNC path, a configured root or a network mount"""
+        path = os.path.abspath(path)
+        if path.startswith(("\\\\", "//")):
+            return True
+        for root in self.roots + self._network_mounts():
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return True
+        if os.name == "nt":
+            drive = os.path.splitdrive(path)[0]
+            return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4
+        return False
+    
+    @classmethod
+    def absolute_paths(cls, xml_data, base):
+        """Rewrite ./ and ../ file paths in project XML relative to the base folder"""
+        def absolute(match):
+            value = match.group(1).decode("utf-8")
+            split = re.search(r"[|?]", value)
+            path, rest = (value[:split.start()], value[split.start():]) if split else (value, "")
+            path = os.path.normpath(os.path.join(base, xml_unescape(path))).replace(os.sep, "/")
+            return (xml_escape(path, {'"': "&quot;"}) + rest).encode("utf-8")
+        return cls.RELATIVE_PATH.sub(absolute, xml_data)
+    
+    def _localize(self, source, target):
+        base = os.path.dirname(os.path.abspath(source))
+        suffix = Path(source).suffix.lower()
+        if suffix == ".qgs":
+            with open(source, "rb") as f:
+                xml_data = f.read()
+            with open(target, "wb") as f:
+                f.write(self.absolute_paths(xml_data, base))
+        elif suffix == ".qgz":
+            with zipfile.ZipFile(source) as zin, zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as zout:
+                for info in zin.infolist():
+                    data = zin.read(info)
+                    if info.filename.lower().endswith(".qgs"):
+                        data = self.absolute_paths(data, base)
+                    zout.writestr(info, data)
+        else:
+            shutil.copyfile(source, target)
+    
+    def fetch(self, path):
+        """A local copy of path when it lives on a share, path itself otherwise
+        
+        Safe to call from worker threads. Also records the state the file
+        was read in, which later uploads to the same path check against.
+        """
+        if not self.is_remote(path):
+            return path
+        path = os.path.abspath(path)
+        state = ShareUploadTask.remote_state(path)
+        if state is None:
+            raise FileNotFoundError(path)
+        key = hashlib.sha1(f"{path}|{state[0]}|{state[1]}".encode("utf-8")).hexdigest()
+        local = os.path.join(self.folder, "files", key + Path(path).suffix.lower())
+        if os.path.exists(local):
+            os.utime(local)
+            self._set_baseline(path, state)
+            return local
+        
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        partial = f"{local}.{threading.get_ident()}.part"
+        try:
+            self._localize(path, partial)
+            current = ShareUploadTask.remote_state(path)
+            if current != state:
+                # Changed while copying: read this one straight from the share
+                self._set_baseline(path, current)
+                return path
+            os.replace(partial, local)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        # Only now is it known which state the returned copy holds
+        self._set_baseline(path, state)
+        self._evict(keep=local)
+        return local
+    
+    def _set_baseline(self, path, state):
+        with self._lock:
+            if state is None:
+                self._baselines.pop(path, None)
+            else:
+                self._baselines[path] = state
+    
+    def pin(self, paths):
+        """Local copies still read by open tabs, which eviction leaves alone"""
+        self._pinned = frozenset(os.path.abspath(p) for p in paths if p)
+    
+    def _evict(self, keep=None):
+        """Drop the least recently used cached files beyond the size limit
+        
+        Fetches on several threads may evict at once: one at a time.
+        """
+        folder = os.path.join(self.folder, "files")
+        pinned = self._pinned | {keep}
+        with self._lock:
+            entries = []
+            try:
+                for entry in os.scandir(folder):
+                    if not entry.name.endswith(".part"):
+                        try:
+                            if entry.is_file():
+                                stat = entry.stat()
+                                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        except OSError:
+                            continue
+            except OSError:
+                return
+            total = sum(size for _mtime, size, _path in entries)
+            for _mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path in pinned:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+    
+    def clear(self):
+        shutil.rmtree(os.path.join(self.folder, "files"), ignore_errors=True)
+    
+    # Writing
+    
+    def staging_path(self, path):
+        """A fresh local path to write the next version of path to, before upload()"""
+        parent = os.path.join(self.folder, "staging", hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest())
+        os.makedirs(parent, exist_ok=True)
+        return os.path.join(tempfile.mkdtemp(dir=parent), os.path.basename(path))
+    
+    @staticmethod
+    def _discard_staged(staged):
+        if staged:
+            shutil.rmtree(os.path.dirname(staged), ignore_errors=True)
+    
+    def upload(self, path, staged):
+        """Replace path on the share with staged, in the background"""
+        path = os.path.abspath(path)
+        entry = self._uploads.get(path)
+        if entry is None:
+            self._uploads[path] = {'staged': staged, 'next': None, 'task': None,
+                                   'state': 'pending', 'force': False, 'error': None}
+        elif entry['task'] is not None:
+            self._discard_staged(entry['next'])
+            entry['next'] = staged
+            self.pending_changed.emit()
+            return
+        else:
+            self._discard_staged(entry['staged'])
+            entry.update(staged=staged, state='pending', force=False, error=None)
+        self._start(path)
+    
+    def _start(self, path):
+        entry = self._uploads[path]
+        with self._lock:
+            baseline = None if entry['force'] else self._baselines.get(path)
+        task = ShareUploadTask(entry['staged'], path, baseline)
+        task.done.connect(self._on_uploaded)
+        entry.update(task=task, state='uploading', error=None)
+        QgsApplication.taskManager().addTask(task)
+        self.pending_changed.emit()
+    
+    def _on_uploaded(self, task, ok):
+        path = task.target
+        entry = self._uploads.get(path)
+        if entry is None or entry['task'] is not task:
+            return
+        entry['task'] = None
+        
+        if ok:
+            with self._lock:
+                self._baselines[path] = task.baseline
+            self._discard_staged(entry['staged'])
+            if entry['next']:
+                entry.update(staged=entry['next'], next=None, force=False)
+                self._start(path)
+            else:
+                del self._uploads[path]
+            self.uploaded.emit(path)
+        else:
+            if entry['next']:
+                self._discard_staged(entry['staged'])
+                entry.update(staged=entry['next'], next=None)
+            if task.conflict:
+                entry['state'] = 'conflict'
+                self.conflict.emit(path)
+            else:
+                entry.update(state='failed', error=task.error)
+                self.failed.emit(path, task.error or "")
+                self._retry_timer.start()
+        self.pending_changed.emit()
+    
+    def _retry_failed(self):
+        for path, entry in list(self._uploads.items()):
+            if entry['state'] == 'failed' and entry['task'] is None:
+                self._start(path)
+    
+    def overwrite(self, path):
+        """Upload a conflicting save anyway, replacing the changes on the share"""
+        entry = self._uploads.get(os.path.abspath(path))
+        if entry is not None and entry['task'] is None:
+            entry['force'] = True
+            self._start(os.path.abspath(path))
+    
+    def discard(self, path):
+        """Give up a pending upload and keep what is on the share"""
+        path = os.path.abspath(path)
+        entry = self._uploads.get(path)
+        if entry is not None and entry['task'] is None:
+            self._discard_staged(entry['staged'])
+            del self._uploads[path]
+            self.pending_changed.emit()
+    
+    def retry(self, path):
+        entry = self._uploads.get(os.path.abspath(path))
+        if entry is not None and entry['task'] is None and entry['state'] == 'failed':
+            self._start(os.path.abspath(path))
+    
+    def pending(self):
+        """[(path, state, error)] of the uploads not done yet"""
+        return [(path, entry['state'], entry['error']) for path, entry in self._uploads.items()]
+    
+    def staged_file(self, path):
+        """The newest local version of path still waiting for upload, or None"""
+        entry = self._uploads.get(os.path.abspath(path))
+        if entry is None:
+            return None
+        return entry['next'] or entry['staged']
+    
+    def stop(self):
+        self._retry_timer.stop()
+
+
+class SnapshotRenderTask(QgsTask):
+    """Renders a project snapshot (or file) with a standalone QgsProject"""
+    
+    done = pyqtSignal(object, bool)
+    
+    def __init__(self, spec):
+        super().__init__(tr("Rendering thumbnail"), QgsTask.CanCancel)
+        self.spec = spec
+        self.image = None
+        self.error = None
+    
+    def run(self):
+        spec = self.spec
+        scratch = None
+        try:
+            if spec.get('manifest'):
+                scratch = spec['store'].materialize(spec['manifest'], spec['scratch'])
+                path = scratch
+            else:
+                path = spec['file']
+            if self.isCanceled():
+                return False
+            if spec.get('extents'):
+                self.image = ThumbnailGenerator.render_project_extents(
+                    path, spec['extents'], spec['size'], self.isCanceled, spec.get('dpi'), spec.get('write')
+                )
+            else:
+                self.image = ThumbnailGenerator.render_project_file(path, spec, spec['size'])
+            return True
+        except Exception as e:
+            self.error = str(e)
+            return False
+        finally:
+            if scratch:
+                remove_project_file(scratch)
+    
+    def finished(self, result):
+        self.done.emit(self, bool(result))
+
+
+class ProjectLoadTask(QgsTask):
+    """Reads the stored state of a tab into a standalone QgsProject in the background
+    
+    The project is moved to the GUI thread once read, so that its layers can
+    be rendered there.
+    """
+    
+    loaded = pyqtSignal(object, bool)
+    
+    def __init__(self, proj):
+        super().__init__(f"{tr('Loading project')}: {proj.name}", QgsTask.CanCancel)
+        self.proj = proj
+        self.manifest = proj.snapshot
+        self.project = None
+        self.error = None
+        proj.store.retain(self.manifest)
+    
+    def run(self):
+        project = QgsProject()
+        try:
+            ok = self.proj.load_into(project, self.manifest)
+        except Exception as e:
+            self.error = str(e)
+            ok = False
+        project.moveToThread(QgsApplication.instance().thread())
+        self.project = project
+        return bool(ok) and not self.isCanceled()
+    
+    def finished(self, result):
+        self.proj.store.release(self.manifest)
+        self.loaded.emit(self, bool(result))
+
+
+class RenderScheduler(QObject):
+    """Central priority queue for background thumbnail rendering
+    
+    Jobs are identified by a key and deduplicated: requesting a key that is
+    already queued only refreshes it, and requesting a key that is rendering
+    queues one more render once it is done. The spec and the priority of a
+    job are asked to the owner when the job is dispatched, so they always
+    reflect the current state (active project, visible rows). Waiting jobs
+    slowly gain priority so nothing starves; failed or stuck jobs are retried
+    a few times, and reported through failed once they give up. 'live' specs
+    are rendered from map settings with a parallel job on the GUI thread,
+    'snapshot' specs in QgsTasks.
+    """
+    
+    PRIORITY_ACTIVE = 0
+    PRIORITY_VISIBLE = 1
+    PRIORITY_BACKGROUND = 2
+    
+    AGING_SECONDS = 10.0
+    MAX_ATTEMPTS = 3
+    TIMEOUT_SECONDS = 120.0
+    
+    rendered = pyqtSignal(object, object)
+    failed = pyqtSignal(object)
+    
+    def __init__(self, spec_provider, priority_provider, max_jobs=None, parent=None):
+        super().__init__(parent)
+        self.spec_provider = spec_provider
+        self.priority_provider = priority_provider
+        self.max_jobs = max_jobs or max(1, QThread.idealThreadCount())
+        self._pending = {}
+        self._running = {}
+        self._attempts = {}
+        self._again = set()
+        self._stopping = set()
+        self._seq = itertools.count()
+        
+        self._dispatch_timer = QTimer(self)
+        self._dispatch_timer.setSingleShot(True)
+        self._dispatch_timer.setInterval(0)
+        self._dispatch_timer.timeout.connect(self._dispatch)
+        
+        self._watchdog = QTimer(self)
+        self._watchdog.setInterval(5000)
+        self._watchdog.timeout.connect(self._check_stuck)
+        self._watchdog.start()
+    
+    def request(self, key):
+        if key in self._running:
+            self._again.add(key)
+            return
+        if key not in self._pending:
+            self._pending[key] = (time.monotonic(), next(self._seq))
+        self._dispatch_timer.start()
+    
+    def cancel(self, key):
+        self._pending.pop(key, None)
+        self._again.discard(key)
+        self._attempts.pop(key, None)
+        running = self._running.pop(key, None)
+        if running:
+            self._stop(running)
+        self._dispatch_timer.start()
+    
+    def clear(self):
+        for key in list(self._pending) + list(self._running):
+            self.cancel(key)
+    
+    def pending_count(self):
+        return len(self._pending) + len(self._running)
+    
+    def _next_key(self):
+        now = time.monotonic()
+        best = None
+        best_rank = None
+        for key, (queued, seq) in self._pending.items():
+            priority = self.priority_provider(key)
+            rank = (priority - (now - queued) / self.AGING_SECONDS, seq)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = key, rank
+        return best
+    
+    def _dispatch(self):
+        while self._pending and len(self._running) < self.max_jobs:
+            key = self._next_key()
+            del self._pending[key]
+            spec = self.spec_provider(key)
+            if spec is None:
+                self._attempts.pop(key, None)
+                self.failed.emit(key)
+                continue
+            self._start(key, spec)
+    
+    def _start(self, key, spec):
+        if spec['kind'] == 'live':
+            job = QgsMapRendererParallelJob(spec['settings'])
+            job.finished.connect(self._on_live_finished)
+            self._running[key] = {'job': job, 'spec': spec, 'started': time.monotonic()}
+            job.start()
+            return
+        
+        if spec.get('manifest'):
+            spec['store'].retain(spec['manifest'])
+        task = SnapshotRenderTask(spec)
+        task.done.connect(lambda t, ok, k=key: self._on_task_done(k, t, ok))
+        self._running[key] = {'task': task, 'spec': spec, 'started': time.monotonic()}
+        QgsApplication.taskManager().addTask(task)
+    
+    def _stop(self, running):
+        if 'job' in running:
+            # keep the job alive until it finishes, deleting a running job blocks
+            self._stopping.add(running['job'])
+            running['job'].cancelWithoutBlocking()
+        else:
+            # Canceling is only a request: the snapshot is released once the task is done
+            self._stopping.add(running['task'])
+            running['task'].cancel()
+    
+    def _on_live_finished(self):
+        job = self.sender()
+        self._stopping.discard(job)
+        job.deleteLater()
+        for key, running in list(self._running.items()):
+            if running.get('job') is job:
+                del self._running[key]
+                self._complete(key, job.renderedImage())
+                return
+    
+    def _on_task_done(self, key, task, ok):
+        spec = task.spec
+        if spec.get('manifest'):
+            spec['store'].release(spec['manifest'])
+        if task in self._stopping:
+            self._stopping.discard(task)
+            return
+        running = self._running.get(key)
+        if not running or running.get('task') is not task:
+            return
+        del self._running[key]
+        
+        if ok:
+            self._complete(key, task.image)
+        else:
+            self._retry(key)
+    
+    def _complete(self, key, image):
+        self._attempts.pop(key, None)
+        self.rendered.emit(key, image)
+        if key in self._again:
+            self._again.discard(key)
+            self.request(key)
+        self._dispatch_timer.start()
+    
+    def _retry(self, key):
+        attempts = self._attempts.get(key, 0) + 1
+        self._again.discard(key)
+        if attempts >= self.MAX_ATTEMPTS:
+            self._attempts.pop(key, None)
+            self.failed.emit(key)
+            self._dispatch_timer.start()
+            return
+        self._attempts[key] = attempts
+        QTimer.singleShot(1000 * 2 ** attempts, lambda k=key: self.request(k) if k in self._attempts else None)
+        self._dispatch_timer.start()
+    
+    def _check_stuck(self):
+        now = time.monotonic()
+        for key, running in list(self._running.items()):
+            if now - running['started'] > self.TIMEOUT_SECONDS:
+                del self._running[key]
+                self._stop(running)
+                self._retry(key)
+
+
+class BatchExporter(QObject):
+    """Exports every project, and optionally its bookmarks, to PNG or PDF files
+    
+    Projects are rendered from their stored state by a RenderScheduler of
+    its own, so at most max_jobs standalone projects are read and rendered
+    at a time and the live canvas is never touched. One job per project
+    renders all of its views.
+    """
+    
+    FORMATS = ("png", "pdf")
+    
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal(object)
+    
+    def __init__(self, projects, folder, fmt="png", size=QSize(1600, 1200), dpi=150,
+                 bookmarks=False, max_jobs=None, parent=None):
+        super().__init__(parent)
+        self.projects = list(projects)
+        self.folder = folder
+        self.fmt = fmt
+        self.size = size
+        self.dpi = dpi
+        self.bookmarks = bookmarks
+        self.written = []
+        self.failed = []
+        self.canceled = False
+        self._finished = False
+        self._remaining = set()
+        self._names = set()
+        self._paths = {}
+        self.scheduler = RenderScheduler(
+            self._spec, lambda key: RenderScheduler.PRIORITY_BACKGROUND, max_jobs, parent=self
+        )
+        self.scheduler.rendered.connect(self._on_rendered)
+        self.scheduler.failed.connect(self._on_failed)
+    
+    def start(self):
+        os.makedirs(self.folder, exist_ok=True)
+        self._remaining = set(self.projects)
+        for proj in self.projects:
+            self.scheduler.request(proj)
+        self._report()
+    
+    def cancel(self):
+        self.canceled = True
+        self.scheduler.clear()
+        self._remaining.clear()
+        self._report()
+    
+    def _spec(self, proj):
+        spec = proj.render_spec(self.size)
+        if spec is None:
+            return None
+        extents = [(None, proj.extent, proj.crs)]
+        if self.bookmarks:
+            extents.extend((b.id, b.extent, b.crs) for b in proj.bookmarks)
+        # File names are reserved here, the task writes each image as it is rendered
+        paths = self._paths.setdefault(proj, {})
+        for key, _extent, _crs in extents:
+            if key in paths:
+                continue
+            if key is None:
+                paths[key] = self._file_path(proj.name)
+            else:
+                paths[key] = self._file_path(proj.name, proj.bookmarks.get(key).name)
+        spec['extents'] = extents
+        spec['dpi'] = self.dpi
+        spec['write'] = lambda key, image: paths[key] if self._write(image, paths[key]) else None
+        return spec
+    
+    def _file_path(self, *parts):
+        base = "_".join(re.sub(r"[^\w\-. ]+", "_", part).strip() or "_" for part in parts)
+        name = f"{base}.{self.fmt}"
+        counter = itertools.count(2)
+        while name.lower() in self._names or os.path.exists(os.path.join(self.folder, name)):
+            name = f"{base} ({next(counter)}).{self.fmt}"
+        self._names.add(name.lower())
+        return os.path.join(self.folder, name)
+    
+    def _write(self, image, path):
+        if self.fmt == "png":
+            return image.save(path, "PNG")
+        writer = QPdfWriter(path)
+        writer.setResolution(self.dpi)
+        writer.setPageSize(QPageSize(
+            QSizeF(image.width() * 25.4 / self.dpi, image.height() * 25.4 / self.dpi),
+            QPageSize.Millimeter
+        ))
+        writer.setPageMargins(QMarginsF(0, 0, 0, 0))
+        painter = QPainter(writer)
+        painter.drawImage(0, 0, image)
+        return painter.end()
+    
+    def _on_rendered(self, proj, paths):
+        if proj not in self._remaining:
+            return
+        self._remaining.discard(proj)
+        paths = paths or {}
+        if not paths.get(None):
+            self.failed.append(proj.name)
+        self.written.extend(path for path in paths.values() if path)
+        self._report()
+    
+    def _on_failed(self, proj):
+        if proj in self._remaining:
+            self._remaining.discard(proj)
+            self.failed.append(proj.name)
+            self._report()
+    
+    def _report(self):
+        total = len(self.projects)
+        self.progress.emit(total - len(self._remaining), total)
+        if not self._remaining and not self._finished:
+            self._finished = True
+            self.done.emit(self)
+
+
+class ProjectListWidget(QListWidget):
+    """Project list accepting .qgs/.qgz files dropped from outside
+    
+    Layers dragged from the QGIS layer tree can be dropped on a project to
+    move them there (copy with Ctrl held).
+    """
+    
+    files_dropped = pyqtSignal(list)
+    layers_dropped = pyqtSignal(int, list, bool)
+    
+    def _project_files(self, event):
+        mime = event.mimeData()
+        if not mime.hasUrls():
+            return []
+        return [
+            url.toLocalFile() for url in mime.urls()
+            if url.isLocalFile() and url.toLocalFile().lower().endswith(ProjectXmlReader.SUFFIXES)
+        ]
+    
+    def _layer_target(self, event):
+        if not event.mimeData().hasFormat(LayerTransfer.MIME_TYPE):
+            return None
+        item = self.itemAt(event.pos())
+        return item.data(Qt.UserRole) if item is not None else None
+    
+    def dragEnterEvent(self, event):
+        if self._project_files(event) or event.mimeData().hasFormat(LayerTransfer.MIME_TYPE):
+            event.acceptProposedAction()
+        else:
+            super().dragEnterEvent(event)
+    
+    def dragMoveEvent(self, event):
+        if self._project_files(event):
+            event.acceptProposedAction()
+        elif event.mimeData().hasFormat(LayerTransfer.MIME_TYPE):
+            if self._layer_target(event) is not None:
+                event.acceptProposedAction()
+            else:
+                event.ignore()
+        else:
+            super().dragMoveEvent(event)
+    
+    def dropEvent(self, event):
+        files = self._project_files(event)
+        if files:
+            event.acceptProposedAction()
+            self.files_dropped.emit(files)
+            return
+        
+        target = self._layer_target(event)
+        if target is not None:
+            layer_ids = LayerTransfer.layer_ids_from_mime(event.mimeData().data(LayerTransfer.MIME_TYPE))
+            # Leave the layers where they are in the source layer tree
+            event.setDropAction(Qt.CopyAction)
+            event.accept()
+            move = not event.keyboardModifiers() & Qt.ControlModifier
+            self.layers_dropped.emit(target, layer_ids, move)
+        else:
+            super().dropEvent(event)
+
+
+class TransformCache:
+    """Caches CRS objects and coordinate transforms keyed by authid pairs"""
+    
+    def __init__(self):
+        self._crs = {}
+        self._transforms = {}
+    
+    def crs(self, authid):
+        crs = self._crs.get(authid)
+        if crs is None:
+            crs = QgsCoordinateReferenceSystem(authid)
+            self._crs[authid] = crs
+        return crs
+    
+    def transform(self, src_authid, dst_authid):
+        key = (src_authid, dst_authid)
+        transform = self._transforms.get(key)
+        if transform is None:
+            transform = QgsCoordinateTransform(
+                self.crs(src_authid), self.crs(dst_authid),
+                QgsProject.instance().transformContext()
+            )
+            self._transforms[key] = transform
+        return transform
+    
+    def transform_point(self, x, y, src_authid, dst_authid):
+        if src_authid == dst_authid:
+            return (x, y)
+        if not self.crs(src_authid).isValid() or not self.crs(dst_authid).isValid():
+            return None
+        try:
+            point = self.transform(src_authid, dst_authid).transform(QgsPointXY(x, y))
+        except QgsCsException:
+            return None
+        return (point.x(), point.y())
+    
+    def transform_extent(self, extent, src_authid, dst_authid):
+        """Reproject [xmin, ymin, xmax, ymax]; None if it cannot be done"""
+        if src_authid == dst_authid:
+            return list(extent)
+        if not self.crs(src_authid).isValid() or not self.crs(dst_authid).isValid():
+            return None
+        try:
+            rect = self.transform(src_authid, dst_authid).transformBoundingBox(QgsRectangle(*extent))
+        except QgsCsException:
+            return None
+        if rect.isEmpty() or not rect.isFinite():
+            return None
+        return [rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum()]
+    
+    def clear(self):
+        self._crs.clear()
+        self._transforms.clear()
+
+
+class ExtentHistory:
+    """Manages extent history for back/forward navigation
+    
+    Entries live in a fixed-size ring buffer of packed doubles (four extent
+    values and an epoch timestamp per entry), so appending and dropping the
+    oldest entry are O(1).
+    """
+    
+    RELATIVE_TOLERANCE = 1e-4
+    GEOGRAPHIC_TOLERANCE = 1e-7
+    PROJECTED_TOLERANCE = 1e-2
+    
+    def __init__(self, max_size=50):
+        self.max_size = max_size
+        self._extents = array('d', bytes(8 * 4 * max_size))
+        self._times = array('d', bytes(8 * max_size))
+        self._crs = [None] * max_size
+        self._start = 0
+        self._count = 0
+        self.current_index = -1
+        self._updating = False
+        self._geographic = {}
+    
+    def __len__(self):
+        return self._count
+    
+    def memory_usage(self):
+        return (len(self._extents) + len(self._times) + len(self._crs)) * 8
+    
+    def _slot(self, index):
+        return (self._start + index) % self.max_size
+    
+    def entry(self, index):
+        slot = self._slot(index)
+        return {
+            'extent': list(self._extents[slot * 4:slot * 4 + 4]),
+            'crs': self._crs[slot],
+            'time': self._times[slot]
+        }
+    
+    def _tolerance(self, crs, extent):
+        authid = crs.authid()
+        geographic = self._geographic.get(authid)
+        if geographic is None:
+            geographic = self._geographic[authid] = crs.isGeographic()
+        floor = self.GEOGRAPHIC_TOLERANCE if geographic else self.PROJECTED_TOLERANCE
+        size = max(extent.width(), extent.height())
+        return max(floor, size * self.RELATIVE_TOLERANCE)
+    
+    def _is_current(self, values, authid, tolerance):
+        if self.current_index < 0:
+            return False
+        slot = self._slot(self.current_index)
+        if self._crs[slot] != authid:
+            return False
+        stored = self._extents[slot * 4:slot * 4 + 4]
+        return all(abs(a - b) < tolerance for a, b in zip(stored, values))
+    
+    def add(self, extent, crs, timestamp=None):
+        if self._updating:
+            return
+        
+        values = (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum())
+        authid = sys.intern(crs.authid())
+        if self._is_current(values, authid, self._tolerance(crs, extent)):
+            return
+        
+        self._append(values, authid, timestamp or time.time())
+    
+    def _append(self, values, authid, timestamp):
+        # Drop the forward history
+        self._count = self.current_index + 1
+        
+        if self._count < self.max_size:
+            slot = self._slot(self._count)
+            self._count += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self.max_size
+        
+        self._extents[slot * 4:slot * 4 + 4] = array('d', values)
+        self._times[slot] = timestamp
+        self._crs[slot] = authid
+        self.current_index = self._count - 1
+    
+    def can_go_back(self):
+        return self.current_index > 0
+    
+    def can_go_forward(self):
+        return self.current_index < self._count - 1
+    
+    def go_back(self):
+        if self.can_go_back():
+            self.current_index -= 1
+            return self.entry(self.current_index)
+        return None
+    
+    def go_forward(self):
+        if self.can_go_forward():
+            self.current_index += 1
+            return self.entry(self.current_index)
+        return None
+    
+    def set_updating(self, updating):
+        self._updating = updating
+    
+    @staticmethod
+    def _pack(values):
+        if sys.byteorder != 'little':
+            values = array(values.typecode, values)
+            values.byteswap()
+        return base64.b64encode(values.tobytes()).decode('ascii')
+    
+    @staticmethod
+    def _unpack(typecode, text):
+        values = array(typecode)
+        values.frombytes(base64.b64decode(text))
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values
+    
+    def to_dict(self):
+        """Compact form: packed little-endian arrays, CRS ids as a lookup table"""
+        extents = array('d')
+        times = array('d')
+        crs_table = []
+        crs_index = array('H')
+        for i in range(self._count):
+            slot = self._slot(i)
+            extents.extend(self._extents[slot * 4:slot * 4 + 4])
+            times.append(self._times[slot])
+            authid = self._crs[slot]
+            if authid not in crs_table:
+                crs_table.append(authid)
+            crs_index.append(crs_table.index(authid))
+        return {
+            'max_size': self.max_size,
+            'index': self.current_index,
+            'extents': self._pack(extents),
+            'times': self._pack(times),
+            'crs_table': crs_table,
+            'crs': self._pack(crs_index)
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        history = cls(data.get('max_size', 50))
+        try:
+            extents = cls._unpack('d', data['extents'])
+            times = cls._unpack('d', data['times'])
+            crs_index = cls._unpack('H', data['crs'])
+            crs_table = [sys.intern(c) for c in data['crs_table']]
+        except (KeyError, ValueError, TypeError):
+            return history
+        
+        count = min(len(times), len(crs_index), len(extents) // 4)
+        for i in range(max(0, count - history.max_size), count):
+            history._append(extents[i * 4:i * 4 + 4], crs_table[crs_index[i]], times[i])
+        history.current_index = max(-1, min(data.get('index', history._count - 1), history._count - 1))
+        return history
+
+
+class ProjectBookmark:
+    """A project bookmark"""
+    
+    __slots__ = ('name', 'extent', 'crs', 'created', 'id')
+    
+    def __init__(self, name, extent, crs, created=None, bookmark_id=None):
+        self.name = name
+        self.extent = extent
+        self.crs = crs
+        self.created = created or time.time()
+        self.id = bookmark_id
+
+
+def iso_to_epoch(value, default=None):
+    """Convert an ISO timestamp (as stored in workspaces) to epoch seconds."""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return default if default is not None else time.time()
+
+
+def epoch_to_iso(value):
+    """Convert epoch seconds to the ISO format stored in workspaces."""
+    return datetime.fromtimestamp(value).isoformat()
+
+
+class BookmarkNameIndex:
+    """Sorted word index over bookmark names for prefix filtering"""
+    
+    WORD_RE = re.compile(r"\w+", re.UNICODE)
+    
+    def __init__(self, pairs=()):
+        self._entries = sorted(
+            (word, bookmark_id) for bookmark_id, name in pairs for word in self.words(name)
+        )
+    
+    @classmethod
+    def words(cls, name):
+        return set(cls.WORD_RE.findall(name.lower())) or {name.lower()}
+    
+    def add(self, bookmark_id, name):
+        for word in self.words(name):
+            bisect.insort(self._entries, (word, bookmark_id))
+    
+    def remove(self, bookmark_id, name):
+        for word in self.words(name):
+            pos = bisect.bisect_left(self._entries, (word, bookmark_id))
+            if pos < len(self._entries) and self._entries[pos] == (word, bookmark_id):
+                del self._entries[pos]
+    
+    def _prefix(self, prefix):
+        pos = bisect.bisect_left(self._entries, (prefix,))
+        ids = set()
+        while pos < len(self._entries) and self._entries[pos][0].startswith(prefix):
+            ids.add(self._entries[pos][1])
+            pos += 1
+        return ids
+    
+    def search(self, text):
+        """Ids of the bookmarks having a word starting with every word of text
+        
+        None when text has no word at all, meaning that nothing is filtered.
+        """
+        words = self.WORD_RE.findall(text.lower())
+        if not words:
+            return None
+        result = None
+        for word in words:
+            ids = self._prefix(word)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result or set()
+
+
+class BookmarkStore:
+    """Columnar bookmark storage of one project
+    
+    Ids, extents and creation times are kept in packed arrays, names and
+    interned CRS ids in lists; rows are handed out as ProjectBookmark
+    records. Every change is mirrored into the shared BookmarkIndex and
+    reported to the journal (a WorkspaceDatabase) when there is one.
+    """
+    
+    _next_id = itertools.count(1)
+    
+    def __init__(self, index=None, journal=None):
+        self.index = index
+        self.journal = journal
+        self.ids = array('q')
+        self.extents = array('d')
+        self.created = array('d')
+        self.names = []
+        self.crs = []
+        self._rows = {}
+        self._name_index = None
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def name_index(self):
+        """Word index over the names, built on first use and then kept up to date"""
+        if self._name_index is None:
+            self._name_index = BookmarkNameIndex(zip(self.ids, self.names))
+        return self._name_index
+    
+    def memory_usage(self):
+        arrays = sum(a.buffer_info()[1] * a.itemsize for a in (self.ids, self.extents, self.created))
+        # str objects: ~49 bytes of header plus the text; CRS strings are interned
+        names = sum(map(len, self.names)) + 49 * len(self.names)
+        return arrays + names + 16 * len(self.names) + 100 * len(self._rows)
+    
+    def filter_rows(self, text):
+        """Rows whose name matches a filter text, in row order"""
+        ids = self.name_index().search(text)
+        if ids is None:
+            return list(range(len(self.ids)))
+        return sorted(self._rows[i] for i in ids if i in self._rows)
+    
+    def __iter__(self):
+        for row in range(len(self.ids)):
+            yield self[row]
+    
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self.ids)
+        if not 0 <= row < len(self.ids):
+            raise IndexError(row)
+        return ProjectBookmark(
+            self.names[row], self.extent(row), self.crs[row],
+            self.created[row], self.ids[row]
+        )
+    
+    def extent(self, row):
+        return list(self.extents[row * 4:row * 4 + 4])
+    
+    def row_of(self, bookmark_id):
+        return self._rows.get(bookmark_id)
+    
+    def get(self, bookmark_id):
+        row = self._rows.get(bookmark_id)
+        return self[row] if row is not None else None
+    
+    def append(self, name, extent, crs, created=None):
+        bookmark_id = next(self._next_id)
+        crs = sys.intern(crs or "")
+        self._rows[bookmark_id] = len(self.ids)
+        self.ids.append(bookmark_id)
+        self.extents.extend(float(v) for v in extent)
+        self.created.append(created or time.time())
+        self.names.append(name)
+        self.crs.append(crs)
+        if self._name_index is not None:
+            self._name_index.add(bookmark_id, name)
+        if self.index is not None:
+            self.index.add(self, bookmark_id, extent, crs)
+        if self.journal is not None:
+            self.journal.bookmarks_added(self, len(self.ids) - 1)
+        return self[-1]
+    
+    @staticmethod
+    def check_record(record):
+        """Validated (name, extent, crs, created) of an imported record, or ValueError"""
+        try:
+            name, extent, crs, created = record
+            extent = [float(v) for v in extent]
+            created = float(created) if created else None
+        except (TypeError, ValueError):
+            raise ValueError(f"{tr('Invalid bookmark')}: {record!r}")
+        if (not isinstance(name, str) or not (crs is None or isinstance(crs, str)) or
+                len(extent) != 4 or not all(map(math.isfinite, extent))):
+            raise ValueError(f"{tr('Invalid bookmark')}: {record!r}")
+        return name, extent, crs, created
+    
+    def extend(self, records):
+        """Append (name, extent, crs, created) records from any iterable, returns the count
+        
+        Records are consumed one at a time so a generator never has to be
+        materialized; the name index is dropped and rebuilt on next use
+        instead of being updated row by row. Every record is checked before
+        it is stored: on an invalid one, or any error while reading, the
+        rows already appended are taken back and the error is raised.
+        """
+        self._name_index = None
+        first = len(self.ids)
+        count = 0
+        try:
+            for record in records:
+                name, extent, crs, created = self.check_record(record)
+                bookmark_id = next(self._next_id)
+                crs = sys.intern(crs or "")
+                self._rows[bookmark_id] = len(self.ids)
+                self.ids.append(bookmark_id)
+                self.extents.extend(extent)
+                self.created.append(created or time.time())
+                self.names.append(name)
+                self.crs.append(crs)
+                if self.index is not None:
+                    self.index.add(self, bookmark_id, extent, crs)
+                count += 1
+        except Exception:
+            self._truncate(first)
+            raise
+        if count and self.journal is not None:
+            self.journal.bookmarks_added(self, first)
+        return count
+    
+    def _truncate(self, length):
+        """Drop the rows from length on, which the journal has not been told about"""
+        for row in range(length, len(self.ids)):
+            self._rows.pop(self.ids[row], None)
+            if self.index is not None:
+                self.index.remove(self.ids[row], self.extent(row))
+        del self.ids[length:]
+        del self.extents[length * 4:]
+        del self.created[length:]
+        del self.names[length:]
+        del self.crs[length:]
+    
+    def remove(self, row):
+        bookmark_id = self.ids[row]
+        extent = self.extent(row)
+        if self.journal is not None:
+            self.journal.bookmark_removed(self, bookmark_id)
+        if self._name_index is not None:
+            self._name_index.remove(bookmark_id, self.names[row])
+        del self.ids[row]
+        del self.extents[row * 4:row * 4 + 4]
+        del self.created[row]
+        del self.names[row]
+        del self.crs[row]
+        self._rows.pop(bookmark_id, None)
+        for i in range(row, len(self.ids)):
+            self._rows[self.ids[i]] = i
+        if self.index is not None:
+            self.index.remove(bookmark_id, extent)
+    
+    def rename(self, row, name):
+        if self._name_index is not None:
+            self._name_index.remove(self.ids[row], self.names[row])
+            self._name_index.add(self.ids[row], name)
+        self.names[row] = name
+        if self.journal is not None:
+            self.journal.bookmark_renamed(self, row)
+    
+    def set_index(self, index):
+        """Move every bookmark from the current spatial index to another one (or none)"""
+        if self.index is not None:
+            for row, bookmark_id in enumerate(self.ids):
+                self.index.remove(bookmark_id, self.extent(row))
+        self.index = index
+        if index is not None:
+            for row, bookmark_id in enumerate(self.ids):
+                index.add(self, bookmark_id, self.extent(row), self.crs[row])
+    
+    def clear(self):
+        if self.index is not None:
+            for row, bookmark_id in enumerate(self.ids):
+                self.index.remove(bookmark_id, self.extent(row))
+        if self.journal is not None:
+            self.journal.bookmarks_cleared(self)
+        self.__init__(self.index, self.journal)
+
+
+class BookmarkIndex:
+    """Spatial index over the bookmarks of all projects, one R-tree per CRS"""
+    
+    def __init__(self):
+        self._trees = {}
+        self._owners = {}
+    
+    def __len__(self):
+        return len(self._owners)
+    
+    def add(self, store, bookmark_id, extent, crs):
+        tree = self._trees.get(crs)
+        if tree is None:
+            tree = self._trees[crs] = QgsSpatialIndex()
+        tree.addFeature(bookmark_id, QgsRectangle(*extent))
+        self._owners[bookmark_id] = (store, crs)
+    
+    def remove(self, bookmark_id, extent):
+        owner = self._owners.pop(bookmark_id, None)
+        if owner is None:
+            return
+        feature = QgsFeature(bookmark_id)
+        feature.setGeometry(QgsGeometry.fromRect(QgsRectangle(*extent)))
+        self._trees[owner[1]].deleteFeature(feature)
+    
+    def owner(self, bookmark_id):
+        owner = self._owners.get(bookmark_id)
+        return owner[0] if owner else None
+    
+    def in_view(self, extent, crs, transforms):
+        """(store, bookmark id) of every bookmark intersecting an extent"""
+        results = []
+        for tree_crs, tree in self._trees.items():
+            rect = transforms.transform_extent(extent, crs, tree_crs)
+            if rect is None:
+                continue
+            for bookmark_id in tree.intersects(QgsRectangle(*rect)):
+                results.append((self._owners[bookmark_id][0], bookmark_id))
+        return results
+    
+    def nearest(self, x, y, crs, transforms, count=1):
+        """(distance, store, bookmark id) of the bookmarks closest to a point"""
+        candidates = []
+        for tree_crs, tree in self._trees.items():
+            point = transforms.transform_point(x, y, crs, tree_crs)
+            if point is None:
+                continue
+            for bookmark_id in tree.nearestNeighbor(QgsPointXY(*point), count):
+                store = self._owners[bookmark_id][0]
+                extent = store.extent(store.row_of(bookmark_id))
+                extent = transforms.transform_extent(extent, tree_crs, crs)
+                if extent is None:
+                    continue
+                dx = max(extent[0] - x, 0, x - extent[2])
+                dy = max(extent[1] - y, 0, y - extent[3])
+                candidates.append((math.hypot(dx, dy), store, bookmark_id))
+        candidates.sort(key=lambda c: c[0])
+        return candidates[:count]
+
+
+class BookmarkExchange:
+    """Streaming bookmark import/export as GeoJSON, CSV or GeoPackage
+    
+    Readers are generators of (name, extent, crs, created) records meant to
+    be fed to BookmarkStore.extend; writers read the store columns directly.
+    """
+    
+    FILTERS = "GeoJSON (*.geojson *.json);;CSV (*.csv);;GeoPackage (*.gpkg)"
+    CSV_FIELDS = ['name', 'xmin', 'ymin', 'xmax', 'ymax', 'crs', 'created']
+    GPKG_BATCH = 1000
+    CHUNK_SIZE = 1 << 16
+    DEFAULT_CRS = "EPSG:4326"
+    
+    @classmethod
+    def read(cls, path):
+        suffix = Path(path).suffix.lower()
+        if suffix in ('.geojson', '.json'):
+            return cls.read_geojson(path)
+        if suffix == '.csv':
+            return cls.read_csv(path)
+        if suffix == '.gpkg':
+            return cls.read_gpkg(path)
+        raise ValueError(f"{tr('Unsupported format')}: {suffix}")
+    
+    @classmethod
+    def write(cls, path, store, transforms):
+        suffix = Path(path).suffix.lower()
+        if suffix in ('.geojson', '.json'):
+            return cls.write_geojson(path, store)
+        if suffix == '.csv':
+            return cls.write_csv(path, store)
+        if suffix == '.gpkg':
+            return cls.write_gpkg(path, store, transforms)
+        raise ValueError(f"{tr('Unsupported format')}: {suffix}")
+    
+    @staticmethod
+    def _bounds(coords):
+        xs, ys = [], []
+        stack = [coords]
+        while stack:
+            item = stack.pop()
+            if item and isinstance(item[0], (int, float)):
+                xs.append(item[0])
+                ys.append(item[1])
+            else:
+                stack.extend(item)
+        if not xs:
+            return None
+        return [min(xs), min(ys), max(xs), max(ys)]
+    
+    @classmethod
+    def _iter_json_array(cls, fp, key):
+        """Decode the elements of the top-level array `key` one by one"""
+        decoder = json.JSONDecoder()
+        marker = f'"{key}"'
+        buf = ""
+        while True:
+            pos = buf.find(marker)
+            if pos >= 0:
+                buf = buf[pos + len(marker):]
+                break
+            chunk = fp.read(cls.CHUNK_SIZE)
+            if not chunk:
+                return
+            buf = buf[-len(marker):] + chunk
+        
+        started = False
+        pos = 0
+        eof = False
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,:':
+                pos += 1
+            if pos < len(buf):
+                if not started:
+                    if buf[pos] != '[':
+                        raise ValueError(f"'{key}' is not an array")
+                    started = True
+                    pos += 1
+                    continue
+                if buf[pos] == ']':
+                    return
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                else:
+                    yield value
+                    pos = end
+                    continue
+            if eof:
+                raise ValueError(f"'{key}' array is not terminated")
+            chunk = fp.read(cls.CHUNK_SIZE)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+    
+    @classmethod
+    def read_geojson(cls, path):
+        with open(path, 'r', encoding='utf-8') as fp:
+            for feature in cls._iter_json_array(fp, 'features'):
+                props = feature.get('properties') or {}
+                extent = feature.get('bbox')
+                if not extent or len(extent) != 4:
+                    geometry = feature.get('geometry') or {}
+                    extent = cls._bounds(geometry.get('coordinates') or [])
+                if extent is None:
+                    continue
+                yield (
+                    str(props.get('name') or tr('Bookmark')),
+                    [float(v) for v in extent],
+                    props.get('crs') or cls.DEFAULT_CRS,
+                    iso_to_epoch(props.get('created'))
+                )
+    
+    @classmethod
+    def write_geojson(cls, path, store):
+        count = 0
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write('{"type": "FeatureCollection", "features": [\n')
+            for row in range(len(store)):
+                xmin, ymin, xmax, ymax = store.extents[row * 4:row * 4 + 4]
+                feature = {
+                    'type': 'Feature',
+                    'bbox': [xmin, ymin, xmax, ymax],
+                    'properties': {
+                        'name': store.names[row],
+                        'crs': store.crs[row],
+                        'created': epoch_to_iso(store.created[row])
+                    },
+                    'geometry': {
+                        'type': 'Polygon',
+                        'coordinates': [[
+                            [xmin, ymin], [xmax, ymin], [xmax, ymax], [xmin, ymax], [xmin, ymin]
+                        ]]
+                    }
+                }
+                if count:
+                    fp.write(',\n')
+                fp.write(json.dumps(feature))
+                count += 1
+            fp.write('\n]}\n')
+        return count
+    
+    @classmethod
+    def read_csv(cls, path):
+        with open(path, 'r', encoding='utf-8', newline='') as fp:
+            reader = csv.DictReader(fp)
+            missing = {'xmin', 'ymin', 'xmax', 'ymax'} - set(reader.fieldnames or [])
+            if missing:
+                raise ValueError(f"{tr('Missing columns')}: {', '.join(sorted(missing))}")
+            for record in reader:
+                try:
+                    extent = [float(record[k]) for k in ('xmin', 'ymin', 'xmax', 'ymax')]
+                except (TypeError, ValueError):
+                    continue
+                yield (
+                    record.get('name') or tr('Bookmark'),
+                    extent,
+                    record.get('crs') or cls.DEFAULT_CRS,
+                    iso_to_epoch(record.get('created'))
+                )
+    
+    @classmethod
+    def write_csv(cls, path, store):
+        with open(path, 'w', encoding='utf-8', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(cls.CSV_FIELDS)
+            for row in range(len(store)):
+                writer.writerow(
+                    [store.names[row]] + list(store.extents[row * 4:row * 4 + 4])
+                    + [store.crs[row], epoch_to_iso(store.created[row])]
+                )
+        return len(store)
+    
+    @classmethod
+    def read_gpkg(cls, path):
+        layer = QgsVectorLayer(path, "bookmarks", "ogr")
+        if not layer.isValid():
+            raise ValueError(f"{tr('Cannot load')}: {path}")
+        layer_crs = layer.crs().authid() or cls.DEFAULT_CRS
+        names = layer.fields().names()
+        name_field = next((f for f in ('name', 'title', 'label') if f in names), None)
+        has_extent = all(f in names for f in ('xmin', 'ymin', 'xmax', 'ymax'))
+        
+        for feature in layer.getFeatures():
+            extent = None
+            crs = layer_crs
+            if has_extent:
+                try:
+                    extent = [float(feature[f]) for f in ('xmin', 'ymin', 'xmax', 'ymax')]
+                    if 'crs' in names and feature['crs']:
+                        crs = str(feature['crs'])
+                except (TypeError, ValueError):
+                    extent = None
+            if extent is None:
+                geometry = feature.geometry()
+                if geometry is None or geometry.isEmpty():
+                    continue
+                rect = geometry.boundingBox()
+                extent = [rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum()]
+            name = feature[name_field] if name_field else None
+            created = feature['created'] if 'created' in names else None
+            yield (
+                str(name) if name else tr('Bookmark'),
+                extent,
+                crs,
+                iso_to_epoch(str(created) if created else None)
+            )
+    
+    @classmethod
+    def write_gpkg(cls, path, store, transforms):
+        """Write one polygon layer; geometries use the most common bookmark CRS
+        while the attributes keep every bookmark's own extent and CRS."""
+        counts = {}
+        for crs in store.crs:
+            counts[crs] = counts.get(crs, 0) + 1
+        layer_crs = max(counts, key=counts.get) if counts else cls.DEFAULT_CRS
+        
+        fields = QgsFields()
+        fields.append(QgsField('name', QVariant.String))
+        for key in ('xmin', 'ymin', 'xmax', 'ymax'):
+            fields.append(QgsField(key, QVariant.Double))
+        fields.append(QgsField('crs', QVariant.String))
+        fields.append(QgsField('created', QVariant.String))
+        
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = "GPKG"
+        options.layerName = "bookmarks"
+        options.fileEncoding = "UTF-8"
+        writer = QgsVectorFileWriter.create(
+            path, fields, QgsWkbTypes.Polygon, transforms.crs(layer_crs),
+            QgsProject.instance().transformContext(), options
+        )
+        if writer.hasError() != QgsVectorFileWriter.NoError:
+            message = writer.errorMessage()
+            del writer
+            raise OSError(message)
+        
+        batch = []
+        for row in range(len(store)):
+            extent = store.extent(row)
+            feature = QgsFeature(fields)
+            feature.setAttributes(
+                [store.names[row]] + extent + [store.crs[row], epoch_to_iso(store.created[row])]
+            )
+            rect = extent
+            if store.crs[row] != layer_crs:
+                rect = transforms.transform_extent(extent, store.crs[row], layer_crs)
+            if rect is not None:
+                feature.setGeometry(QgsGeometry.fromRect(QgsRectangle(*rect)))
+            batch.append(feature)
+            if len(batch) >= cls.GPKG_BATCH:
+                writer.addFeatures(batch)
+                batch = []
+        if batch:
+            writer.addFeatures(batch)
+        del writer
+        return len(store)
+
+
+class BookmarkPreviewCache:
+    """PNG cache of bookmark previews, one folder per project revision
+    
+    Previews are keyed by extent, CRS and size rather than by bookmark id,
+    so they survive workspace reloads. Recently used pixmaps are also kept
+    in memory; projects without visible layers are remembered as False.
+    """
+    
+    MEMORY_ITEMS = 512
+    
+    def __init__(self, folder):
+        self.folder = folder
+        self._memory = OrderedDict()
+    
+    @staticmethod
+    def key(extent, crs, size):
+        text = "|".join(["%.6f" % v for v in extent] + [crs or "", f"{size.width()}x{size.height()}"])
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+    
+    def _path(self, revision, key):
+        return os.path.join(self.folder, revision, key + ".png")
+    
+    def _remember(self, key, pixmap):
+        self._memory[key] = pixmap
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.MEMORY_ITEMS:
+            self._memory.popitem(last=False)
+    
+    def get(self, revision, extent, crs, size):
+        """Cached preview, False for a known empty one, None if not rendered yet"""
+        key = (revision, self.key(extent, crs, size))
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        path = self._path(*key)
+        if not os.path.exists(path):
+            return None
+        pixmap = QPixmap(path)
+        if pixmap.isNull():
+            return None
+        self._remember(key, pixmap)
+        return pixmap
+    
+    def put(self, revision, extent, crs, size, image):
+        key = (revision, self.key(extent, crs, size))
+        if image is None:
+            self._remember(key, False)
+            return False
+        path = self._path(*key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        image.save(path, "PNG")
+        pixmap = QPixmap.fromImage(image)
+        self._remember(key, pixmap)
+        return pixmap
+    
+    def memory_usage(self, revision):
+        return sum(
+            p.width() * p.height() * p.depth() // 8
+            for k, p in self._memory.items() if k[0] == revision and p
+        )
+    
+    def drop_memory(self, revision):
+        """Drop the in-memory pixmaps of a revision, keeping the PNG files"""
+        for key in [k for k in self._memory if k[0] == revision]:
+            del self._memory[key]
+    
+    def drop(self, revision):
+        """Forget every preview of a revision that is no longer current"""
+        shutil.rmtree(os.path.join(self.folder, revision), ignore_errors=True)
+        for key in [k for k in self._memory if k[0] == revision]:
+            del self._memory[key]
+    
+    def export_to(self, folder, revisions):
+        for revision in set(revisions) - {None}:
+            source = os.path.join(self.folder, revision)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(folder, revision), dirs_exist_ok=True)
+    
+    def import_from(self, folder):
+        if os.path.isdir(folder):
+            shutil.copytree(folder, self.folder, dirs_exist_ok=True)
+
+
+class BookmarkPreviewQueue(QObject):
+    """Bounded, batched queue of bookmark preview renders
+    
+    Requests are grouped by project: one background task materializes the
+    project once and renders up to BATCH_SIZE bookmark extents from it.
+    Repeated requests collapse into one, and past MAX_PENDING the oldest
+    requests are dropped; they are asked again when their row is repainted.
+    A project's previews are discarded when its content revision changes.
+    """
+    
+    SIZE = QSize(48, 32)
+    BATCH_SIZE = 32
+    MAX_PENDING = 1000
+    
+    preview_ready = pyqtSignal(object, object)
+    
+    def __init__(self, cache, priority_provider, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self._pending = OrderedDict()
+        self._batches = {}
+        self._revisions = {}
+        self.scheduler = RenderScheduler(self._batch_spec, priority_provider, max_jobs=1, parent=self)
+        self.scheduler.rendered.connect(self._on_rendered)
+        self.scheduler.failed.connect(self._on_failed)
+    
+    def _track_revision(self, proj, revision):
+        old = self._revisions.get(proj)
+        if old == revision:
+            return
+        self._revisions[proj] = revision
+        if old and old not in self._revisions.values():
+            self.cache.drop(old)
+    
+    def preview(self, proj, bookmark_id):
+        """Cached preview pixmap of a bookmark, queueing a render if missing"""
+        revision = proj.revision()
+        row = proj.bookmarks.row_of(bookmark_id)
+        if revision is None or row is None:
+            return None
+        self._track_revision(proj, revision)
+        pixmap = self.cache.get(revision, proj.bookmarks.extent(row), proj.bookmarks.crs[row], self.SIZE)
+        if pixmap is None:
+            self.request(proj, bookmark_id)
+        return pixmap or None
+    
+    def request(self, proj, bookmark_id):
+        key = (proj, bookmark_id)
+        if key in self._pending:
+            self._pending.move_to_end(key)
+        else:
+            self._pending[key] = None
+            while len(self._pending) > self.MAX_PENDING:
+                self._pending.popitem(last=False)
+        self.scheduler.request(proj)
+    
+    def forget(self, proj):
+        self.scheduler.cancel(proj)
+        for key in [k for k in self._pending if k[0] is proj]:
+            del self._pending[key]
+        self._batches.pop(proj, None)
+        revision = self._revisions.pop(proj, None)
+        if revision and revision not in self._revisions.values():
+            self.cache.drop(revision)
+    
+    def clear(self):
+        for proj in list(self._revisions) + [k[0] for k in self._pending]:
+            self.forget(proj)
+    
+    def _batch_spec(self, proj):
+        revision = proj.revision()
+        if revision is None:
+            return None
+        self._track_revision(proj, revision)
+        
+        # A retry renders the batch that failed again, its keys left the queue
+        batch = self._batches.get(proj)
+        if batch is not None and batch[0] == revision:
+            spec = proj.render_spec(self.SIZE)
+            if spec is not None:
+                spec['extents'] = batch[1]
+            return spec
+        
+        # Most recent requests first: they belong to the rows on screen
+        extents = []
+        for key in reversed([k for k in self._pending if k[0] is proj]):
+            del self._pending[key]
+            row = proj.bookmarks.row_of(key[1])
+            if row is None:
+                continue
+            extent = proj.bookmarks.extent(row)
+            crs = proj.bookmarks.crs[row]
+            if self.cache.get(revision, extent, crs, self.SIZE) is None:
+                extents.append((key[1], extent, crs))
+            if len(extents) >= self.BATCH_SIZE:
+                break
+        if not extents:
+            return None
+        
+        spec = proj.render_spec(self.SIZE)
+        if spec is None:
+            return None
+        spec['extents'] = extents
+        self._batches[proj] = (revision, extents)
+        return spec
+    
+    def _on_rendered(self, proj, images):
+        batch = self._batches.pop(proj, None)
+        if batch is None:
+            return
+        revision, extents = batch
+        images = images or {}
+        for bookmark_id, extent, crs in extents:
+            self.cache.put(revision, extent, crs, self.SIZE, images.get(bookmark_id))
+            if bookmark_id in images:
+                self.preview_ready.emit(proj.bookmarks, bookmark_id)
+        if any(k[0] is proj for k in self._pending):
+            self.scheduler.request(proj)
+    
+    def _on_failed(self, proj):
+        # Given up: the rows ask again when they are repainted
+        self._batches.pop(proj, None)
+
+
+class DiskStorage:
+    """Blob storage in a directory tree (volatile when the tree is on a RAM disk)"""
+    
+    def __init__(self, root, volatile=False):
+        self.root = root
+        self.volatile = volatile
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._usage = sum(
+            os.path.getsize(os.path.join(dirpath, name))
+            for dirpath, _dirs, files in os.walk(root) for name in files
+        )
+    
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key)
+    
+    def contains(self, key):
+        return os.path.exists(self.path(key))
+    
+    def put(self, key, data):
+        path = self.path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._usage += len(data)
+    
+    def get(self, key):
+        with open(self.path(key), "rb") as f:
+            return f.read()
+    
+    def delete(self, key):
+        path = self.path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._usage -= size
+    
+    def keys(self):
+        for _dirpath, _dirs, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(".tmp"):
+                    yield name
+    
+    def rewrite(self, key, data):
+        """Atomically replace an existing blob"""
+        path = self.path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._usage += len(data) - old_size
+    
+    def resident_size(self, key):
+        """Bytes of a blob held in memory"""
+        if not self.volatile:
+            return 0
+        return self.size(key)
+    
+    def size(self, key):
+        """Bytes of a stored blob, 0 if missing"""
+        try:
+            return os.path.getsize(self.path(key))
+        except OSError:
+            return 0
+    
+    def usage(self):
+        return self._usage
+
+
+class MemoryStorage:
+    """Blob storage in in-memory buffers"""
+    
+    def __init__(self):
+        self._blobs = {}
+        self._usage = 0
+        self._lock = threading.Lock()
+    
+    def contains(self, key):
+        return key in self._blobs
+    
+    def put(self, key, data):
+        with self._lock:
+            if key not in self._blobs:
+                self._blobs[key] = bytes(data)
+                self._usage += len(data)
+    
+    def get(self, key):
+        try:
+            return self._blobs[key]
+        except KeyError:
+            raise OSError(f"Missing blob {key}")
+    
+    def delete(self, key):
+        with self._lock:
+            data = self._blobs.pop(key, None)
+            if data is not None:
+                self._usage -= len(data)
+    
+    def keys(self):
+        return list(self._blobs)
+    
+    def resident_size(self, key):
+        return self.size(key)
+    
+    def size(self, key):
+        data = self._blobs.get(key)
+        return len(data) if data is not None else 0
+    
+    def usage(self):
+        return self._usage
+
+
+class TieredStorage:
+    """Fast primary storage with a size quota, spilling over to a fallback"""
+    
+    def __init__(self, primary, fallback, quota):
+        self.primary = primary
+        self.fallback = fallback
+        self.quota = quota
+        self._lock = threading.Lock()
+    
+    def contains(self, key):
+        return self.primary.contains(key) or self.fallback.contains(key)
+    
+    def put(self, key, data):
+        # Checked and stored as one step, so a chunk never lands in both tiers
+        with self._lock:
+            if self.contains(key):
+                return
+            fits = self.primary.usage() + len(data) <= self.quota
+            (self.primary if fits else self.fallback).put(key, data)
+    
+    def get(self, key):
+        if self.primary.contains(key):
+            return self.primary.get(key)
+        return self.fallback.get(key)
+    
+    def delete(self, key):
+        self.primary.delete(key)
+        self.fallback.delete(key)
+    
+    def keys(self):
+        return list(set(self.primary.keys()) | set(self.fallback.keys()))
+    
+    def resident_size(self, key):
+        return self.primary.resident_size(key) or self.fallback.resident_size(key)
+    
+    def size(self, key):
+        return self.primary.size(key) or self.fallback.size(key)
+    
+    def demote(self, key):
+        """Move a blob to the fallback storage, returns the bytes moved"""
+        if not self.primary.contains(key):
+            return 0
+        data = self.primary.get(key)
+        self.fallback.put(key, data)
+        self.primary.delete(key)
+        return len(data)
+    
+    def usage(self):
+        return self.primary.usage() + self.fallback.usage()
+
+
+class StorageSession:
+    """Temp folders and snapshot storage of one panel session
+    
+    Backends: 'disk' keeps everything in the system temp folder, 'ram' uses
+    a tmpfs/RAM disk folder and 'memory' keeps snapshot chunks in process
+    memory. The last two spill over to disk once the quota is reached.
+    Every session folder holds a lock file, kept open while the session
+    lives, so that folders left behind by crashed sessions can be
+    recognised and removed.
+    """
+    
+    PREFIX = "qgis_mp_"
+    LOCK_FILE = "session.lock"
+    BACKENDS = ('disk', 'ram', 'memory')
+    
+    def __init__(self, backend='disk', quota_mb=512):
+        self.backend = backend if backend in self.BACKENDS else 'disk'
+        self.quota = max(0, quota_mb) * 1024 * 1024
+        self.disk_dir = tempfile.mkdtemp(prefix=self.PREFIX)
+        self.ram_dir = None
+        
+        ram_root = self.ram_root()
+        if self.backend == 'ram' and ram_root:
+            self.ram_dir = tempfile.mkdtemp(prefix=self.PREFIX, dir=ram_root)
+        elif self.backend == 'ram':
+            self.backend = 'disk'
+        
+        self.work_dir = self.ram_dir or self.disk_dir
+        self._lock_files = []
+        for folder in (self.disk_dir, self.ram_dir):
+            if folder:
+                self._write_lock(folder)
+        
+        self.storage = self._create_storage()
+    
+    @staticmethod
+    def ram_root():
+        """Writable tmpfs folder, if the platform has one"""
+        for candidate in ("/dev/shm", os.environ.get("XDG_RUNTIME_DIR")):
+            if candidate and os.path.isdir(candidate) and os.access(candidate, os.W_OK):
+                return candidate
+        return None
+    
+    def _write_lock(self, folder):
+        # Left open: on Windows an open file cannot be removed by others
+        f = open(os.path.join(folder, self.LOCK_FILE), "w")
+        json.dump({'pid': os.getpid(), 'started': time.time()}, f)
+        f.flush()
+        self._lock_files.append(f)
+    
+    def _create_storage(self):
+        disk = DiskStorage(os.path.join(self.disk_dir, "chunks"))
+        if self.backend == 'memory':
+            return TieredStorage(MemoryStorage(), disk, self.quota)
+        if self.backend == 'ram':
+            ram = DiskStorage(os.path.join(self.ram_dir, "chunks"), volatile=True)
+            return TieredStorage(ram, disk, self.quota)
+        return disk
+    
+    def cleanup(self):
+        for f in self._lock_files:
+            f.close()
+        self._lock_files.clear()
+        for folder in (self.ram_dir, self.disk_dir):
+            if folder:
+                shutil.rmtree(folder, ignore_errors=True)
+    
+    @staticmethod
+    def _pid_alive(pid):
+        if os.name == "nt":
+            # os.kill() terminates processes on Windows: unknown
+            return None
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True
+        return True
+    
+    @classmethod
+    def collect_stale(cls, max_age_hours=48):
+        """Remove session folders left behind by crashed sessions"""
+        removed = 0
+        roots = {tempfile.gettempdir(), cls.ram_root()}
+        for root in filter(None, roots):
+            try:
+                entries = os.listdir(root)
+            except OSError:
+                continue
+            for entry in entries:
+                folder = os.path.join(root, entry)
+                if not entry.startswith(cls.PREFIX) or not os.path.isdir(folder):
+                    continue
+                if cls._is_stale(folder, max_age_hours):
+                    shutil.rmtree(folder, ignore_errors=True)
+                    removed += 1
+        return removed
+    
+    @classmethod
+    def _is_stale(cls, folder, max_age_hours):
+        lock_path = os.path.join(folder, cls.LOCK_FILE)
+        try:
+            with open(lock_path) as f:
+                lock = json.load(f)
+            pid = int(lock.get('pid', 0))
+            started = float(lock.get('started', 0))
+        except (OSError, ValueError, TypeError):
+            pid = 0
+            try:
+                started = os.path.getmtime(folder)
+            except OSError:
+                return False
+        
+        if pid == os.getpid():
+            return False
+        alive = cls._pid_alive(pid) if pid else False
+        if alive is None:
+            # A live session keeps its lock file open, which makes it impossible to remove
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                return False
+            else:
+                return True
+        if alive:
+            return False
+        if alive is False and pid:
+            return True
+        return time.time() - started > max_age_hours * 3600
+
+
+class SnapshotStore:
+    """Content-addressed chunk store for project snapshots
+    
+    A snapshot is a manifest listing, for every member of the project
+    archive, the hashes of the chunks it is made of. The project XML is cut
+    at <maplayer> boundaries so that editing one layer only produces new
+    chunks for that layer; binary members are cut in fixed-size blocks.
+    Chunks are shared between all snapshots and reference counted, and
+    live in a pluggable blob storage (disk, RAM disk or memory).
+    """
+    
+    MAX_CHUNK_SIZE = 64 * 1024
+    XML_BOUNDARIES = (
+        b"<homePath", b"<maplayer", b"</projectlayers>", b"<layer-tree-group", b"<layouts",
+        b"<mapcanvas", b"</mapcanvas>"
+    )
+    # The first chunk (root tag with saveDateTime) and the canvas view
+    # change on every save and pan without changing what a project shows
+    VIEW_STATE = b"<mapcanvas"
+    
+    def __init__(self, storage, scratch_format="qgz"):
+        self.storage = storage
+        self.scratch_format = scratch_format
+        self._refs = {}
+        self._writing = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def on_disk(cls, folder):
+        return cls(DiskStorage(os.path.join(folder, "chunks")))
+    
+    def has_chunk(self, digest):
+        return self.storage.contains(digest)
+    
+    def _split_xml(self, data):
+        chunks = []
+        current = []
+        current_size = 0
+        for line in data.splitlines(keepends=True):
+            if current and (line.lstrip().startswith(self.XML_BOUNDARIES) or
+                            current_size >= self.MAX_CHUNK_SIZE):
+                chunks.append(b"".join(current))
+                current = []
+                current_size = 0
+            current.append(line)
+            current_size += len(line)
+        if current:
+            chunks.append(b"".join(current))
+        return chunks
+    
+    def _split_binary(self, data):
+        return [data[i:i + self.MAX_CHUNK_SIZE]
+                for i in range(0, len(data), self.MAX_CHUNK_SIZE)] or [b""]
+    
+    def put_chunk(self, data, retain=False):
+        """Store a chunk; with retain, its reference is taken in the same step"""
+        digest = hashlib.sha1(data).hexdigest()
+        self._store(digest, lambda: zlib.compress(data, 1), retain)
+        return digest
+    
+    def _store(self, digest, blob, retain):
+        """Write blob() as digest unless it is already stored
+        
+        The digest is counted as referenced under the lock before anything
+        else, so a release() on another thread cannot delete it meanwhile;
+        compressing and writing happen outside the lock, and concurrent
+        stores of the same digest wait for the first writer.
+        """
+        with self._lock:
+            self._refs[digest] = self._refs.get(digest, 0) + 1
+            writing = None
+            owner = False
+            if not self.storage.contains(digest):
+                writing = self._writing.get(digest)
+                if writing is None:
+                    writing = self._writing[digest] = threading.Event()
+                    owner = True
+        try:
+            if owner:
+                try:
+                    self.storage.put(digest, blob())
+                finally:
+                    with self._lock:
+                        del self._writing[digest]
+                    writing.set()
+            elif writing is not None:
+                writing.wait()
+                if not self.storage.contains(digest):
+                    self.storage.put(digest, blob())
+        except BaseException:
+            self._release_digests([digest])
+            raise
+        if not retain:
+            # Only reserved while writing: the chunk stays, unreferenced
+            with self._lock:
+                count = self._refs.get(digest, 0) - 1
+                if count > 0:
+                    self._refs[digest] = count
+                else:
+                    self._refs.pop(digest, None)
+    
+    def get_chunk(self, digest):
+        return zlib.decompress(self.storage.get(digest))
+    
+    def _put_member(self, name, data, content):
+        """Store a member, adding the digests that make up its content to content"""
+        if name.lower().endswith(".qgs"):
+            pieces = self._split_xml(data)
+        else:
+            pieces = self._split_binary(data)
+        digests = []
+        try:
+            for piece in pieces:
+                digests.append(self.put_chunk(piece, retain=True))
+        except BaseException:
+            self._release_digests(digests)
+            raise
+        if name.lower().endswith(".qgs"):
+            content.append([name] + [d for i, (d, piece) in enumerate(zip(digests, pieces))
+                                     if i and not piece.lstrip().startswith(self.VIEW_STATE)])
+        else:
+            content.append([name] + digests)
+        return [name, digests]
+    
+    @staticmethod
+    def _content_revision(content):
+        return hashlib.sha1(json.dumps(content).encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def sidecar_path(file_path):
+        """Auxiliary storage written next to uncompressed .qgs projects"""
+        return os.path.splitext(file_path)[0] + ".qgd"
+    
+    def ingest(self, file_path):
+        """Store a project file and return its (retained) manifest
+        
+        Every chunk is retained as it is stored, so the manifest is safe
+        from concurrent releases from the first chunk on.
+        """
+        members = []
+        content = []
+        try:
+            if zipfile.is_zipfile(file_path):
+                fmt = "qgz"
+                with zipfile.ZipFile(file_path) as zf:
+                    for info in zf.infolist():
+                        members.append(self._put_member(info.filename, zf.read(info), content))
+            else:
+                fmt = "qgs"
+                for path in (file_path, self.sidecar_path(file_path)):
+                    if os.path.exists(path):
+                        with open(path, "rb") as f:
+                            members.append(self._put_member(os.path.basename(path), f.read(), content))
+        except BaseException:
+            self._release_digests(d for _name, digests in members for d in digests)
+            raise
+        
+        # Relative datasources in the XML are relative to where it was read from
+        manifest = {
+            'format': fmt,
+            'members': members,
+            'base': os.path.dirname(os.path.abspath(file_path)),
+            'revision': self._content_revision(content),
+        }
+        return manifest
+    
+    def read_member(self, manifest, name):
+        for member_name, digests in manifest['members']:
+            if member_name == name:
+                return b"".join(self.get_chunk(d) for d in digests)
+        return None
+    
+    def read_metadata(self, manifest):
+        """ProjectXmlReader metadata of a snapshot, read from its chunks"""
+        for name, _digests in manifest['members']:
+            if name.lower().endswith(".qgs"):
+                return ProjectXmlReader.parse(self.read_member(manifest, name))
+        return None
+    
+    def materialize(self, manifest, file_path):
+        """Rebuild the project file described by a manifest"""
+        if manifest['format'] == "qgz":
+            # Scratch archives are read once and thrown away: skip deflate
+            with zipfile.ZipFile(file_path, "w", zipfile.ZIP_STORED) as zf:
+                for name, digests in manifest['members']:
+                    zf.writestr(name, b"".join(self.get_chunk(d) for d in digests))
+        else:
+            targets = [file_path, self.sidecar_path(file_path)]
+            for target, (_name, digests) in zip(targets, manifest['members']):
+                with open(target, "wb") as f:
+                    for digest in digests:
+                        f.write(self.get_chunk(digest))
+        return file_path
+    
+    def patch_xml(self, manifest, patch):
+        """Retained copy of a snapshot whose project XML went through patch(bytes) -> bytes"""
+        members = []
+        content = []
+        try:
+            for name, digests in manifest['members']:
+                if name.lower().endswith(".qgs"):
+                    members.append(self._put_member(name, patch(self.read_member(manifest, name)), content))
+                else:
+                    self._retain_digests(digests)
+                    members.append([name, list(digests)])
+                    content.append([name] + list(digests))
+        except BaseException:
+            self._release_digests(d for _name, digests in members for d in digests)
+            raise
+        patched = {
+            'format': manifest['format'],
+            'members': members,
+            'base': manifest.get('base'),
+            'revision': self._content_revision(content),
+        }
+        return patched
+    
+    def import_manifest(self, manifest, source, retain=True):
+        """Copy the chunks of a manifest from another store, skipping known ones
+        
+        Without retain no reference is taken, for stores that drop unused
+        chunks by themselves.
+        """
+        retained = []
+        try:
+            for _name, digests in manifest['members']:
+                for digest in digests:
+                    self._store(digest, lambda d=digest: source.storage.get(d), retain)
+                    if retain:
+                        retained.append(digest)
+        except BaseException:
+            self._release_digests(retained)
+            raise
+        return manifest
+    
+    @staticmethod
+    def revision(manifest):
+        """Stable content revision id of a snapshot, computed once when it was stored
+        
+        Only layers, layer tree, layouts and settings count: saving again or
+        panning gives the same revision, so previews keyed by it survive.
+        """
+        if not manifest:
+            return None
+        revision = manifest.get('revision')
+        if revision is None:
+            # Snapshots stored before revisions were kept in the manifest
+            revision = manifest['revision'] = hashlib.sha1(
+                json.dumps(manifest['members']).encode("utf-8")).hexdigest()
+        return revision
+    
+    def retain(self, manifest):
+        if manifest:
+            self._retain_digests(d for _name, digests in manifest['members'] for d in digests)
+    
+    def release(self, manifest):
+        if manifest:
+            self._release_digests(d for _name, digests in manifest['members'] for d in digests)
+    
+    def _retain_digests(self, digests):
+        with self._lock:
+            for digest in digests:
+                self._refs[digest] = self._refs.get(digest, 0) + 1
+    
+    def _release_digests(self, digests):
+        with self._lock:
+            for digest in digests:
+                count = self._refs.get(digest, 0) - 1
+                if count > 0:
+                    self._refs[digest] = count
+                    continue
+                self._refs.pop(digest, None)
+                self.storage.delete(digest)
+    
+    def usage(self):
+        return self.storage.usage()
+    
+    def resident_size(self, manifest):
+        """Bytes of a snapshot held in memory, shared chunks split between their users"""
+        if not manifest:
+            return 0
+        total = 0.0
+        with self._lock:
+            refs = dict(self._refs)
+        for _name, digests in manifest['members']:
+            for digest in digests:
+                size = self.storage.resident_size(digest)
+                if size:
+                    total += size / max(1, refs.get(digest, 1))
+        return int(total)
+    
+    def stored_size(self, manifest):
+        """Bytes of a snapshot in storage, memory or disk, shared chunks split between their users"""
+        if not manifest:
+            return 0
+        uses = Counter(d for _name, digests in manifest['members'] for d in digests)
+        with self._lock:
+            refs = dict(self._refs)
+        return int(sum(
+            self.storage.size(digest) * min(1.0, count / max(1, refs.get(digest, count)))
+            for digest, count in uses.items()
+        ))
+    
+    def demote(self, manifest, keep=()):
+        """Move the chunks of a snapshot (except those in keep) to the disk tier"""
+        if not manifest or not isinstance(self.storage, TieredStorage):
+            return 0
+        moved = 0
+        for _name, digests in manifest['members']:
+            for digest in digests:
+                if digest not in keep:
+                    moved += self.storage.demote(digest)
+        return moved
+
+
+class SqliteStorage:
+    """Blob storage in the chunks table of a workspace database
+    
+    Statements are not committed here: they belong to the caller's
+    transaction.
+    """
+    
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def contains(self, key):
+        return self.conn.execute("SELECT 1 FROM chunks WHERE digest = ?", (key,)).fetchone() is not None
+    
+    def put(self, key, data):
+        self.conn.execute("INSERT OR IGNORE INTO chunks (digest, data) VALUES (?, ?)", (key, sqlite3.Binary(data)))
+    
+    def get(self, key):
+        row = self.conn.execute("SELECT data FROM chunks WHERE digest = ?", (key,)).fetchone()
+        if row is None:
+            raise OSError(f"Missing blob {key}")
+        return bytes(row[0])
+    
+    def delete(self, key):
+        self.conn.execute("DELETE FROM chunks WHERE digest = ?", (key,))
+    
+    def keys(self):
+        return [row[0] for row in self.conn.execute("SELECT digest FROM chunks")]
+    
+    def rewrite(self, key, data):
+        self.conn.execute("UPDATE chunks SET data = ? WHERE digest = ?", (sqlite3.Binary(data), key))
+    
+    def resident_size(self, key):
+        return 0
+    
+    def size(self, key):
+        row = self.conn.execute("SELECT LENGTH(data) FROM chunks WHERE digest = ?", (key,)).fetchone()
+        return row[0] if row else 0
+    
+    def usage(self):
+        return self.conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM chunks").fetchone()[0]
+
+
+class WorkspaceDatabase:
+    """SQLite workspace (.mpdb) kept up to date while the session changes
+    
+    Projects, bookmarks, extent histories, thumbnails, snapshot chunks and
+    search rows each have their own indexed table. sync() compares the open
+    projects with what it last wrote and only touches the rows that changed,
+    in one transaction; bookmark edits are written as they happen through
+    the BookmarkStore journal. JSON .mpw workspaces can be imported and
+    exported.
+    """
+    
+    SUFFIX = ".mpdb"
+    SCHEMA_VERSION = 1
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            saved_file TEXT,
+            crs TEXT,
+            xmin REAL, ymin REAL, xmax REAL, ymax REAL,
+            layer_count INTEGER,
+            linked INTEGER,
+            notes TEXT,
+            created TEXT,
+            last_modified TEXT,
+            revision TEXT,
+            manifest TEXT
+        );
+        CREATE TABLE IF NOT EXISTS bookmarks (
+            id INTEGER PRIMARY KEY,
+            project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+            name TEXT NOT NULL COLLATE NOCASE,
+            crs TEXT,
+            xmin REAL, ymin REAL, xmax REAL, ymax REAL,
+            created REAL
+        );
+        CREATE INDEX IF NOT EXISTS bookmarks_project ON bookmarks(project_id);
+        CREATE INDEX IF NOT EXISTS bookmarks_name ON bookmarks(name);
+        CREATE INDEX IF NOT EXISTS bookmarks_extent ON bookmarks(crs, xmin, xmax);
+        CREATE TABLE IF NOT EXISTS histories (
+            project_id INTEGER PRIMARY KEY REFERENCES projects(id) ON DELETE CASCADE,
+            data TEXT
+        );
+        CREATE TABLE IF NOT EXISTS thumbnails (
+            project_id INTEGER PRIMARY KEY REFERENCES projects(id) ON DELETE CASCADE,
+            revision TEXT,
+            png BLOB
+        );
+        CREATE TABLE IF NOT EXISTS search_rows (
+            project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+            kind TEXT NOT NULL,
+            key TEXT,
+            text TEXT NOT NULL COLLATE NOCASE
+        );
+        CREATE INDEX IF NOT EXISTS search_rows_project ON search_rows(project_id);
+        CREATE INDEX IF NOT EXISTS search_rows_text ON search_rows(text);
+        CREATE TABLE IF NOT EXISTS chunks (digest TEXT PRIMARY KEY, data BLOB);
+    """
+    FIELDS = ('name', 'saved_file', 'crs', 'layer_count', 'linked', 'notes', 'created', 'last_modified')
+    
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(self.SCHEMA)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('schema', ?)", (str(self.SCHEMA_VERSION),)
+            )
+        self.chunks = SnapshotStore(SqliteStorage(self.conn))
+        self._projects = {}
+        self._stores = {}
+        self._states = {}
+        self._bookmark_rows = {}
+        self._revisions = {}
+    
+    @staticmethod
+    def remove(path):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    
+    def close(self):
+        for store in self._stores:
+            store.journal = None
+        self._projects.clear()
+        self._stores.clear()
+        self.conn.close()
+    
+    def meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+    
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+    
+    def current(self):
+        return int(self.meta('current', 0))
+    
+    # Writing
+    
+    def _revision(self, proj):
+        cached = self._revisions.get(proj)
+        if cached is None or cached[0] is not proj.snapshot:
+            cached = self._revisions[proj] = (proj.snapshot, SnapshotStore.revision(proj.snapshot))
+        return cached[1]
+    
+    @classmethod
+    def _values(cls, fields, extent, position):
+        extent = list(extent) if extent and len(extent) == 4 else [None] * 4
+        values = [fields.get(key) for key in cls.FIELDS]
+        values[cls.FIELDS.index('linked')] = int(bool(fields.get('linked', True)))
+        return tuple([position] + values + extent)
+    
+    def _insert_project(self, values):
+        columns = ('position',) + self.FIELDS + ('xmin', 'ymin', 'xmax', 'ymax')
+        cursor = self.conn.execute(
+            f"INSERT INTO projects ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", values
+        )
+        return cursor.lastrowid
+    
+    def _update_project(self, project_id, values):
+        columns = ('position',) + self.FIELDS + ('xmin', 'ymin', 'xmax', 'ymax')
+        self.conn.execute(
+            f"UPDATE projects SET {', '.join(c + ' = ?' for c in columns)} WHERE id = ?",
+            values + (project_id,)
+        )
+    
+    def _write_snapshot(self, project_id, manifest, source):
+        if manifest:
+            # Unused chunks are collected from the manifests on save, not counted
+            self.chunks.import_manifest(manifest, source, retain=False)
+        self.conn.execute(
+            "UPDATE projects SET revision = ?, manifest = ? WHERE id = ?",
+            (SnapshotStore.revision(manifest), json.dumps(manifest) if manifest else None, project_id)
+        )
+    
+    def _write_search_rows(self, project_id, name, notes, metadata):
+        self.conn.execute("DELETE FROM search_rows WHERE project_id = ?", (project_id,))
+        rows = [(project_id, 'project', None, name)]
+        if notes:
+            rows.append((project_id, 'notes', None, notes))
+        for layer in (metadata or {}).get('layers', []):
+            rows.append((project_id, 'layer', layer['id'], layer['name']))
+        self.conn.executemany(
+            "INSERT INTO search_rows (project_id, kind, key, text) VALUES (?, ?, ?, ?)", rows
+        )
+    
+    def _write_history(self, project_id, history_data):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO histories (project_id, data) VALUES (?, ?)",
+            (project_id, json.dumps(history_data))
+        )
+    
+    def _insert_bookmarks(self, project_id, store, first_row):
+        for row in range(first_row, len(store)):
+            cursor = self.conn.execute(
+                "INSERT INTO bookmarks (project_id, name, crs, xmin, ymin, xmax, ymax, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (project_id, store.names[row], store.crs[row], *store.extents[row * 4:row * 4 + 4],
+                 store.created[row])
+            )
+            self._bookmark_rows[store.ids[row]] = cursor.lastrowid
+    
+    def _collect_chunks(self):
+        used = set()
+        for (manifest,) in self.conn.execute("SELECT manifest FROM projects WHERE manifest IS NOT NULL"):
+            for _name, digests in json.loads(manifest)['members']:
+                used.update(digests)
+        for digest in self.chunks.storage.keys():
+            if digest not in used:
+                self.chunks.storage.delete(digest)
+    
+    @staticmethod
+    def _history_key(history):
+        count = len(history)
+        return (count, history.current_index, history.entry(count - 1)['time'] if count else None)
+    
+    def _attach(self, proj, project_id):
+        self._projects[proj] = project_id
+        self._stores[proj.bookmarks] = project_id
+        proj.bookmarks.journal = self
+    
+    def sync(self, projects, current_index):
+        """Write what changed since the last sync, in one transaction"""
+        snapshots_changed = False
+        with self.conn:
+            for position, proj in enumerate(projects):
+                values = self._values(proj.fields(), proj.extent, position)
+                revision = self._revision(proj)
+                state = self._states.setdefault(proj, {})
+                project_id = self._projects.get(proj)
+                
+                if project_id is None:
+                    project_id = self._insert_project(values)
+                    self._insert_bookmarks(project_id, proj.bookmarks, 0)
+                    self._attach(proj, project_id)
+                elif state.get('values') != values:
+                    self._update_project(project_id, values)
+                state['values'] = values
+                
+                if state.get('revision', False) != revision:
+                    self._write_snapshot(project_id, proj.snapshot, proj.store)
+                    snapshots_changed = True
+                    state['revision'] = revision
+                
+                search_key = (revision, proj.name, proj.notes)
+                if state.get('search') != search_key:
+                    self._write_search_rows(project_id, proj.name, proj.notes, proj.read_metadata())
+                    state['search'] = search_key
+                
+                history_key = self._history_key(proj.extent_history)
+                if state.get('history') != history_key:
+                    self._write_history(project_id, proj.extent_history.to_dict())
+                    state['history'] = history_key
+            
+            for proj in [p for p in self._projects if p not in projects]:
+                self.conn.execute("DELETE FROM projects WHERE id = ?", (self._projects.pop(proj),))
+                self._stores.pop(proj.bookmarks, None)
+                self._states.pop(proj, None)
+                self._revisions.pop(proj, None)
+                proj.bookmarks.journal = None
+                snapshots_changed = True
+            
+            if snapshots_changed:
+                self._collect_chunks()
+            if self.meta('current') != str(current_index):
+                self._set_meta('current', current_index)
+    
+    def save_thumbnail(self, proj, image):
+        project_id = self._projects.get(proj)
+        if project_id is not None:
+            self.store_thumbnail(project_id, self._revision(proj), image)
+    
+    def store_thumbnail(self, project_id, revision, image):
+        with self.conn:
+            if image is None or image.isNull():
+                self.conn.execute("DELETE FROM thumbnails WHERE project_id = ?", (project_id,))
+                return
+            data = QByteArray()
+            buffer = QBuffer(data)
+            buffer.open(QIODevice.WriteOnly)
+            image.save(buffer, "PNG")
+            buffer.close()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO thumbnails (project_id, revision, png) VALUES (?, ?, ?)",
+                (project_id, revision, sqlite3.Binary(bytes(data)))
+            )
+    
+    # BookmarkStore journal
+    
+    def bookmarks_added(self, store, first_row):
+        project_id = self._stores.get(store)
+        if project_id is not None:
+            with self.conn:
+                self._insert_bookmarks(project_id, store, first_row)
+    
+    def bookmark_renamed(self, store, row):
+        rowid = self._bookmark_rows.get(store.ids[row])
+        if rowid is not None:
+            with self.conn:
+                self.conn.execute("UPDATE bookmarks SET name = ? WHERE id = ?", (store.names[row], rowid))
+    
+    def bookmark_removed(self, store, bookmark_id):
+        rowid = self._bookmark_rows.pop(bookmark_id, None)
+        if rowid is not None:
+            with self.conn:
+                self.conn.execute("DELETE FROM bookmarks WHERE id = ?", (rowid,))
+    
+    def bookmarks_cleared(self, store):
+        project_id = self._stores.get(store)
+        for bookmark_id in store.ids:
+            self._bookmark_rows.pop(bookmark_id, None)
+        if project_id is not None:
+            with self.conn:
+                self.conn.execute("DELETE FROM bookmarks WHERE project_id = ?", (project_id,))
+    
+    # Reading
+    
+    def projects(self):
+        """(id, name, layer count) of the stored projects, without loading them"""
+        return self.conn.execute("SELECT id, name, layer_count FROM projects ORDER BY position").fetchall()
+    
+    def iter_bookmarks(self, project_id, rowids=None):
+        """Stream the bookmarks of a project as BookmarkStore.extend records"""
+        cursor = self.conn.execute(
+            "SELECT id, name, crs, xmin, ymin, xmax, ymax, created FROM bookmarks "
+            "WHERE project_id = ? ORDER BY id", (project_id,)
+        )
+        for rowid, name, crs, xmin, ymin, xmax, ymax, created in cursor:
+            if rowids is not None:
+                rowids.append(rowid)
+            yield (name, [xmin, ymin, xmax, ymax], crs, created)
+    
+    def bookmarks_in_extent(self, extent, crs):
+        """(project id, bookmark id, name) of the stored bookmarks intersecting an extent"""
+        return self.conn.execute(
+            "SELECT project_id, id, name FROM bookmarks "
+            "WHERE crs = ? AND xmin <= ? AND xmax >= ? AND ymin <= ? AND ymax >= ?",
+            (crs, extent[2], extent[0], extent[3], extent[1])
+        ).fetchall()
+    
+    def search(self, prefix, limit=200):
+        """(project id, kind, key, text) of the layers, projects, notes and bookmarks starting with prefix"""
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return self.conn.execute(
+            "SELECT project_id, kind, key, text FROM search_rows WHERE text LIKE ? ESCAPE '\\' "
+            "UNION ALL "
+            "SELECT project_id, 'bookmark', id, name FROM bookmarks WHERE name LIKE ? ESCAPE '\\' "
+            "LIMIT ?", (pattern, pattern, limit)
+        ).fetchall()
+    
+    def thumbnail(self, project_id, revision=None):
+        row = self.conn.execute(
+            "SELECT revision, png FROM thumbnails WHERE project_id = ?", (project_id,)
+        ).fetchone()
+        if row is None or (revision is not None and row[0] != revision):
+            return None
+        pixmap = QPixmap()
+        pixmap.loadFromData(bytes(row[1]), "PNG")
+        return None if pixmap.isNull() else pixmap
+    
+    def load_project(self, project_id, proj, session_store, position):
+        """Fill a ProjectTab from its rows and start tracking it"""
+        columns = self.FIELDS + ('xmin', 'ymin', 'xmax', 'ymax', 'manifest')
+        row = self.conn.execute(
+            f"SELECT {', '.join(columns)} FROM projects WHERE id = ?", (project_id,)
+        ).fetchone()
+        data = dict(zip(columns, row))
+        proj.set_fields(data)
+        if data['xmin'] is not None:
+            proj.extent = [data['xmin'], data['ymin'], data['xmax'], data['ymax']]
+        
+        history = self.conn.execute("SELECT data FROM histories WHERE project_id = ?", (project_id,)).fetchone()
+        if history:
+            proj.extent_history = ExtentHistory.from_dict(json.loads(history[0]))
+        
+        if data['manifest']:
+            try:
+                proj.snapshot = session_store.import_manifest(json.loads(data['manifest']), self.chunks)
+            except OSError:
+                proj.snapshot = None
+        
+        rowids = []
+        first = len(proj.bookmarks)
+        proj.bookmarks.extend(self.iter_bookmarks(project_id, rowids))
+        for bookmark_id, rowid in zip(proj.bookmarks.ids[first:], rowids):
+            self._bookmark_rows[bookmark_id] = rowid
+        
+        revision = self._revision(proj)
+        proj.thumbnail = self.thumbnail(project_id, revision)
+        
+        self._attach(proj, project_id)
+        self._states[proj] = {
+            'values': self._values(proj.fields(), proj.extent, position),
+            'revision': revision,
+            'search': (revision, proj.name, proj.notes),
+            'history': self._history_key(proj.extent_history),
+        }
+    
+    # JSON workspaces
+    
+    @staticmethod
+    def chunk_folder(mpw_path):
+        return Path(mpw_path).parent / (Path(mpw_path).stem + "_projects")
+    
+    @classmethod
+    def is_chunk_folder(cls, dirpath, name):
+        """Tell whether the folder name in dirpath belongs to a workspace next to it"""
+        if not name.endswith("_projects"):
+            return False
+        stem = os.path.join(dirpath, name[:-len("_projects")])
+        return any(os.path.isfile(stem + suffix) for suffix in (".mpw", cls.SUFFIX))
+    
+    def import_mpw(self, mpw_path):
+        """Replace the content with a JSON .mpw workspace and its chunk folder"""
+        with open(mpw_path, 'r') as f:
+            workspace = json.load(f)
+        ws_dir = self.chunk_folder(mpw_path)
+        ws_store = SnapshotStore.on_disk(str(ws_dir)) if ws_dir.is_dir() else None
+        
+        with self.conn:
+            self.conn.execute("DELETE FROM projects")
+            for position, data in enumerate(workspace.get('projects', [])):
+                if not isinstance(data, dict):
+                    raise ValueError(f"{tr('Invalid project')}: {data!r}")
+                # Checked like imported bookmarks; a bad entry rolls the whole import back
+                bookmarks = []
+                for b in data.get('bookmarks', []):
+                    if not isinstance(b, dict):
+                        raise ValueError(f"{tr('Invalid bookmark')}: {b!r}")
+                    bookmarks.append(BookmarkStore.check_record(
+                        (b.get('name'), b.get('extent'), b.get('crs'), iso_to_epoch(b.get('created')))
+                    ))
+                fields = dict(data)
+                fields.setdefault('name', tr('Project'))
+                project_id = self._insert_project(self._values(fields, data.get('extent'), position))
+                
+                manifest = data.get('snapshot') if ws_store else None
+                metadata = None
+                if manifest:
+                    try:
+                        self._write_snapshot(project_id, manifest, ws_store)
+                        metadata = self.chunks.read_metadata(manifest)
+                    except (OSError, ValueError, ET.ParseError):
+                        self._write_snapshot(project_id, None, None)
+                self._write_search_rows(project_id, fields['name'], data.get('notes'), metadata)
+                if data.get('extent_history'):
+                    self._write_history(project_id, data['extent_history'])
+                self.conn.executemany(
+                    "INSERT INTO bookmarks (project_id, name, crs, xmin, ymin, xmax, ymax, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((project_id, name, crs or "", *extent, created)
+                     for name, extent, crs, created in bookmarks)
+                )
+            self._collect_chunks()
+            self._set_meta('current', workspace.get('current', 0))
+    
+    def export_mpw(self, mpw_path):
+        """Write the content as a JSON .mpw workspace and its chunk folder"""
+        ws_store = None
+        workspace = {'version': '7.1', 'current': self.current(), 'projects': []}
+        columns = ('id',) + self.FIELDS + ('xmin', 'ymin', 'xmax', 'ymax', 'manifest')
+        rows = self.conn.execute(f"SELECT {', '.join(columns)} FROM projects ORDER BY position").fetchall()
+        for row in rows:
+            data = dict(zip(columns, row))
+            project_id = data.pop('id')
+            manifest = data.pop('manifest')
+            extent = [data.pop(k) for k in ('xmin', 'ymin', 'xmax', 'ymax')]
+            data['extent'] = extent if extent[0] is not None else None
+            data['linked'] = bool(data['linked'])
+            history = self.conn.execute("SELECT data FROM histories WHERE project_id = ?", (project_id,)).fetchone()
+            if history:
+                data['extent_history'] = json.loads(history[0])
+            data['bookmarks'] = [
+                {'name': name, 'extent': extent, 'crs': crs, 'created': epoch_to_iso(created)}
+                for name, extent, crs, created in self.iter_bookmarks(project_id)
+            ]
+            if manifest:
+                if ws_store is None:
+                    ws_dir = self.chunk_folder(mpw_path)
+                    ws_dir.mkdir(exist_ok=True)
+                    ws_store = SnapshotStore.on_disk(str(ws_dir))
+                data['snapshot'] = ws_store.import_manifest(json.loads(manifest), self.chunks)
+            workspace['projects'].append(data)
+        
+        with open(mpw_path, 'w') as f:
+            json.dump(workspace, f, indent=2)
+
+
+class ProjectCatalog:
+    """Persistent full-text catalog of every project and workspace seen
+    
+    Project, layer, group, field and bookmark names and datasource URIs are
+    indexed with SQLite FTS5 (plain LIKE matching where FTS5 is missing).
+    Files are only parsed again when their size or mtime changed and their
+    content hash differs; parsing reads the XML, never the layers.
+    Workspaces are indexed project by project, keyed by their position
+    (.mpw) or row id (.mpdb) so a result can be opened on its own.
+    """
+    
+    PROJECT_SUFFIXES = (".qgs", ".qgz")
+    WORKSPACE_SUFFIXES = (".mpw", WorkspaceDatabase.SUFFIX)
+    
+    def __init__(self, path=None):
+        self.path = path or self.default_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, "
+            "size INTEGER, mtime REAL, sha1 TEXT, indexed REAL)"
+        )
+        try:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS entries USING fts5("
+                "name, detail, kind UNINDEXED, project_key UNINDEXED, file_id UNINDEXED, "
+                "tokenize = 'unicode61')"
+            )
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "name TEXT, detail TEXT, kind TEXT, project_key TEXT, file_id INTEGER)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_file ON entries(file_id)")
+            self.fts = False
+        self.conn.commit()
+    
+    @staticmethod
+    def default_path():
+        return os.path.join(QgsApplication.qgisSettingsDirPath(), "multi_project_canvas", "catalog.sqlite")
+    
+    def close(self):
+        self.conn.close()
+    
+    @staticmethod
+    def _hash(path):
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _metadata_entries(metadata, key=None):
+        yield (metadata.get('title') or "", "", 'project', key)
+        for layer in metadata['layers']:
+            yield (layer['name'], layer['source'], 'layer', key)
+            for field in layer.get('fields', []):
+                yield (field, layer['name'], 'field', key)
+        for group in metadata.get('groups', []):
+            yield (group, "", 'group', key)
+        for bookmark in metadata.get('bookmarks', []):
+            yield (bookmark, "", 'bookmark', key)
+    
+    @classmethod
+    def _entries(cls, path):
+        """(name, detail, kind, project key) of everything searchable in a file"""
+        suffix = Path(path).suffix.lower()
+        if suffix in cls.PROJECT_SUFFIXES:
+            metadata = ProjectXmlReader.read(path)
+            metadata['title'] = metadata['title'] or Path(path).stem
+            yield from cls._metadata_entries(metadata)
+        elif suffix == ".mpw":
+            with open(path, 'r') as f:
+                workspace = json.load(f)
+            ws_dir = WorkspaceDatabase.chunk_folder(path)
+            ws_store = SnapshotStore.on_disk(str(ws_dir)) if ws_dir.is_dir() else None
+            for position, data in enumerate(workspace.get('projects', [])):
+                yield from cls._workspace_entries(
+                    str(position), data.get('name', ''), data.get('snapshot'), ws_store,
+                    (b['name'] for b in data.get('bookmarks', []))
+                )
+        elif suffix == WorkspaceDatabase.SUFFIX:
+            conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+            try:
+                ws_store = SnapshotStore(SqliteStorage(conn))
+                for project_id, name, manifest in conn.execute(
+                        "SELECT id, name, manifest FROM projects ORDER BY position").fetchall():
+                    bookmarks = conn.execute(
+                        "SELECT name FROM bookmarks WHERE project_id = ?", (project_id,)
+                    )
+                    yield from cls._workspace_entries(
+                        str(project_id), name, json.loads(manifest) if manifest else None, ws_store,
+                        (row[0] for row in bookmarks)
+                    )
+            finally:
+                conn.close()
     
     @classmethod
-    def translate(cls, message):
-        locale = cls.get_locale()
-        if locale in cls._translations and message in cls._translations[locale]:
-            return cls._translations[locale][message]
-        return message
-
-
-def tr(message):
-    """Translate a string using the current locale."""
-    return Sketchy.translate(message)
+    def _workspace_entries(cls, key, name, manifest, ws_store, bookmarks):
+        metadata = None
+        if manifest and ws_store:
+            try:
+                metadata = ws_store.read_metadata(manifest)
+            except (OSError, ValueError, ET.ParseError):
+                metadata = None
+        if metadata:
+            metadata['title'] = name or metadata['title']
+            yield from cls._metadata_entries(metadata, key)
+        else:
+            yield (name, "", 'project', key)
+        for bookmark in bookmarks:
+            yield (bookmark, "", 'bookmark', key)
+    
+    def index_file(self, path):
+        """(Re)index one file if it changed, returns True when it was parsed"""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.forget(path)
+            return False
+        
+        row = self.conn.execute("SELECT id, size, mtime, sha1 FROM files WHERE path = ?", (path,)).fetchone()
+        if row and row[1] == stat.st_size and row[2] == stat.st_mtime:
+            return False
+        digest = self._hash(path)
+        with self.conn:
+            if row and row[3] == digest:
+                self.conn.execute(
+                    "UPDATE files SET size = ?, mtime = ? WHERE id = ?", (stat.st_size, stat.st_mtime, row[0])
+                )
+                return False
+            
+            try:
+                entries = list(self._entries(path))
+            except (OSError, ValueError, ET.ParseError, sqlite3.Error):
+                entries = []
+            if row:
+                file_id = row[0]
+                self.conn.execute("DELETE FROM entries WHERE file_id = ?", (file_id,))
+                self.conn.execute(
+                    "UPDATE files SET size = ?, mtime = ?, sha1 = ?, indexed = ? WHERE id = ?",
+                    (stat.st_size, stat.st_mtime, digest, time.time(), file_id)
+                )
+            else:
+                file_id = self.conn.execute(
+                    "INSERT INTO files (path, size, mtime, sha1, indexed) VALUES (?, ?, ?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime, digest, time.time())
+                ).lastrowid
+            self.conn.executemany(
+                "INSERT INTO entries (name, detail, kind, project_key, file_id) VALUES (?, ?, ?, ?, ?)",
+                ((name, detail, kind, key, file_id) for name, detail, kind, key in entries)
+            )
+        return True
+    
+    def index_paths(self, paths, is_canceled=None):
+        count = 0
+        for path in paths:
+            if is_canceled and is_canceled():
+                break
+            if Path(path).suffix.lower() in self.PROJECT_SUFFIXES + self.WORKSPACE_SUFFIXES:
+                count += self.index_file(path)
+        return count
+    
+    def scan(self, root, is_canceled=None, progress=None):
+        """Index every project and workspace below root and drop the vanished ones"""
+        root = os.path.abspath(root)
+        suffixes = self.PROJECT_SUFFIXES + self.WORKSPACE_SUFFIXES
+        found = []
+        for dirpath, dirs, files in os.walk(root):
+            # Workspace chunk folders only hold snapshot data
+            dirs[:] = [d for d in dirs if not WorkspaceDatabase.is_chunk_folder(dirpath, d)]
+            found.extend(os.path.join(dirpath, f) for f in files if f.lower().endswith(suffixes))
+        
+        count = 0
+        for i, path in enumerate(found):
+            if is_canceled and is_canceled():
+                return count
+            count += self.index_file(path)
+            if progress:
+                progress(100.0 * (i + 1) / len(found))
+        
+        present = set(os.path.abspath(p) for p in found)
+        prefix = os.path.join(root, "")
+        for (path,) in self.conn.execute(
+                "SELECT path FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)).fetchall():
+            if path not in present:
+                self.forget(path)
+        return count
+    
+    def forget(self, path):
+        with self.conn:
+            row = self.conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+            if row:
+                self.conn.execute("DELETE FROM entries WHERE file_id = ?", (row[0],))
+                self.conn.execute("DELETE FROM files WHERE id = ?", (row[0],))
+    
+    def search(self, text, limit=200):
+        """(path, project key, kind, name, detail) of the entries matching every word of text"""
+        words = BookmarkNameIndex.WORD_RE.findall(text)
+        if not words:
+            return []
+        if self.fts:
+            query = " ".join('"{0}"*'.format(w.replace('"', '""')) for w in words)
+            return self.conn.execute(
+                "SELECT f.path, e.project_key, e.kind, e.name, e.detail "
+                "FROM entries e JOIN files f ON f.id = e.file_id "
+                "WHERE entries MATCH ? ORDER BY rank LIMIT ?", (query, limit)
+            ).fetchall()
+        condition = " AND ".join(["(e.name || ' ' || e.detail) LIKE ?"] * len(words))
+        return self.conn.execute(
+            "SELECT f.path, e.project_key, e.kind, e.name, e.detail "
+            f"FROM entries e JOIN files f ON f.id = e.file_id WHERE {condition} LIMIT ?",
+            [f"%{w}%" for w in words] + [limit]
+        ).fetchall()
 
 
-class ThumbnailGenerator:
-    """Generates project thumbnails"""
+class WorkspaceTool:
+    """Headless workspace operations, for scripts and the command line
+    
+    Works on JSON (.mpw plus its _projects chunk folder) and SQLite (.mpdb)
+    workspaces without a dock or a map canvas. Listing and verifying only
+    parse XML and JSON; rendering thumbnails needs an initialized
+    QgsApplication, which main() starts offscreen.
+    """
+    
+    THUMBNAIL_SIZE = QSize(180, 120)
+    
+    def __init__(self, path):
+        if not os.path.isfile(path):
+            raise OSError(f"No workspace at {path}")
+        self.path = path
+        self.is_db = path.lower().endswith(WorkspaceDatabase.SUFFIX)
+        self.folder = WorkspaceDatabase.chunk_folder(path)
+    
+    # JSON workspaces, shared with the dock
     
     @staticmethod
-    def generate(project, canvas, size=QSize(180, 120)):
-        image = QImage(size, QImage.Format_ARGB32)
-        image.fill(QColor(255, 255, 255))
-        
-        settings = QgsMapSettings()
-        settings.setOutputSize(size)
-        settings.setDestinationCrs(canvas.mapSettings().destinationCrs())
-        settings.setExtent(canvas.extent())
-        settings.setLayers(canvas.layers())
-        settings.setBackgroundColor(QColor(255, 255, 255))
+    def write_mpw(file_path, projects, current, thumbnails=True):
+        """Write projects as a .mpw workspace, copying their snapshots into its chunk folder"""
+        ws_dir = WorkspaceDatabase.chunk_folder(file_path)
+        ws_dir.mkdir(exist_ok=True)
+        ws_store = SnapshotStore.on_disk(str(ws_dir))
         
-        job = QgsMapRendererSequentialJob(settings)
-        job.start()
-        job.waitForFinished()
+        workspace = {'version': '7.1', 'current': current, 'projects': []}
+        for proj in projects:
+            proj_data = proj.to_dict()
+            if proj.snapshot:
+                ws_store.import_manifest(proj.snapshot, proj.store)
+                proj_data['snapshot'] = proj.snapshot
+                if thumbnails and proj.thumbnail is not None:
+                    WorkspaceTool.save_mpw_thumbnail(ws_dir, proj.revision(), proj.thumbnail.toImage())
+            workspace['projects'].append(proj_data)
         
-        return QPixmap.fromImage(job.renderedImage())
+        with open(file_path, 'w') as f:
+            json.dump(workspace, f, indent=2)
+        return ws_dir
+    
+    @staticmethod
+    def mpw_thumbnail_path(ws_dir, revision):
+        return os.path.join(str(ws_dir), "thumbnails", f"{revision}.png")
+    
+    @classmethod
+    def save_mpw_thumbnail(cls, ws_dir, revision, image):
+        path = cls.mpw_thumbnail_path(ws_dir, revision)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return image.save(path, "PNG")
+    
+    @classmethod
+    def load_mpw_thumbnail(cls, ws_dir, revision):
+        path = cls.mpw_thumbnail_path(ws_dir, revision)
+        if not revision or not os.path.exists(path):
+            return None
+        pixmap = QPixmap(path)
+        return None if pixmap.isNull() else pixmap
+    
+    def _read_mpw(self):
+        with open(self.path, 'r') as f:
+            return json.load(f)
+    
+    def _mpw_store(self):
+        return SnapshotStore.on_disk(str(self.folder)) if self.folder.is_dir() else None
+    
+    def _manifests(self):
+        """(database or None, chunk store, [(name, project key, manifest)]) of the workspace"""
+        if self.is_db:
+            db = WorkspaceDatabase(self.path)
+            rows = db.conn.execute("SELECT id, name, manifest FROM projects ORDER BY position").fetchall()
+            return db, db.chunks, [(name, project_id, json.loads(m) if m else None) for project_id, name, m in rows]
+        workspace = self._read_mpw()
+        return None, self._mpw_store(), [
+            (data.get('name', ''), position, data.get('snapshot'))
+            for position, data in enumerate(workspace.get('projects', []))
+        ]
+    
+    # Building
+    
+    @staticmethod
+    def find_projects(folder, recursive=True):
+        found = []
+        for dirpath, dirs, files in os.walk(folder):
+            dirs[:] = sorted(
+                d for d in dirs if recursive and not WorkspaceDatabase.is_chunk_folder(dirpath, d)
+            )
+            found.extend(
+                os.path.join(dirpath, name) for name in sorted(files)
+                if name.lower().endswith(ProjectXmlReader.SUFFIXES)
+            )
+        return found
+    
+    @classmethod
+    def build(cls, path, folder, recursive=True, jobs=None, progress=None):
+        """Create a workspace holding every project found in folder; returns the project count
+        
+        Project files are parsed and chunked in a thread pool; files that
+        cannot be parsed are skipped.
+        """
+        files = cls.find_projects(folder, recursive)
+        is_db = path.lower().endswith(WorkspaceDatabase.SUFFIX)
+        work_dir = tempfile.mkdtemp(prefix=StorageSession.PREFIX)
+        try:
+            if is_db:
+                store = SnapshotStore.on_disk(work_dir)
+            else:
+                WorkspaceDatabase.chunk_folder(path).mkdir(exist_ok=True)
+                store = SnapshotStore.on_disk(str(WorkspaceDatabase.chunk_folder(path)))
+            
+            def prepare(file_path):
+                try:
+                    return file_path, ProjectXmlReader.read(file_path), store.ingest(file_path)
+                except (OSError, ValueError, ET.ParseError, zipfile.BadZipFile):
+                    return file_path, None, None
+            
+            projects = []
+            with ThreadPoolExecutor(max_workers=jobs or DatasourceHealth.MAX_WORKERS) as pool:
+                for done, (file_path, metadata, manifest) in enumerate(pool.map(prepare, files), 1):
+                    if progress:
+                        progress(done, len(files), file_path)
+                    if manifest is None:
+                        continue
+                    proj = ProjectTab(Path(file_path).stem, work_dir, store)
+                    proj.saved_file = file_path
+                    proj.apply_metadata(metadata)
+                    proj.set_snapshot(manifest)
+                    projects.append(proj)
+            
+            if is_db:
+                WorkspaceDatabase.remove(path)
+                db = WorkspaceDatabase(path)
+                try:
+                    db.sync(projects, 0)
+                finally:
+                    db.close()
+            else:
+                cls.write_mpw(path, projects, 0)
+                cls(path).compact(recompress=False)
+            return len(projects)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    @classmethod
+    def convert(cls, source, target):
+        """Copy a .mpw workspace into a new .mpdb one, or a .mpdb into a new .mpw"""
+        tool = cls(source)
+        kinds = {Path(p).suffix.lower() for p in (source, target)}
+        if kinds != {".mpw", WorkspaceDatabase.SUFFIX}:
+            raise ValueError("convert needs one .mpw and one .mpdb workspace")
+        if tool.is_db:
+            db = WorkspaceDatabase(source)
+            try:
+                db.export_mpw(target)
+            finally:
+                db.close()
+        else:
+            # Built aside, so a failed conversion leaves an existing target alone
+            partial = f"{target}.{os.getpid()}.tmp"
+            WorkspaceDatabase.remove(partial)
+            try:
+                db = WorkspaceDatabase(partial)
+                try:
+                    db.import_mpw(source)
+                finally:
+                    db.close()
+                WorkspaceDatabase.remove(target)
+                os.replace(partial, target)
+            finally:
+                WorkspaceDatabase.remove(partial)
+    
+    # Inspecting
+    
+    def list(self, layers=False):
+        """One dict per project, from metadata only"""
+        result = []
+        if self.is_db:
+            db = WorkspaceDatabase(self.path)
+            try:
+                rows = db.conn.execute(
+                    "SELECT id, name, crs, layer_count, saved_file, revision, "
+                    "(SELECT COUNT(*) FROM bookmarks b WHERE b.project_id = p.id) "
+                    "FROM projects p ORDER BY position"
+                ).fetchall()
+                for project_id, name, crs, layer_count, saved_file, revision, bookmarks in rows:
+                    entry = {'name': name, 'crs': crs, 'layers': layer_count, 'bookmarks': bookmarks,
+                             'saved_file': saved_file, 'revision': revision}
+                    if layers:
+                        entry['layer_names'] = [row[0] for row in db.conn.execute(
+                            "SELECT text FROM search_rows WHERE project_id = ? AND kind = 'layer'", (project_id,)
+                        )]
+                    result.append(entry)
+            finally:
+                db.close()
+            return result
+        
+        store = self._mpw_store()
+        for data in self._read_mpw().get('projects', []):
+            manifest = data.get('snapshot')
+            entry = {'name': data.get('name', ''), 'crs': data.get('crs'), 'layers': data.get('layer_count', 0),
+                     'bookmarks': len(data.get('bookmarks', [])), 'saved_file': data.get('saved_file'),
+                     'revision': SnapshotStore.revision(manifest)}
+            if layers:
+                metadata = None
+                if manifest and store:
+                    try:
+                        metadata = store.read_metadata(manifest)
+                    except (OSError, ValueError, ET.ParseError):
+                        pass
+                entry['layer_names'] = [layer['name'] for layer in (metadata or {}).get('layers', [])]
+            result.append(entry)
+        return result
+    
+    def verify(self):
+        """Problems found in the workspace, as readable strings; empty when it is sound"""
+        problems = []
+        try:
+            db, store, manifests = self._manifests()
+        except (OSError, ValueError, sqlite3.Error) as e:
+            return [f"{self.path}: {e}"]
+        try:
+            if db is not None:
+                for (message,) in db.conn.execute("PRAGMA integrity_check"):
+                    if message != "ok":
+                        problems.append(f"database: {message}")
+            for name, _key, manifest in manifests:
+                if not manifest:
+                    continue
+                if store is None:
+                    problems.append(f"{name}: chunk folder missing")
+                    continue
+                for member, digests in manifest['members']:
+                    for digest in digests:
+                        try:
+                            data = store.get_chunk(digest)
+                        except (OSError, zlib.error) as e:
+                            problems.append(f"{name}: {member}: chunk {digest}: {e}")
+                            continue
+                        if hashlib.sha1(data).hexdigest() != digest:
+                            problems.append(f"{name}: {member}: chunk {digest} is corrupt")
+                try:
+                    store.read_metadata(manifest)
+                except (OSError, ValueError, ET.ParseError, zlib.error) as e:
+                    problems.append(f"{name}: project document: {e}")
+        finally:
+            if db is not None:
+                db.close()
+        return problems
+    
+    # Maintenance
+    
+    def compact(self, recompress=True, level=9):
+        """Drop unreferenced chunks, previews and thumbnails, recompress chunks; returns bytes saved"""
+        db, chunks, manifests = self._manifests()
+        if chunks is None:
+            return 0
+        conn = db.conn if db is not None else None
+        try:
+            before = chunks.usage()
+            used = set()
+            revisions = set()
+            for _name, _key, manifest in manifests:
+                if manifest:
+                    revisions.add(SnapshotStore.revision(manifest))
+                    for _member, digests in manifest['members']:
+                        used.update(digests)
+            
+            if conn is not None:
+                conn.execute("BEGIN")
+            for digest in list(chunks.storage.keys()):
+                if digest not in used:
+                    chunks.storage.delete(digest)
+                elif recompress:
+                    data = chunks.storage.get(digest)
+                    packed = zlib.compress(zlib.decompress(data), level)
+                    if len(packed) < len(data):
+                        chunks.storage.rewrite(digest, packed)
+            if conn is not None:
+                conn.commit()
+                conn.execute("VACUUM")
+            else:
+                self._collect_files(revisions)
+            return before - chunks.usage()
+        finally:
+            if db is not None:
+                db.close()
+    
+    def _collect_files(self, revisions):
+        """Remove leftovers of a .mpw chunk folder that no project refers to"""
+        for dirpath, _dirs, files in os.walk(str(self.folder)):
+            for name in files:
+                if name.endswith(".tmp"):
+                    os.remove(os.path.join(dirpath, name))
+        thumbnails = self.folder / "thumbnails"
+        if thumbnails.is_dir():
+            for entry in thumbnails.iterdir():
+                if entry.stem not in revisions:
+                    entry.unlink()
+        previews = self.folder / "previews"
+        if previews.is_dir():
+            for entry in previews.iterdir():
+                if entry.is_dir() and entry.name not in revisions:
+                    shutil.rmtree(str(entry), ignore_errors=True)
+    
+    def render_thumbnails(self, size=None, progress=None):
+        """Render and store a thumbnail of every project; returns how many were written"""
+        size = size or self.THUMBNAIL_SIZE
+        db, chunks, manifests = self._manifests()
+        work_dir = tempfile.mkdtemp(prefix=StorageSession.PREFIX)
+        written = 0
+        try:
+            for done, (name, key, manifest) in enumerate(manifests, 1):
+                if progress:
+                    progress(done, len(manifests), name)
+                if not manifest or chunks is None:
+                    continue
+                scratch = chunks.materialize(manifest, os.path.join(work_dir, f"thumbnail.{manifest['format']}"))
+                try:
+                    image = ThumbnailGenerator.render_project_file(
+                        scratch, chunks.read_metadata(manifest), size
+                    )
+                finally:
+                    remove_project_file(scratch)
+                if image is None:
+                    continue
+                revision = SnapshotStore.revision(manifest)
+                if db is not None:
+                    db.store_thumbnail(key, revision, image)
+                else:
+                    self.save_mpw_thumbnail(self.folder, revision, image)
+                written += 1
+            return written
+        finally:
+            if db is not None:
+                db.close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def index(self, catalog_path=None):
+        """Add the workspace to the project catalog; returns the indexed file count"""
+        catalog = ProjectCatalog(catalog_path)
+        try:
+            return catalog.index_paths([self.path])
+        finally:
+            catalog.close()
 
 
-class ExtentHistory:
-    """Manages extent history for back/forward navigation"""
+class ProjectTemplates:
+    """Named project templates, kept as a .mpw workspace in the QGIS profile
     
-    def __init__(self, max_size=50):
-        self.history = []
-        self.current_index = -1
-        self.max_size = max_size
-        self._updating = False
+    Templates are loaded once per session: their snapshots are imported
+    into the session store and retained, and their thumbnails come from
+    the workspace. A new project from a template only retains the same
+    snapshot, like a duplicated tab, so it shares every chunk until its
+    first change and needs no parsing or rendering to be listed.
+    """
     
-    def add(self, extent, crs):
-        if self._updating:
-            return
-        
-        if self.current_index < len(self.history) - 1:
-            self.history = self.history[:self.current_index + 1]
-        
-        if self.history:
-            last = self.history[-1]
-            if (abs(last['extent'][0] - extent.xMinimum()) < 0.0001 and
-                abs(last['extent'][1] - extent.yMinimum()) < 0.0001):
-                return
-        
-        self.history.append({
-            'extent': [extent.xMinimum(), extent.yMinimum(), 
-                      extent.xMaximum(), extent.yMaximum()],
-            'crs': crs.authid()
-        })
-        
-        if len(self.history) > self.max_size:
-            self.history.pop(0)
-        
-        self.current_index = len(self.history) - 1
+    def __init__(self, path, temp_dir, store):
+        self.path = path
+        self.temp_dir = temp_dir
+        self.store = store
+        self.templates = None
     
-    def can_go_back(self):
-        return self.current_index > 0
+    @staticmethod
+    def default_path():
+        return os.path.join(QgsApplication.qgisSettingsDirPath(), "multi_project_canvas", "templates.mpw")
     
-    def can_go_forward(self):
-        return self.current_index < len(self.history) - 1
+    def load(self):
+        if self.templates is not None:
+            return self.templates
+        self.templates = []
+        if not os.path.exists(self.path):
+            return self.templates
+        try:
+            with open(self.path, 'r') as f:
+                workspace = json.load(f)
+        except (OSError, ValueError) as e:
+            QgsMessageLog.logMessage(f"{tr('Cannot load')}: {self.path}: {e}", "Multi Project", Qgis.Warning)
+            return self.templates
+        
+        ws_dir = WorkspaceDatabase.chunk_folder(self.path)
+        ws_store = SnapshotStore.on_disk(str(ws_dir))
+        for data in workspace.get('projects', []):
+            manifest = data.get('snapshot')
+            if not manifest:
+                continue
+            template = ProjectTab(data.get('name', ''), self.temp_dir, self.store)
+            template.from_dict(data)
+            try:
+                template.snapshot = self.store.import_manifest(manifest, ws_store)
+            except OSError:
+                continue
+            template.thumbnail = WorkspaceTool.load_mpw_thumbnail(ws_dir, template.revision())
+            self.templates.append(template)
+        return self.templates
     
-    def go_back(self):
-        if self.can_go_back():
-            self.current_index -= 1
-            return self.history[self.current_index]
-        return None
+    def names(self):
+        return [template.name for template in self.load()]
     
-    def go_forward(self):
-        if self.can_go_forward():
-            self.current_index += 1
-            return self.history[self.current_index]
-        return None
+    def get(self, name):
+        return next((template for template in self.load() if template.name == name), None)
     
-    def set_updating(self, updating):
-        self._updating = updating
+    def add(self, source, name):
+        """Store a copy of source (which needs a snapshot) as template name"""
+        template = source.copy(name)
+        self._drop(name)
+        self.templates.append(template)
+        self.templates.sort(key=lambda t: t.name.lower())
+        self.save()
+    
+    def remove(self, name):
+        if self._drop(name):
+            self.save()
+    
+    def _drop(self, name):
+        template = self.get(name)
+        if template is None:
+            return False
+        self.templates.remove(template)
+        template.cleanup()
+        return True
+    
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        WorkspaceTool.write_mpw(self.path, self.templates, 0)
+        WorkspaceTool(self.path).compact(recompress=False)
+    
+    def close(self):
+        for template in self.templates or ():
+            template.cleanup()
+        self.templates = None
 
 
-class ProjectBookmark:
-    """A project bookmark"""
-    def __init__(self, name, extent, crs):
-        self.name = name
-        self.extent = extent
-        self.crs = crs
-        self.created = datetime.now().isoformat()
+class ProjectTrash:
+    """Recently closed projects, kept whole so they can be reopened at once
+    
+    A closed tab keeps its snapshot, thumbnail, bookmarks (and their name
+    index), history and notes; only its bookmarks leave the shared spatial
+    index. The oldest tabs are cleaned up for good once there are more than
+    max_count of them, they hold more than max_mb (measured by size_of) or
+    they were closed more than max_age seconds ago.
+    """
+    
+    def __init__(self, size_of, max_count=20, max_mb=256, max_age=3600):
+        self.size_of = size_of
+        self.max_count = max_count
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_age = max_age
+        self.entries = []
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def add(self, proj, position):
+        proj.bookmarks.set_index(None)
+        self.entries.append((time.monotonic(), position, proj))
+        self.evict()
+    
+    def pop(self, row=-1):
+        """(project, former position) of a closed project, newest first by default"""
+        _closed, position, proj = self.entries.pop(row)
+        return proj, position
+    
+    def evict(self):
+        now = time.monotonic()
+        sizes = [self.size_of(proj) for _closed, _position, proj in self.entries]
+        total = sum(sizes)
+        while self.entries:
+            closed, _position, proj = self.entries[0]
+            if (len(self.entries) <= self.max_count and total <= self.max_bytes and
+                    now - closed <= self.max_age):
+                break
+            self.entries.pop(0)
+            total -= sizes.pop(0)
+            proj.cleanup()
+    
+    def clear(self):
+        for _closed, _position, proj in self.entries:
+            proj.cleanup()
+        self.entries.clear()
+
+
+class MemoryBudget:
+    """Per-project memory accounting and least-recently-used eviction
+    
+    The cost of a tab is estimated from what it keeps in memory: thumbnail,
+    history, bookmark columns, bookmark preview pixmaps and the snapshot
+    chunks held by RAM storage tiers (shared chunks are split between their
+    projects). Over budget, the coldest projects are trimmed first: preview
+    pixmaps are dropped (their PNGs stay on disk), then snapshot chunks move
+    to the disk tier, then thumbnails are dropped until the next render.
+    """
+    
+    def __init__(self, budget_mb, preview_cache):
+        self.budget = max(0, budget_mb) * 1024 * 1024
+        self.preview_cache = preview_cache
+    
+    def usage(self, proj):
+        thumbnail = proj.thumbnail
+        revision = proj.revision()
+        parts = {
+            'thumbnail': thumbnail.width() * thumbnail.height() * thumbnail.depth() // 8 if thumbnail else 0,
+            'history': proj.extent_history.memory_usage(),
+            'bookmarks': proj.bookmarks.memory_usage(),
+            'previews': self.preview_cache.memory_usage(revision) if revision else 0,
+            'snapshot': proj.store.resident_size(proj.snapshot),
+        }
+        parts['total'] = sum(parts.values())
+        return parts
+    
+    def enforce(self, projects, active):
+        """Evict caches of cold projects until under budget, returns {project: usage}"""
+        usages = {proj: self.usage(proj) for proj in projects}
+        total = sum(u['total'] for u in usages.values())
+        if not self.budget or total <= self.budget:
+            return usages
+        
+        cold = sorted((p for p in projects if p is not active), key=lambda p: p.last_used)
+        hot_chunks = set()
+        if active is not None and active.snapshot:
+            for _name, digests in active.snapshot['members']:
+                hot_chunks.update(digests)
+        
+        steps = (
+            ('previews', lambda p: self.preview_cache.drop_memory(p.revision())),
+            ('snapshot', lambda p: p.store.demote(p.snapshot, hot_chunks)),
+            ('thumbnail', lambda p: setattr(p, 'thumbnail', None)),
+        )
+        for part, evict in steps:
+            for proj in cold:
+                if total <= self.budget:
+                    return usages
+                if not usages[proj][part]:
+                    continue
+                evict(proj)
+                before = usages[proj]['total']
+                usages[proj] = self.usage(proj)
+                total -= before - usages[proj]['total']
+        return usages
 
 
 class ProjectTab:
-    """Represents a project with all its properties"""
+    """Represents a project with all its properties
+    
+    Instances are slotted: the extent is a packed array, the CRS id is
+    interned and timestamps are epoch seconds. Workspaces keep the ISO
+    timestamps, see fields() and set_fields().
+    """
     
-    def __init__(self, name, temp_dir):
+    __slots__ = (
+        'name', 'temp_dir', 'temp_file', 'store', 'snapshot', 'origin_file', 'saved_file',
+        'is_modified', '_extent', '_crs', 'layer_count', 'thumbnail', 'health', 'last_used',
+        'bookmarks', 'linked', 'extent_history', 'notes', 'created', 'last_modified'
+    )
+    
+    def __init__(self, name, temp_dir, store, bookmark_index=None):
         self.name = name
         self.temp_dir = temp_dir
-        self.temp_file = os.path.join(temp_dir, f"project_{id(self)}.qgz")
+        self.temp_file = os.path.join(temp_dir, f"project_{id(self)}.{store.scratch_format}")
+        self.store = store
+        self.snapshot = None
+        self.origin_file = None
         self.saved_file = None
         self.is_modified = False
         self.extent = None
         self.crs = "EPSG:4326"
         self.layer_count = 0
         self.thumbnail = None
-        self.bookmarks = []
+        self.health = None
+        self.last_used = time.monotonic()
+        self.bookmarks = BookmarkStore(bookmark_index)
+        self.linked = True
         self.extent_history = ExtentHistory()
         self.notes = ""
-        self.created = datetime.now().isoformat()
-        self.last_modified = datetime.now().isoformat()
+        self.created = time.time()
+        self.last_modified = self.created
     
-    def capture_state(self, project, canvas):
+    @property
+    def extent(self):
+        return list(self._extent) if self._extent is not None else None
+    
+    @extent.setter
+    def extent(self, value):
+        self._extent = array('d', map(float, value)) if value else None
+    
+    @property
+    def crs(self):
+        return self._crs
+    
+    @crs.setter
+    def crs(self, value):
+        self._crs = sys.intern(value) if value else value
+    
+    def capture_metadata(self, project, canvas):
+        """Record extent, CRS and layer count from the live project without writing it"""
         self.extent = [
             canvas.extent().xMinimum(),
             canvas.extent().yMinimum(),
@@ -263,20 +4767,159 @@ class ProjectTab:
         ]
         self.crs = canvas.mapSettings().destinationCrs().authid()
         self.layer_count = len(project.mapLayers())
-        self.last_modified = datetime.now().isoformat()
-        
-        if self.layer_count > 0:
-            self.thumbnail = ThumbnailGenerator.generate(project, canvas)
+        self.last_modified = time.time()
         
         self.extent_history.add(canvas.extent(), canvas.mapSettings().destinationCrs())
-        
-        return project.write(self.temp_file)
+    
+    def capture_state(self, project, canvas):
+        self.capture_metadata(project, canvas)
+        # write() renames the live project and clears its dirty flag: undo both
+        file_name, dirty = project.fileName(), project.isDirty()
+        written = project.write(self.temp_file)
+        project.setFileName(file_name)
+        project.setDirty(dirty)
+        if not written:
+            return False
+        self.set_snapshot(self.store.ingest(self.temp_file))
+        self.discard_temp_file()
+        return True
+    
+    def copy(self, name, bookmark_index=None):
+        """A new tab sharing this one's snapshot, thumbnail and bookmarks"""
+        proj = ProjectTab(name, self.temp_dir, self.store, bookmark_index)
+        proj.extent = self.extent
+        proj.crs = self.crs
+        proj.layer_count = self.layer_count
+        for b in self.bookmarks:
+            proj.bookmarks.append(b.name, b.extent, b.crs, b.created)
+        
+        if self.snapshot:
+            self.store.retain(self.snapshot)
+            proj.snapshot = self.snapshot
+        else:
+            # The origin file may be older than the snapshot: only share it when it is the state
+            proj.origin_file = self.origin_file
+        proj.thumbnail = self.thumbnail
+        return proj
+    
+    def set_snapshot(self, manifest):
+        """Replace the snapshot with an already retained manifest"""
+        old = self.snapshot
+        self.snapshot = manifest
+        self.store.release(old)
+    
+    def _scratch_path(self, fmt):
+        return os.path.splitext(self.temp_file)[0] + "." + fmt
+    
+    _render_counter = itertools.count()
+    
+    def render_spec(self, size, extent=None, crs=None):
+        """Describe a background render of the stored state for RenderScheduler"""
+        if not self.snapshot and not (self.origin_file and os.path.exists(self.origin_file)):
+            return None
+        fmt = self.snapshot['format'] if self.snapshot else None
+        return {
+            'kind': 'snapshot',
+            'store': self.store,
+            'manifest': self.snapshot,
+            'file': self.origin_file,
+            'scratch': os.path.join(self.temp_dir, f"render_{next(self._render_counter)}.{fmt}"),
+            'crs': crs or self.crs,
+            'extent': extent or self.extent,
+            'size': size,
+        }
+    
+    def read_metadata(self):
+        """ProjectXmlReader metadata of the stored state, or None"""
+        try:
+            if self.snapshot:
+                return self.store.read_metadata(self.snapshot)
+            if self.origin_file and os.path.exists(self.origin_file):
+                return ProjectXmlReader.read(self.origin_file)
+        except (OSError, ValueError, ET.ParseError):
+            pass
+        return None
+    
+    def revision(self):
+        """Content revision of the stored state, or None if there is none"""
+        if self.snapshot:
+            return SnapshotStore.revision(self.snapshot)
+        if self.origin_file and os.path.exists(self.origin_file):
+            stamp = f"{self.origin_file}|{os.path.getmtime(self.origin_file)}"
+            return hashlib.sha1(stamp.encode("utf-8")).hexdigest()
+        return None
+    
+    def health_spec(self):
+        """What DatasourceScanTask needs to read the layer sources of the stored state
+        
+        Relative sources are resolved against the folder the snapshot was
+        ingested from (usually the session temp folder), or the folder of
+        the original file when that is what gets read.
+        """
+        origin = self.origin_file if self.origin_file and os.path.exists(self.origin_file) else None
+        if self.snapshot:
+            base = self.snapshot.get('base')
+        else:
+            base = os.path.dirname(origin) if origin else None
+        return {
+            'key': self,
+            'store': self.store,
+            'manifest': self.snapshot,
+            'file': origin,
+            'base': base,
+        }
+    
+    def apply_metadata(self, metadata):
+        """Fill in state from ProjectXmlReader metadata, before any snapshot exists"""
+        self.crs = metadata.get('crs') or self.crs
+        self.extent = metadata.get('extent')
+        self.layer_count = len(metadata.get('layers', []))
+    
+    def materialize(self):
+        """Return a readable project file for the snapshot, or None
+        
+        Tabs opened in the background have no snapshot until they are first
+        switched away from: their original file is read instead.
+        """
+        if not self.snapshot:
+            if self.origin_file and os.path.exists(self.origin_file):
+                return self.origin_file
+            return self.temp_file if os.path.exists(self.temp_file) else None
+        path = self._scratch_path(self.snapshot['format'])
+        if not os.path.exists(path):
+            self.store.materialize(self.snapshot, path)
+        return path
+    
+    def discard_temp_file(self):
+        remove_project_file(self.temp_file)
+    
+    def load_into(self, project, manifest):
+        """Read a retained snapshot of this tab (without one, its origin file) into a standalone QgsProject"""
+        if manifest:
+            scratch = os.path.join(
+                self.temp_dir, f"standalone_{next(self._render_counter)}.{manifest['format']}"
+            )
+            self.store.materialize(manifest, scratch)
+            try:
+                return project.read(scratch, QgsProject.FlagDontLoadLayouts)
+            finally:
+                remove_project_file(scratch)
+        if self.origin_file and os.path.exists(self.origin_file):
+            return project.read(self.origin_file, QgsProject.FlagDontLoadLayouts)
+        return False
     
     def restore_state(self, project, canvas, iface):
         project.clear()
         
-        if os.path.exists(self.temp_file):
-            project.read(self.temp_file)
+        path = self.materialize()
+        if path:
+            project.read(path)
+            if path != self.origin_file:
+                self.discard_temp_file()
+            if path != self.saved_file:
+                # Scratch and share cache copies must never be saved over
+                project.setFileName(self.saved_file or "")
+                project.setDirty(False)
         
         if self.crs:
             crs = QgsCoordinateReferenceSystem(self.crs)
@@ -295,13 +4938,11 @@ class ProjectTab:
         self.layer_count = len(project.mapLayers())
     
     def add_bookmark(self, name, extent, crs):
-        bm = ProjectBookmark(name, extent, crs)
-        self.bookmarks.append(bm)
-        return bm
+        return self.bookmarks.append(name, extent, crs)
     
     def remove_bookmark(self, index):
         if 0 <= index < len(self.bookmarks):
-            self.bookmarks.pop(index)
+            self.bookmarks.remove(index)
     
     def to_dict(self):
         return {
@@ -310,41 +4951,57 @@ class ProjectTab:
             'extent': self.extent,
             'crs': self.crs,
             'layer_count': self.layer_count,
+            'linked': self.linked,
+            'extent_history': self.extent_history.to_dict(),
             'notes': self.notes,
             'bookmarks': [
-                {'name': b.name, 'extent': b.extent, 'crs': b.crs, 'created': b.created}
+                {'name': b.name, 'extent': b.extent, 'crs': b.crs, 'created': epoch_to_iso(b.created)}
                 for b in self.bookmarks
             ],
-            'created': self.created,
-            'last_modified': self.last_modified
+            'created': epoch_to_iso(self.created),
+            'last_modified': epoch_to_iso(self.last_modified)
         }
     
-    def from_dict(self, data):
-        self.name = data.get('name', self.name)
+    def fields(self):
+        """Scalar fields in their workspace form, keyed like WorkspaceDatabase.FIELDS"""
+        return {
+            'name': self.name,
+            'saved_file': self.saved_file,
+            'crs': self.crs,
+            'layer_count': self.layer_count,
+            'linked': self.linked,
+            'notes': self.notes,
+            'created': epoch_to_iso(self.created),
+            'last_modified': epoch_to_iso(self.last_modified)
+        }
+    
+    def set_fields(self, data):
+        """Restore the scalar fields written by fields(); missing values keep their defaults"""
+        self.name = data.get('name') or self.name
         self.saved_file = data.get('saved_file')
+        self.crs = data.get('crs') or 'EPSG:4326'
+        self.layer_count = data.get('layer_count') or 0
+        self.linked = bool(data.get('linked', True))
+        self.notes = data.get('notes') or ''
+        self.created = iso_to_epoch(data.get('created'), self.created)
+        self.last_modified = iso_to_epoch(data.get('last_modified'), self.last_modified)
+    
+    def from_dict(self, data):
+        self.set_fields(data)
         self.extent = data.get('extent')
-        self.crs = data.get('crs', 'EPSG:4326')
-        self.layer_count = data.get('layer_count', 0)
-        self.notes = data.get('notes', '')
-        self.created = data.get('created', self.created)
-        self.last_modified = data.get('last_modified', self.last_modified)
-        
-        self.bookmarks = []
-        for bm_data in data.get('bookmarks', []):
-            bm = ProjectBookmark(
-                bm_data['name'],
-                bm_data['extent'],
-                bm_data['crs']
-            )
-            bm.created = bm_data.get('created', bm.created)
-            self.bookmarks.append(bm)
+        if data.get('extent_history'):
+            self.extent_history = ExtentHistory.from_dict(data['extent_history'])
+        
+        self.bookmarks.clear()
+        self.bookmarks.extend(
+            (bm_data['name'], bm_data['extent'], bm_data['crs'], iso_to_epoch(bm_data.get('created')))
+            for bm_data in data.get('bookmarks', [])
+        )
     
     def cleanup(self):
-        if os.path.exists(self.temp_file):
-            try:
-                os.remove(self.temp_file)
-            except:
-                pass
+        self.discard_temp_file()
+        self.set_snapshot(None)
+        self.bookmarks.clear()
 
 
 class ProjectItemDelegate(QStyledItemDelegate):
@@ -369,6 +5026,8 @@ class ProjectItemDelegate(QStyledItemDelegate):
         saved_file = index.data(Qt.UserRole + 4)
         thumbnail = index.data(Qt.UserRole + 5)
         bookmark_count = index.data(Qt.UserRole + 6) or 0
+        health = index.data(Qt.UserRole + 7)
+        memory = index.data(Qt.UserRole + 8)
         
         # Background
         if option.state & QStyle.State_Selected:
@@ -436,6 +5095,8 @@ class ProjectItemDelegate(QStyledItemDelegate):
         if bookmark_count > 0:
             bm_text = tr("bookmark") if bookmark_count == 1 else tr("bookmarks")
             info_parts.append(f"{bookmark_count} {bm_text}")
+        if memory:
+            info_parts.append(format_size(memory))
         info_text = " • ".join(info_parts)
         painter.drawText(info_rect, Qt.AlignLeft | Qt.AlignVCenter, info_text)
         
@@ -448,10 +5109,34 @@ class ProjectItemDelegate(QStyledItemDelegate):
             elided_file = painter.fontMetrics().elidedText(file_text, Qt.ElideMiddle, file_rect.width())
             painter.drawText(file_rect, Qt.AlignLeft | Qt.AlignVCenter, elided_file)
         
+        if health and health['status'] in (DatasourceHealth.BROKEN, DatasourceHealth.SLOW):
+            self._paint_health_badge(painter, rect, health)
+        
         painter.setPen(QColor(230, 230, 230))
         painter.drawLine(rect.bottomLeft(), rect.bottomRight())
         
         painter.restore()
+    
+    def _paint_health_badge(self, painter, rect, health):
+        if health['status'] == DatasourceHealth.BROKEN:
+            color = QColor(211, 47, 47)
+            text = f"⚠ {health['broken']}"
+        else:
+            color = QColor(245, 124, 0)
+            text = f"⏱ {health['slow']}"
+        
+        badge_font = QFont()
+        badge_font.setPointSize(7)
+        badge_font.setBold(True)
+        painter.setFont(badge_font)
+        width = painter.fontMetrics().horizontalAdvance(text) + 10
+        badge = QRectF(rect.right() - width - 6, rect.y() + 6, width, 16)
+        
+        path = QPainterPath()
+        path.addRoundedRect(badge, 8, 8)
+        painter.fillPath(path, color)
+        painter.setPen(QColor(255, 255, 255))
+        painter.drawText(badge, Qt.AlignCenter, text)
 
 
 class CollapsibleSection(QWidget):
@@ -529,10 +5214,117 @@ class CollapsibleSection(QWidget):
         return QSize(100, 24)  # Just header height minimum
 
 
+class BookmarkListModel(QAbstractListModel):
+    """List model over a BookmarkStore; rows are only materialized when painted"""
+    
+    _icon = None
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = None
+        self.filter_text = ""
+        self.preview_provider = None
+        self._rows = None
+    
+    @classmethod
+    def icon(cls):
+        if cls._icon is None:
+            cls._icon = QgsApplication.getThemeIcon("/mActionBookmarks.svg")
+        return cls._icon
+    
+    def set_store(self, store):
+        self.beginResetModel()
+        self.store = store
+        self._apply_filter()
+        self.endResetModel()
+    
+    def set_filter(self, text):
+        self.beginResetModel()
+        self.filter_text = text.strip()
+        self._apply_filter()
+        self.endResetModel()
+    
+    def _apply_filter(self):
+        if self.store is None or not self.filter_text:
+            self._rows = None
+        else:
+            self._rows = self.store.filter_rows(self.filter_text)
+    
+    def store_row(self, row):
+        return self._rows[row] if self._rows is not None else row
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.store is None:
+            return 0
+        return len(self._rows) if self._rows is not None else len(self.store)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or self.store is None:
+            return None
+        row = self.store_row(index.row())
+        if role == Qt.DisplayRole:
+            return self.store.names[row]
+        if role == Qt.DecorationRole:
+            preview = self.preview_provider(self.store, row) if self.preview_provider else None
+            return preview or self.icon()
+        if role == Qt.ToolTipRole:
+            return self.store.crs[row]
+        if role == Qt.UserRole:
+            return self.store.ids[row]
+        return None
+    
+    def preview_ready(self, bookmark_id):
+        row = self.store.row_of(bookmark_id) if self.store is not None else None
+        if row is None:
+            return
+        if self._rows is not None:
+            pos = bisect.bisect_left(self._rows, row)
+            if pos >= len(self._rows) or self._rows[pos] != row:
+                return
+            row = pos
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+    
+    def append(self, name, extent, crs):
+        if self._rows is not None:
+            bookmark = self.store.append(name, extent, crs)
+            self.set_filter(self.filter_text)
+            return bookmark
+        row = len(self.store)
+        self.beginInsertRows(QModelIndex(), row, row)
+        bookmark = self.store.append(name, extent, crs)
+        self.endInsertRows()
+        return bookmark
+    
+    def remove(self, bookmark_id):
+        row = self.store.row_of(bookmark_id)
+        if row is None:
+            return
+        if self._rows is not None:
+            self.store.remove(row)
+            self.set_filter(self.filter_text)
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.store.remove(row)
+        self.endRemoveRows()
+    
+    def rename(self, bookmark_id, name):
+        row = self.store.row_of(bookmark_id)
+        if row is None:
+            return
+        self.store.rename(row, name)
+        if self._rows is not None:
+            self.set_filter(self.filter_text)
+        else:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+
 class BookmarkWidget(QWidget):
     """Widget to manage bookmarks for the current project"""
     
     bookmark_activated = pyqtSignal(object)
+    bookmarks_changed = pyqtSignal()
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -554,7 +5346,11 @@ class BookmarkWidget(QWidget):
         self.btn_add.clicked.connect(self.add_bookmark)
         header.addWidget(self.btn_add)
         
-        header.addStretch()
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText(tr("Filter bookmarks..."))
+        self.filter_input.setClearButtonEnabled(True)
+        self.filter_input.textChanged.connect(self._on_filter_changed)
+        header.addWidget(self.filter_input, 1)
         
         self.bookmark_count_label = QLabel("0")
         self.bookmark_count_label.setStyleSheet("color: #666; font-size: 10px;")
@@ -562,51 +5358,71 @@ class BookmarkWidget(QWidget):
         
         layout.addLayout(header)
         
-        # Bookmark list - compact by default
-        self.bookmark_list = QListWidget()
+        # The list view is only built once the section is first expanded
+        self.model = BookmarkListModel(self)
+        self.bookmark_list = None
+        self.model.rowsInserted.connect(self._update_count)
+        self.model.rowsRemoved.connect(self._update_count)
+        self.model.modelReset.connect(self._update_count)
+    
+    def ensure_list(self):
+        if self.bookmark_list is not None:
+            return
+        
+        # Bookmark list - compact by default, rows are virtual
+        self.bookmark_list = QListView()
+        self.bookmark_list.setModel(self.model)
+        self.bookmark_list.setUniformItemSizes(True)
+        self.bookmark_list.setIconSize(BookmarkPreviewQueue.SIZE)
+        self.bookmark_list.setLayoutMode(QListView.Batched)
+        self.bookmark_list.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.bookmark_list.setMinimumHeight(0)
-        self.bookmark_list.setMaximumHeight(100)
+        self.bookmark_list.setMaximumHeight(150)
         self.bookmark_list.setStyleSheet("""
-            QListWidget {
+            QListView {
                 border: 1px solid #ddd;
                 border-radius: 3px;
                 background: white;
             }
-            QListWidget::item {
+            QListView::item {
                 padding: 2px 4px;
             }
-            QListWidget::item:hover {
+            QListView::item:hover {
                 background: #f0f0f0;
             }
         """)
-        self.bookmark_list.itemDoubleClicked.connect(self._on_double_click)
+        self.bookmark_list.doubleClicked.connect(self._on_double_click)
         self.bookmark_list.setContextMenuPolicy(Qt.CustomContextMenu)
         self.bookmark_list.customContextMenuRequested.connect(self._show_menu)
-        layout.addWidget(self.bookmark_list)
+        self.layout().addWidget(self.bookmark_list)
+        self._update_count()
     
     def set_project(self, project_tab):
         self.project_tab = project_tab
         self.refresh()
     
     def refresh(self):
-        self.bookmark_list.clear()
-        if not self.project_tab:
-            self.bookmark_count_label.setText("0")
-            return
-        
-        count = len(self.project_tab.bookmarks)
-        self.bookmark_count_label.setText(str(count))
-        
-        for i, bm in enumerate(self.project_tab.bookmarks):
-            item = QListWidgetItem(QgsApplication.getThemeIcon("/mActionBookmarks.svg"), bm.name)
-            item.setData(Qt.UserRole, i)
-            self.bookmark_list.addItem(item)
+        self.model.set_store(self.project_tab.bookmarks if self.project_tab else None)
+    
+    def _on_filter_changed(self, text):
+        self.model.set_filter(text)
+    
+    def _update_count(self, *args):
+        total = len(self.project_tab.bookmarks) if self.project_tab else 0
+        shown = self.model.rowCount()
+        if shown != total:
+            self.bookmark_count_label.setText(f"{shown}/{total}")
+        else:
+            self.bookmark_count_label.setText(str(total))
         
         # Auto-adjust height based on content
-        if count == 0:
+        if self.bookmark_list is None:
+            return
+        if shown == 0:
             self.bookmark_list.setMaximumHeight(30)
         else:
-            self.bookmark_list.setMaximumHeight(min(100, count * 24 + 10))
+            row_height = BookmarkPreviewQueue.SIZE.height() + 6
+            self.bookmark_list.setMaximumHeight(min(150, shown * row_height + 10))
     
     def add_bookmark(self):
         if not self.project_tab:
@@ -615,63 +5431,71 @@ class BookmarkWidget(QWidget):
     
     def do_add_bookmark(self, name, extent, crs):
         if self.project_tab:
-            self.project_tab.add_bookmark(name, extent, crs)
-            self.refresh()
+            self.model.append(name, extent, crs)
+            self.bookmarks_changed.emit()
     
-    def _on_double_click(self, item):
-        if not self.project_tab:
+    def _on_double_click(self, index):
+        if not self.project_tab or not index.isValid():
             return
         
-        idx = item.data(Qt.UserRole)
-        if 0 <= idx < len(self.project_tab.bookmarks):
-            self.bookmark_activated.emit(self.project_tab.bookmarks[idx])
+        bookmark = self.project_tab.bookmarks.get(index.data(Qt.UserRole))
+        if bookmark:
+            self.bookmark_activated.emit(bookmark)
     
     def _show_menu(self, pos):
-        item = self.bookmark_list.itemAt(pos)
-        if not item:
+        index = self.bookmark_list.indexAt(pos)
+        if not index.isValid():
             return
         
-        idx = item.data(Qt.UserRole)
+        bookmark_id = index.data(Qt.UserRole)
         
         menu = QMenu(self)
         
         action_goto = menu.addAction(tr("Go to"))
-        action_goto.triggered.connect(lambda: self._on_double_click(item))
+        action_goto.triggered.connect(lambda: self._on_double_click(index))
         
         action_rename = menu.addAction(tr("Rename"))
-        action_rename.triggered.connect(lambda: self._rename(idx))
+        action_rename.triggered.connect(lambda: self._rename(bookmark_id))
         
         menu.addSeparator()
         
         action_delete = menu.addAction(tr("Delete"))
-        action_delete.triggered.connect(lambda: self._delete(idx))
+        action_delete.triggered.connect(lambda: self._delete(bookmark_id))
         
         menu.exec_(self.bookmark_list.mapToGlobal(pos))
     
-    def _rename(self, idx):
-        if not self.project_tab or idx >= len(self.project_tab.bookmarks):
+    def _rename(self, bookmark_id):
+        if not self.project_tab:
             return
         
-        bm = self.project_tab.bookmarks[idx]
+        bm = self.project_tab.bookmarks.get(bookmark_id)
+        if bm is None:
+            return
         name, ok = QInputDialog.getText(self, tr("Rename"), tr("Name:"), text=bm.name)
         if ok and name:
-            bm.name = name
-            self.refresh()
+            self.model.rename(bookmark_id, name)
+            self.bookmarks_changed.emit()
     
-    def _delete(self, idx):
+    def _delete(self, bookmark_id):
         if self.project_tab:
-            self.project_tab.remove_bookmark(idx)
-            self.refresh()
+            self.model.remove(bookmark_id)
+            self.bookmarks_changed.emit()
 
 
 class SearchWidget(QWidget):
     """Widget to search across projects"""
     
     result_selected = pyqtSignal(int, str)
+    catalog_selected = pyqtSignal(str, str)
+    
+    CATALOG_ICONS = {'project': "📁", 'layer': "📄", 'field': "🔤", 'group': "📂", 'bookmark': "🔖"}
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.projects = []
+        self.catalog = None
+        self.is_active = None
+        self._layers = {}
         self.setup_ui()
     
     def setup_ui(self):
@@ -693,24 +5517,35 @@ class SearchWidget(QWidget):
         
         layout.addLayout(search_layout)
         
-        self.results_tree = QTreeWidget()
-        self.results_tree.setHeaderHidden(True)
-        self.results_tree.setMaximumHeight(200)
-        self.results_tree.itemDoubleClicked.connect(self._on_result_click)
-        self.results_tree.setVisible(False)
-        layout.addWidget(self.results_tree)
+        # Built on the first search
+        self.results_tree = None
+    
+    def _ensure_results_tree(self):
+        if self.results_tree is None:
+            self.results_tree = QTreeWidget()
+            self.results_tree.setHeaderHidden(True)
+            self.results_tree.setMaximumHeight(200)
+            self.results_tree.itemDoubleClicked.connect(self._on_result_click)
+            self.layout().addWidget(self.results_tree)
+        return self.results_tree
     
     def set_projects(self, projects):
         self.projects = projects
+        open_projects = set(projects)
+        self._layers = {p: layers for p, layers in self._layers.items() if p in open_projects}
+    
+    def _hide_results(self):
+        if self.results_tree is not None:
+            self.results_tree.clear()
+            self.results_tree.setVisible(False)
     
     def do_search(self, text):
-        self.results_tree.clear()
-        
         if len(text) < 2:
-            self.results_tree.setVisible(False)
+            self._hide_results()
             self.btn_clear.setVisible(False)
             return
         
+        self._ensure_results_tree().clear()
         self.btn_clear.setVisible(True)
         text_lower = text.lower()
         has_results = False
@@ -718,16 +5553,15 @@ class SearchWidget(QWidget):
         for proj_idx, proj in enumerate(self.projects):
             proj_matches = text_lower in proj.name.lower()
             
-            layer_matches = []
-            if os.path.exists(proj.temp_file):
-                temp_proj = QgsProject()
-                temp_proj.read(proj.temp_file)
-                for layer_id, layer in temp_proj.mapLayers().items():
-                    if text_lower in layer.name().lower():
-                        layer_matches.append((layer_id, layer.name()))
-                temp_proj.clear()
+            layer_matches = [
+                (layer_id, layer_name) for layer_id, layer_name in self._layer_names(proj)
+                if text_lower in layer_name.lower()
+            ]
             
-            bookmark_matches = [bm.name for bm in proj.bookmarks if text_lower in bm.name.lower()]
+            bookmark_matches = [
+                (bm_id, bm_name) for bm_id, bm_name in zip(proj.bookmarks.ids, proj.bookmarks.names)
+                if text_lower in bm_name.lower()
+            ]
             
             if proj_matches or layer_matches or bookmark_matches:
                 has_results = True
@@ -741,29 +5575,582 @@ class SearchWidget(QWidget):
                     layer_item.setData(0, Qt.UserRole + 1, layer_id)
                     proj_item.addChild(layer_item)
                 
-                for bm_name in bookmark_matches:
+                for bm_id, bm_name in bookmark_matches:
                     bm_item = QTreeWidgetItem([f"  🔖 {bm_name}"])
                     bm_item.setData(0, Qt.UserRole, proj_idx)
-                    bm_item.setData(0, Qt.UserRole + 1, f"bookmark:{bm_name}")
+                    bm_item.setData(0, Qt.UserRole + 1, f"bookmark:{bm_id}")
                     proj_item.addChild(bm_item)
                 
                 self.results_tree.addTopLevelItem(proj_item)
                 proj_item.setExpanded(True)
         
+        if self.catalog is not None:
+            has_results = self._add_catalog_results(text) or has_results
+        
         self.results_tree.setVisible(has_results)
     
+    def _layer_names(self, proj):
+        """(id, name) of the layers of a project, from the stored XML, never loading it"""
+        if self.is_active is not None and self.is_active(proj):
+            return [(layer_id, layer.name()) for layer_id, layer in QgsProject.instance().mapLayers().items()]
+        revision = proj.revision()
+        cached = self._layers.get(proj)
+        if cached is None or cached[0] != revision:
+            metadata = proj.read_metadata() or {}
+            cached = self._layers[proj] = (
+                revision, [(layer['id'], layer['name']) for layer in metadata.get('layers', [])]
+            )
+        return cached[1]
+    
+    def _add_catalog_results(self, text):
+        try:
+            rows = self.catalog.search(text, 100)
+        except sqlite3.Error:
+            return False
+        open_files = {f for p in self.projects for f in (p.origin_file, p.saved_file) if f}
+        rows = [r for r in rows if r[0] not in open_files]
+        if not rows:
+            return False
+        
+        catalog_item = QTreeWidgetItem([f"🗂 {tr('Catalog')}"])
+        files = {}
+        for path, key, kind, name, detail in rows:
+            file_item = files.get((path, key))
+            if file_item is None:
+                label = Path(path).name if key is None else f"{Path(path).name} #{key}"
+                file_item = files[(path, key)] = QTreeWidgetItem([f"  📁 {label}"])
+                file_item.setToolTip(0, path)
+                file_item.setData(0, Qt.UserRole + 2, path)
+                file_item.setData(0, Qt.UserRole + 3, key or "")
+                catalog_item.addChild(file_item)
+            if kind == 'project':
+                continue
+            child = QTreeWidgetItem([f"    {self.CATALOG_ICONS.get(kind, '')} {name}"])
+            if detail:
+                child.setToolTip(0, detail)
+            child.setData(0, Qt.UserRole + 2, path)
+            child.setData(0, Qt.UserRole + 3, key or "")
+            file_item.addChild(child)
+        
+        self.results_tree.addTopLevelItem(catalog_item)
+        catalog_item.setExpanded(True)
+        return True
+    
     def clear_search(self):
         self.search_input.clear()
-        self.results_tree.clear()
-        self.results_tree.setVisible(False)
+        self._hide_results()
         self.btn_clear.setVisible(False)
     
     def _on_result_click(self, item, column):
+        path = item.data(0, Qt.UserRole + 2)
+        if path:
+            self.catalog_selected.emit(path, item.data(0, Qt.UserRole + 3) or "")
+            return
         proj_idx = item.data(0, Qt.UserRole)
+        if proj_idx is None:
+            return
         extra = item.data(0, Qt.UserRole + 1)
         self.result_selected.emit(proj_idx, extra or "")
 
 
+class ProjectSwitcher(QFrame):
+    """Ctrl+Tab popup listing the projects by most recent use
+    
+    Only cached thumbnails and tab metadata are shown, so cycling reads or
+    writes no project. chosen(project) is emitted once Ctrl is released, or
+    Return or a click picks a project; Escape closes it without a choice.
+    """
+    
+    ICON_SIZE = QSize(240, 160)
+    COLUMNS = 4
+    
+    chosen = pyqtSignal(object)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent, Qt.Popup | Qt.FramelessWindowHint)
+        self.setFrameShape(QFrame.StyledPanel)
+        self._order = []
+        self._projects = []
+        
+        layout = QVBoxLayout(self)
+        self.list = QListWidget()
+        self.list.setViewMode(QListView.IconMode)
+        self.list.setIconSize(self.ICON_SIZE)
+        self.list.setGridSize(self.ICON_SIZE + QSize(16, 36))
+        self.list.setMovement(QListView.Static)
+        self.list.setResizeMode(QListView.Adjust)
+        self.list.setWordWrap(True)
+        self.list.setFocusPolicy(Qt.NoFocus)
+        self.list.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.list.currentRowChanged.connect(self._show_details)
+        self.list.itemClicked.connect(lambda _item: self._accept())
+        layout.addWidget(self.list)
+        
+        self.details = QLabel()
+        self.details.setStyleSheet("color: #666;")
+        layout.addWidget(self.details)
+    
+    def open(self, projects, current, step=1):
+        """Show the projects, most recently used first, with the one step away selected"""
+        self._projects = list(projects)
+        self._order = sorted(range(len(projects)), key=lambda i: (i != current, -projects[i].last_used))
+        
+        self.list.clear()
+        placeholder = QgsApplication.getThemeIcon("/mActionNewMap.svg")
+        for i in self._order:
+            proj = projects[i]
+            item = QListWidgetItem(
+                QIcon(proj.thumbnail) if proj.thumbnail else placeholder,
+                proj.name + (" •" if proj.is_modified else "")
+            )
+            item.setSizeHint(self.list.gridSize())
+            self.list.addItem(item)
+        
+        grid = self.list.gridSize()
+        columns = min(len(self._order), self.COLUMNS)
+        rows = min((len(self._order) + columns - 1) // columns, 3)
+        self.list.setFixedSize(columns * grid.width() + 8, rows * grid.height() + 8)
+        self.adjustSize()
+        window = self.parentWidget().window() if self.parentWidget() else None
+        if window is not None:
+            self.move(window.geometry().center() - self.rect().center())
+        
+        self.list.setCurrentRow(step % len(self._order))
+        self.show()
+        self.setFocus()
+        # A quick Ctrl+Tab may be over before the popup shows up
+        QTimer.singleShot(0, self._accept_if_released)
+    
+    def step(self, step):
+        if self._order:
+            self.list.setCurrentRow((self.list.currentRow() + step) % len(self._order))
+    
+    def _show_details(self, row):
+        if not 0 <= row < len(self._order):
+            self.details.clear()
+            return
+        proj = self._projects[self._order[row]]
+        layer_text = tr("layer") if proj.layer_count == 1 else tr("layers")
+        bm_count = len(proj.bookmarks)
+        bm_text = tr("bookmark") if bm_count == 1 else tr("bookmarks")
+        parts = [proj.name, f"{proj.layer_count} {layer_text}", f"{bm_count} {bm_text}"]
+        if proj.is_modified:
+            parts.append(tr("Modified"))
+        parts.append(Path(proj.saved_file).name if proj.saved_file else tr("Not saved"))
+        self.details.setText(" • ".join(parts))
+    
+    def _accept_if_released(self):
+        if self.isVisible() and not QApplication.keyboardModifiers() & Qt.ControlModifier:
+            self._accept()
+    
+    def _accept(self):
+        row = self.list.currentRow()
+        self.hide()
+        if 0 <= row < len(self._order):
+            self.chosen.emit(self._projects[self._order[row]])
+    
+    def keyPressEvent(self, event):
+        key = event.key()
+        if key == Qt.Key_Backtab or (key == Qt.Key_Tab and event.modifiers() & Qt.ShiftModifier):
+            self.step(-1)
+        elif key in (Qt.Key_Tab, Qt.Key_Right, Qt.Key_Down):
+            self.step(1)
+        elif key in (Qt.Key_Left, Qt.Key_Up):
+            self.step(-1)
+        elif key in (Qt.Key_Return, Qt.Key_Enter):
+            self._accept()
+        elif key == Qt.Key_Escape:
+            self.hide()
+        else:
+            super().keyPressEvent(event)
+    
+    def focusNextPrevChild(self, _next):
+        # Tab cycles projects instead of moving the focus
+        return False
+    
+    def keyReleaseEvent(self, event):
+        if event.key() == Qt.Key_Control:
+            self._accept()
+        else:
+            super().keyReleaseEvent(event)
+
+
+class ComparisonCell(QFrame):
+    """Lightweight map view rendering one project from its stored state"""
+    
+    extent_changed = pyqtSignal(object)
+    
+    THROTTLE_MS = 150
+    
+    def __init__(self, proj, parent=None):
+        super().__init__(parent)
+        self.proj = proj
+        self.project = None
+        self.layers = []
+        self.crs = QgsCoordinateReferenceSystem(proj.crs)
+        self.extent = QgsRectangle()
+        self.image = None
+        self.image_extent = None
+        self.job = None
+        self._job_extent = None
+        self._stopping = set()
+        self._drag_start = None
+        self._drag_extent = None
+        
+        self.setFrameShape(QFrame.StyledPanel)
+        self.setMinimumSize(160, 120)
+        self.setCursor(Qt.OpenHandCursor)
+        
+        self._render_timer = QTimer(self)
+        self._render_timer.setSingleShot(True)
+        self._render_timer.setInterval(self.THROTTLE_MS)
+        self._render_timer.timeout.connect(self._render)
+        
+        # Reading a project can take long: never on the GUI thread
+        self.task = ProjectLoadTask(proj)
+        self.task.loaded.connect(self._on_loaded)
+        QgsApplication.taskManager().addTask(self.task)
+    
+    def _on_loaded(self, task, ok):
+        self.task = None
+        self.project = task.project
+        if ok:
+            self.layers = self.project.layerTreeRoot().checkedLayers()
+        self._render_timer.start()
+        self.update()
+    
+    def set_view(self, crs, extent):
+        self.crs = crs
+        self.extent = QgsRectangle(extent)
+        self.update()
+        # Throttle, not debounce: keep rendering while the user pans
+        if not self._render_timer.isActive():
+            self._render_timer.start()
+    
+    def _map_settings(self):
+        settings = QgsMapSettings()
+        settings.setOutputSize(self.size())
+        settings.setDestinationCrs(self.crs)
+        settings.setExtent(self.extent)
+        settings.setLayers(self.layers)
+        settings.setBackgroundColor(QColor(255, 255, 255))
+        return settings
+    
+    def visible_extent(self):
+        return self._map_settings().visibleExtent()
+    
+    def _render(self):
+        if self.job is not None:
+            # a running job must not be destroyed, its destructor cancels blocking
+            self._stopping.add(self.job)
+            self.job.cancelWithoutBlocking()
+            self.job = None
+        if not self.layers or self.extent.isEmpty():
+            return
+        
+        settings = self._map_settings()
+        self.job = QgsMapRendererParallelJob(settings)
+        self.job.finished.connect(self._on_rendered)
+        self._job_extent = settings.visibleExtent()
+        self.job.start()
+    
+    def _on_rendered(self):
+        job = self.sender()
+        job.deleteLater()
+        if job in self._stopping:
+            self._stopping.discard(job)
+            return
+        self.image = job.renderedImage()
+        self.image_extent = self._job_extent
+        self.job = None
+        self.update()
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(255, 255, 255))
+        
+        if self.image is not None and self.image_extent is not None:
+            # Place the last image where its extent falls in the current view,
+            # so panning and zooming get instant feedback until the next render
+            view = self.visible_extent()
+            if view.width() > 0 and view.height() > 0:
+                sx = self.width() / view.width()
+                sy = self.height() / view.height()
+                target = QRectF(
+                    (self.image_extent.xMinimum() - view.xMinimum()) * sx,
+                    (view.yMaximum() - self.image_extent.yMaximum()) * sy,
+                    self.image_extent.width() * sx,
+                    self.image_extent.height() * sy
+                )
+                painter.drawImage(target, self.image)
+        elif self.task is not None:
+            painter.setPen(QColor(128, 128, 128))
+            painter.drawText(QRectF(self.rect()), Qt.AlignCenter, tr("Loading..."))
+        
+        painter.fillRect(0, 0, self.width(), 20, QColor(255, 255, 255, 200))
+        painter.setPen(QColor(0, 0, 0))
+        font = QFont()
+        font.setBold(True)
+        font.setPointSize(9)
+        painter.setFont(font)
+        painter.drawText(QRectF(6, 0, self.width() - 12, 20), Qt.AlignLeft | Qt.AlignVCenter,
+                         painter.fontMetrics().elidedText(self.proj.name, Qt.ElideRight, self.width() - 12))
+        painter.end()
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._render_timer.start()
+    
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._drag_start = event.pos()
+            self._drag_extent = self.visible_extent()
+            self.setCursor(Qt.ClosedHandCursor)
+    
+    def mouseMoveEvent(self, event):
+        if self._drag_start is None or self.width() == 0:
+            return
+        units_per_pixel = self._drag_extent.width() / self.width()
+        delta = event.pos() - self._drag_start
+        extent = QgsRectangle(self._drag_extent)
+        extent.setXMinimum(extent.xMinimum() - delta.x() * units_per_pixel)
+        extent.setXMaximum(extent.xMaximum() - delta.x() * units_per_pixel)
+        extent.setYMinimum(extent.yMinimum() + delta.y() * units_per_pixel)
+        extent.setYMaximum(extent.yMaximum() + delta.y() * units_per_pixel)
+        self.extent_changed.emit(extent)
+    
+    def mouseReleaseEvent(self, event):
+        self._drag_start = None
+        self.setCursor(Qt.OpenHandCursor)
+    
+    def wheelEvent(self, event):
+        factor = 0.8 if event.angleDelta().y() > 0 else 1.25
+        extent = self.visible_extent()
+        extent.scale(factor)
+        self.extent_changed.emit(extent)
+    
+    def close_project(self):
+        self._render_timer.stop()
+        if self.task is not None:
+            self.task.loaded.disconnect(self._on_loaded)
+            self.task.cancel()
+            self.task = None
+        jobs = self._stopping | ({self.job} if self.job is not None else set())
+        for job in jobs:
+            job.finished.disconnect(self._on_rendered)
+            job.cancel()
+        self._stopping.clear()
+        self.job = None
+        self.layers = []
+        if self.project is not None:
+            self.project.clear()
+
+
+class ProjectPickerDialog(QDialog):
+    """Dialog to pick a number of projects"""
+    
+    def __init__(self, projects, checked, title, hint, minimum=1, maximum=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.setMinimumWidth(300)
+        self.minimum = minimum
+        self.maximum = maximum or len(projects)
+        
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(hint))
+        
+        self.project_list = QListWidget()
+        for i, proj in enumerate(projects):
+            item = QListWidgetItem(proj.name)
+            item.setData(Qt.UserRole, i)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if i in checked else Qt.Unchecked)
+            self.project_list.addItem(item)
+        self.project_list.itemChanged.connect(self._update_buttons)
+        layout.addWidget(self.project_list)
+        
+        self.buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        layout.addWidget(self.buttons)
+        self._update_buttons()
+    
+    def selected(self):
+        return [
+            self.project_list.item(i).data(Qt.UserRole)
+            for i in range(self.project_list.count())
+            if self.project_list.item(i).checkState() == Qt.Checked
+        ]
+    
+    def _update_buttons(self, *args):
+        count = len(self.selected())
+        self.buttons.button(QDialogButtonBox.Ok).setEnabled(self.minimum <= count <= self.maximum)
+
+
+class BatchExportDialog(QDialog):
+    """Options of a batch export of all projects"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(tr("Export all projects"))
+        self.setMinimumWidth(360)
+        
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+        
+        folder_layout = QHBoxLayout()
+        self.folder_input = QLineEdit(setting("export/folder", str(Path.home())))
+        folder_layout.addWidget(self.folder_input, 1)
+        btn_browse = QToolButton()
+        btn_browse.setText("...")
+        btn_browse.clicked.connect(self._browse)
+        folder_layout.addWidget(btn_browse)
+        form.addRow(tr("Folder:"), folder_layout)
+        
+        self.format_combo = QComboBox()
+        self.format_combo.addItem("PNG", "png")
+        self.format_combo.addItem("PDF", "pdf")
+        self.format_combo.setCurrentIndex(max(0, self.format_combo.findData(setting("export/format", "png"))))
+        form.addRow(tr("Format:"), self.format_combo)
+        
+        self.width_spin = QSpinBox()
+        self.width_spin.setRange(100, 20000)
+        self.width_spin.setValue(setting("export/width", 1600, int))
+        form.addRow(tr("Width (px):"), self.width_spin)
+        
+        self.height_spin = QSpinBox()
+        self.height_spin.setRange(100, 20000)
+        self.height_spin.setValue(setting("export/height", 1200, int))
+        form.addRow(tr("Height (px):"), self.height_spin)
+        
+        self.dpi_spin = QSpinBox()
+        self.dpi_spin.setRange(30, 1200)
+        self.dpi_spin.setValue(setting("export/dpi", 150, int))
+        form.addRow(tr("DPI:"), self.dpi_spin)
+        
+        self.jobs_spin = QSpinBox()
+        self.jobs_spin.setRange(1, max(1, QThread.idealThreadCount()) * 2)
+        self.jobs_spin.setValue(setting("export/jobs", max(1, QThread.idealThreadCount()), int))
+        form.addRow(tr("Parallel renders:"), self.jobs_spin)
+        
+        self.bookmarks_check = QCheckBox(tr("Also export every bookmark"))
+        self.bookmarks_check.setChecked(setting("export/bookmarks", False, bool))
+        form.addRow(self.bookmarks_check)
+        
+        layout.addLayout(form)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+    
+    def _browse(self):
+        folder = QFileDialog.getExistingDirectory(self, tr("Export all projects"), self.folder_input.text())
+        if folder:
+            self.folder_input.setText(folder)
+    
+    def accept(self):
+        set_setting("export/folder", self.folder_input.text())
+        set_setting("export/format", self.format_combo.currentData())
+        set_setting("export/width", self.width_spin.value())
+        set_setting("export/height", self.height_spin.value())
+        set_setting("export/dpi", self.dpi_spin.value())
+        set_setting("export/jobs", self.jobs_spin.value())
+        set_setting("export/bookmarks", self.bookmarks_check.isChecked())
+        super().accept()
+    
+    def options(self):
+        return {
+            'folder': self.folder_input.text(),
+            'fmt': self.format_combo.currentData(),
+            'size': QSize(self.width_spin.value(), self.height_spin.value()),
+            'dpi': self.dpi_spin.value(),
+            'bookmarks': self.bookmarks_check.isChecked(),
+            'max_jobs': self.jobs_spin.value(),
+        }
+
+
+class ComparisonDialog(QDialog):
+    """Side-by-side grid rendering several projects at a shared extent"""
+    
+    MAX_PROJECTS = 9
+    
+    def __init__(self, projects, canvas, transforms, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(tr("Compare projects"))
+        self.setAttribute(Qt.WA_DeleteOnClose)
+        self.resize(900, 650)
+        self.canvas = canvas
+        self.transforms = transforms
+        self.crs = canvas.mapSettings().destinationCrs()
+        self.extent = canvas.extent()
+        
+        layout = QVBoxLayout(self)
+        
+        toolbar = QHBoxLayout()
+        btn_canvas = QToolButton()
+        btn_canvas.setIcon(QgsApplication.getThemeIcon("/mActionZoomToArea.svg"))
+        btn_canvas.setToolTip(tr("Zoom to canvas extent"))
+        btn_canvas.clicked.connect(self.zoom_to_canvas)
+        toolbar.addWidget(btn_canvas)
+        
+        self.own_crs = QCheckBox(tr("Each project in its own CRS"))
+        self.own_crs.toggled.connect(lambda _checked: self.set_extent(self.extent))
+        toolbar.addWidget(self.own_crs)
+        toolbar.addStretch()
+        layout.addLayout(toolbar)
+        
+        grid_widget = QWidget()
+        grid = QGridLayout(grid_widget)
+        grid.setContentsMargins(0, 0, 0, 0)
+        grid.setSpacing(4)
+        layout.addWidget(grid_widget, 1)
+        
+        projects = projects[:self.MAX_PROJECTS]
+        columns = max(1, math.ceil(math.sqrt(len(projects))))
+        self.cells = []
+        for i, proj in enumerate(projects):
+            cell = ComparisonCell(proj)
+            cell.extent_changed.connect(lambda extent, c=cell: self._on_cell_extent_changed(c, extent))
+            grid.addWidget(cell, i // columns, i % columns)
+            self.cells.append(cell)
+        
+        self.set_extent(self.extent)
+    
+    def _on_cell_extent_changed(self, cell, extent):
+        if cell.crs != self.crs:
+            values = self.transforms.transform_extent(
+                [extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()],
+                cell.crs.authid(), self.crs.authid()
+            )
+            if values is None:
+                return
+            extent = QgsRectangle(*values)
+        self.set_extent(extent)
+    
+    def set_extent(self, extent):
+        self.extent = QgsRectangle(extent)
+        values = [extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()]
+        for cell in self.cells:
+            crs = self.crs
+            cell_extent = self.extent
+            if self.own_crs.isChecked():
+                cell_crs = self.transforms.crs(cell.proj.crs)
+                projected = self.transforms.transform_extent(values, self.crs.authid(), cell.proj.crs)
+                if cell_crs.isValid() and projected is not None:
+                    crs, cell_extent = cell_crs, QgsRectangle(*projected)
+            cell.set_view(crs, cell_extent)
+    
+    def zoom_to_canvas(self):
+        self.crs = self.canvas.mapSettings().destinationCrs()
+        self.set_extent(self.canvas.extent())
+    
+    def done(self, result):
+        for cell in self.cells:
+            cell.close_project()
+        super().done(result)
+
+
 class RenameDialog(QDialog):
     """Dialog to rename a project"""
     
@@ -796,21 +6183,112 @@ class MultiProjectDock(QDockWidget):
     
     def __init__(self, iface, parent=None):
         super().__init__(tr("Projects"), parent)
+        self._started = time.perf_counter()
         self.iface = iface
         self.project = QgsProject.instance()
         self.canvas = iface.mapCanvas()
         
-        self.temp_dir = tempfile.mkdtemp(prefix="qgis_mp_")
+        self.session = StorageSession(
+            setting("storage/backend", "disk"),
+            setting("storage/quota_mb", 512, int)
+        )
+        self.temp_dir = self.session.work_dir
+        self.store = SnapshotStore(
+            self.session.storage,
+            "qgs" if setting("storage/uncompressed", False, bool) else "qgz"
+        )
         self.projects = []
         self.current_index = -1
         self.tab_counter = 0
+        self._open_tasks = {}
         self._switching = False
         self._tracking_extent = True
         
+        self.transforms = TransformCache()
+        self.bookmark_index = BookmarkIndex()
+        
+        # History entries are only recorded once the map settles
+        self._history_timer = QTimer(self)
+        self._history_timer.setSingleShot(True)
+        self._history_timer.setInterval(400)
+        self._history_timer.timeout.connect(self._record_history)
+        
+        self._link_timer = QTimer(self)
+        self._link_timer.setSingleShot(True)
+        self._link_timer.setInterval(100)
+        self._link_timer.timeout.connect(self._propagate_linked_extent)
+        
+        self.render_scheduler = RenderScheduler(self._render_spec, self._render_priority, parent=self)
+        self.render_scheduler.rendered.connect(self._on_rendered)
+        
+        self.preview_cache = BookmarkPreviewCache(os.path.join(self.session.disk_dir, "previews"))
+        self.preview_queue = BookmarkPreviewQueue(self.preview_cache, self._preview_priority, parent=self)
+        self.preview_queue.preview_ready.connect(self._on_preview_ready)
+        
+        try:
+            self.catalog = ProjectCatalog()
+        except (OSError, sqlite3.Error):
+            self.catalog = None
+        self._catalog_tasks = []
+        self._batch_export = None
+        
+        # Memory accounting, with eviction of cold projects over budget
+        self.memory_budget = MemoryBudget(setting("memory/budget_mb", 256, int), self.preview_cache)
+        self.memory_usage = {}
+        
+        # Closed projects stay reopenable for a while
+        self.trash = ProjectTrash(
+            self._trash_size,
+            setting("trash/max_count", 20, int),
+            setting("trash/max_mb", 256, int),
+            setting("trash/max_age_min", 60, int) * 60
+        )
+        self._memory_timer = QTimer(self)
+        self._memory_timer.setSingleShot(True)
+        self._memory_timer.setInterval(2000)
+        self._memory_timer.timeout.connect(self.check_memory)
+        
+        # Datasource checks, repeated whenever the cached results expire
+        self.health = DatasourceHealth(setting("health/ttl", 300, int))
+        self._health_task = None
+        self._health_timer = QTimer(self)
+        self._health_timer.setInterval(max(30, self.health.ttl) * 1000)
+        self._health_timer.timeout.connect(self.check_datasources)
+        self._health_timer.start()
+        
+        # Saved files changed by other programs are picked up in the background
+        self.file_watcher = ProjectFileWatcher(self.store, self)
+        self.file_watcher.changed.connect(self._on_project_file_changed)
+        
+        # Files on network shares are read from a local copy, and workspaces
+        # saved there are uploaded in the background
+        self.share_cache = ShareCache(
+            ShareCache.default_folder(),
+            setting("cache/max_mb", 1024, int),
+            setting("cache/share_roots", "").split(";"),
+            self
+        )
+        self.share_cache.pending_changed.connect(self._update_sync_button)
+        self.share_cache.uploaded.connect(self._on_share_uploaded)
+        self.share_cache.conflict.connect(self._on_share_conflict)
+        self.share_cache.failed.connect(self._on_share_failed)
+        
+        # Template snapshots are imported into the store once the panel is up
+        self.templates = ProjectTemplates(ProjectTemplates.default_path(), self.temp_dir, self.store)
+        
+        # Optional SQLite workspace, written incrementally once bound
+        self.workspace_db = None
+        self._db_timer = QTimer(self)
+        self._db_timer.setSingleShot(True)
+        self._db_timer.setInterval(500)
+        self._db_timer.timeout.connect(self._sync_workspace_db)
+        
         self.setup_ui()
         self.setup_connections()
+        self._setup_switcher()
+        self._ui_ms = (time.perf_counter() - self._started) * 1000
         
-        QTimer.singleShot(200, self._init_first_project)
+        QTimer.singleShot(0, self._init_first_project)
     
     def setup_ui(self):
         self.setAllowedAreas(Qt.LeftDockWidgetArea | Qt.RightDockWidgetArea)
@@ -851,6 +6329,10 @@ class MultiProjectDock(QDockWidget):
         self.btn_new.setShortcut("Ctrl+T")
         self.btn_new.setIconSize(QSize(16, 16))
         self.btn_new.clicked.connect(self.new_project)
+        self.btn_new.setPopupMode(QToolButton.MenuButtonPopup)
+        self.template_menu = QMenu(self)
+        self.template_menu.aboutToShow.connect(self._fill_template_menu)
+        self.btn_new.setMenu(self.template_menu)
         header_layout.addWidget(self.btn_new)
         
         self.btn_open = QToolButton()
@@ -866,6 +6348,9 @@ class MultiProjectDock(QDockWidget):
         # === SEARCH ===
         self.search_widget = SearchWidget()
         self.search_widget.result_selected.connect(self._on_search_result)
+        self.search_widget.catalog = self.catalog
+        self.search_widget.is_active = self._is_active
+        self.search_widget.catalog_selected.connect(self.open_catalog_result)
         main_layout.addWidget(self.search_widget)
         
         # === SPLITTER FOR RESIZABLE SECTIONS ===
@@ -881,7 +6366,10 @@ class MultiProjectDock(QDockWidget):
         """)
         
         # === PROJECT LIST ===
-        self.project_list = QListWidget()
+        self.project_list = ProjectListWidget()
+        self.project_list.setAcceptDrops(True)
+        self.project_list.files_dropped.connect(self.open_projects)
+        self.project_list.layers_dropped.connect(self._on_layers_dropped)
         self.delegate = ProjectItemDelegate()
         self.project_list.setItemDelegate(self.delegate)
         self.project_list.setDragDropMode(QAbstractItemView.InternalMove)
@@ -901,6 +6389,8 @@ class MultiProjectDock(QDockWidget):
         self.bookmark_section = CollapsibleSection(tr("Bookmarks"))
         self.bookmark_widget = BookmarkWidget()
         self.bookmark_widget.bookmark_activated.connect(self._on_bookmark_activated)
+        self.bookmark_widget.bookmarks_changed.connect(self._on_bookmarks_changed)
+        self.bookmark_widget.model.preview_provider = self._bookmark_preview
         self.bookmark_section.set_content(self.bookmark_widget)
         self.bookmark_section.set_collapsed(True)  # Collapsed by default
         self.bookmark_section.collapsed_changed.connect(self._on_bookmark_collapsed_changed)
@@ -949,6 +6439,13 @@ class MultiProjectDock(QDockWidget):
         self.btn_sync_extent.clicked.connect(self.sync_extent_to_all)
         nav_layout.addWidget(self.btn_sync_extent)
         
+        self.btn_link_nav = QToolButton()
+        self.btn_link_nav.setText(tr("Link"))
+        self.btn_link_nav.setToolTip(tr("Linked navigation: follow this map in all linked projects"))
+        self.btn_link_nav.setCheckable(True)
+        self.btn_link_nav.toggled.connect(self._on_link_toggled)
+        nav_layout.addWidget(self.btn_link_nav)
+        
         nav_layout.addStretch()
         
         self.btn_add_bookmark = QToolButton()
@@ -986,6 +6483,18 @@ class MultiProjectDock(QDockWidget):
         
         footer_layout.addStretch()
         
+        self.memory_label = QLabel()
+        self.memory_label.setStyleSheet("color: #666; font-size: 10px;")
+        footer_layout.addWidget(self.memory_label)
+        
+        self.sync_button = QToolButton()
+        self.sync_button.setAutoRaise(True)
+        self.sync_button.setIcon(QgsApplication.getThemeIcon("/mActionRefresh.svg"))
+        self.sync_button.setToolButtonStyle(Qt.ToolButtonTextBesideIcon)
+        self.sync_button.clicked.connect(self.resolve_pending_syncs)
+        self.sync_button.hide()
+        footer_layout.addWidget(self.sync_button)
+        
         self.btn_menu = QToolButton()
         self.btn_menu.setIcon(QgsApplication.getThemeIcon("/mActionOptions.svg"))
         self.btn_menu.setPopupMode(QToolButton.InstantPopup)
@@ -1005,6 +6514,29 @@ class MultiProjectDock(QDockWidget):
         action_refresh_thumb = menu.addAction(tr("Refresh thumbnail"))
         action_refresh_thumb.triggered.connect(self._refresh_current_thumbnail)
         
+        action_health = menu.addAction(tr("Check datasources"))
+        action_health.triggered.connect(self.check_datasources)
+        
+        action_compare = menu.addAction(tr("Compare projects..."))
+        action_compare.triggered.connect(self.compare_projects)
+        
+        action_export_all = menu.addAction(tr("Export all projects..."))
+        action_export_all.triggered.connect(self.export_all_projects)
+        
+        menu.addSeparator()
+        
+        action_bm_in_view = menu.addAction(QgsApplication.getThemeIcon("/mActionBookmarks.svg"), tr("Bookmarks in view..."))
+        action_bm_in_view.triggered.connect(self.show_bookmarks_in_view)
+        
+        action_bm_nearest = menu.addAction(tr("Go to nearest bookmark"))
+        action_bm_nearest.triggered.connect(self.go_to_nearest_bookmark)
+        
+        action_bm_import = menu.addAction(tr("Import bookmarks..."))
+        action_bm_import.triggered.connect(self.import_bookmarks)
+        
+        action_bm_export = menu.addAction(tr("Export bookmarks..."))
+        action_bm_export.triggered.connect(self.export_bookmarks)
+        
         menu.addSeparator()
         
         action_save_ws = menu.addAction(tr("Save workspace..."))
@@ -1013,18 +6545,122 @@ class MultiProjectDock(QDockWidget):
         action_load_ws = menu.addAction(tr("Load workspace..."))
         action_load_ws.triggered.connect(self.load_workspace)
         
+        action_catalog = menu.addAction(tr("Add folder to catalog..."))
+        action_catalog.triggered.connect(self.scan_folder_into_catalog)
+        action_catalog.setEnabled(self.catalog is not None)
+        
         menu.addSeparator()
         
         action_close_others = menu.addAction(tr("Close others"))
         action_close_others.triggered.connect(self.close_others)
         
+        self.action_reopen = menu.addAction(tr("Reopen closed project"))
+        self.action_reopen.setShortcut("Ctrl+Shift+T")
+        self.action_reopen.triggered.connect(lambda: self.reopen_closed_project())
+        self.addAction(self.action_reopen)
+        
+        self.closed_menu = menu.addMenu(tr("Recently closed"))
+        self.closed_menu.aboutToShow.connect(self._fill_closed_menu)
+        
+        menu.addSeparator()
+        self._setup_storage_menu(menu.addMenu(tr("Snapshot storage")))
+        
+        action_budget = menu.addAction(tr("Memory budget..."))
+        action_budget.triggered.connect(self._edit_memory_budget)
+        
         self.btn_menu.setMenu(menu)
     
+    def _setup_storage_menu(self, menu):
+        current = setting("storage/backend", "disk")
+        labels = {'disk': tr("Disk"), 'ram': tr("RAM disk (tmpfs)"), 'memory': tr("Memory")}
+        # Exclusive group: the check follows the choice without rebuilding the menu
+        group = QActionGroup(menu)
+        for backend in StorageSession.BACKENDS:
+            action = menu.addAction(labels[backend])
+            action.setCheckable(True)
+            group.addAction(action)
+            action.setChecked(backend == current)
+            action.setEnabled(backend != 'ram' or StorageSession.ram_root() is not None)
+            action.triggered.connect(lambda _checked, b=backend: self._set_storage_option("storage/backend", b))
+        
+        menu.addSeparator()
+        
+        action_uncompressed = menu.addAction(tr("Uncompressed snapshots (.qgs)"))
+        action_uncompressed.setCheckable(True)
+        action_uncompressed.setChecked(setting("storage/uncompressed", False, bool))
+        action_uncompressed.toggled.connect(lambda checked: self._set_storage_option("storage/uncompressed", checked))
+        
+        action_quota = menu.addAction(tr("Memory quota..."))
+        action_quota.triggered.connect(self._edit_storage_quota)
+    
+    def _set_storage_option(self, key, value):
+        set_setting(key, value)
+        self.iface.messageBar().pushMessage(
+            "Multi Project", tr("Storage settings apply the next time the panel is opened"), Qgis.Info, 3
+        )
+    
+    def _edit_storage_quota(self):
+        quota, ok = QInputDialog.getInt(
+            self, tr("Snapshot storage"), tr("Memory quota (MB):"),
+            setting("storage/quota_mb", 512, int), 16, 1024 * 1024
+        )
+        if ok:
+            self._set_storage_option("storage/quota_mb", quota)
+    
+    def _edit_memory_budget(self):
+        budget, ok = QInputDialog.getInt(
+            self, tr("Memory budget"), tr("Memory budget for all projects (MB, 0 = unlimited):"),
+            setting("memory/budget_mb", 256, int), 0, 1024 * 1024
+        )
+        if ok:
+            set_setting("memory/budget_mb", budget)
+            self.memory_budget.budget = budget * 1024 * 1024
+            self.check_memory()
+    
+    def _schedule_memory_check(self):
+        if not self._memory_timer.isActive():
+            self._memory_timer.start()
+    
+    def check_memory(self):
+        """Update the per-project estimates and evict cold caches over budget"""
+        active = self.projects[self.current_index] if 0 <= self.current_index < len(self.projects) else None
+        evicted_thumbnails = [p for p in self.projects if p.thumbnail is not None]
+        self.memory_usage = self.memory_budget.enforce(self.projects, active)
+        evicted_thumbnails = [p for p in evicted_thumbnails if p.thumbnail is None]
+        
+        for proj in self.projects:
+            self._update_list_item(proj)
+        
+        total = sum(u['total'] for u in self.memory_usage.values())
+        budget = self.memory_budget.budget
+        text = format_size(total) + (f" / {format_size(budget)}" if budget else "")
+        self.memory_label.setText(text)
+        self.memory_label.setToolTip("\n".join(
+            f"{proj.name}: {format_size(u['total'])}" for proj, u in self.memory_usage.items()
+        ))
+        if evicted_thumbnails:
+            self.iface.messageBar().pushMessage(
+                "Multi Project", tr("Memory budget reached: thumbnails of inactive projects were released"),
+                Qgis.Info, 3
+            )
+    
     def setup_connections(self):
         self.project.layersAdded.connect(self._on_modified)
         self.project.layersRemoved.connect(self._on_modified)
+        self.project.projectSaved.connect(self._on_project_saved)
+        self.project.transformContextChanged.connect(self._on_transform_context_changed)
         self.canvas.extentsChanged.connect(self._on_extent_changed)
     
+    def _on_project_saved(self):
+        """Any save of the live project, ours or QGIS's own, is not an external change"""
+        file_name = self.project.fileName()
+        if file_name:
+            self.file_watcher.mark_saved(file_name)
+    
+    def _on_transform_context_changed(self):
+        """Cached transforms were built with the previous datum transformations"""
+        self.transforms.clear()
+    
     def _init_first_project(self):
         current_file = self.project.fileName()
         if current_file:
@@ -1033,18 +6669,33 @@ class MultiProjectDock(QDockWidget):
             self.tab_counter += 1
             name = f"{tr('Project')} {self.tab_counter}"
         
-        proj = ProjectTab(name, self.temp_dir)
+        proj = ProjectTab(name, self.temp_dir, self.store, self.bookmark_index)
         if current_file:
             proj.saved_file = current_file
+            if not self.project.isDirty():
+                proj.origin_file = current_file
         
-        proj.capture_state(self.project, self.canvas)
+        # The live project is the state while it is active: the snapshot is
+        # only taken on the first switch away, and the thumbnail is rendered
+        # in the background from the canvas layers
+        proj.capture_metadata(self.project, self.canvas)
         self.projects.append(proj)
         self.current_index = 0
+        self.render_scheduler.request(proj)
         
         self._refresh_list()
         self._update_nav_buttons()
         self.bookmark_widget.set_project(proj)
         self.search_widget.set_projects(self.projects)
+        
+        QgsMessageLog.logMessage(
+            tr("Panel ready in {0:.0f} ms (interface built in {1:.0f} ms)").format(
+                (time.perf_counter() - self._started) * 1000, self._ui_ms),
+            "Multi Project", Qgis.Info
+        )
+        # Sessions left behind by crashed instances can wait until the panel is up
+        QTimer.singleShot(0, StorageSession.collect_stale)
+        QTimer.singleShot(0, self.templates.load)
     
     def _refresh_list(self):
         self.project_list.clear()
@@ -1059,12 +6710,109 @@ class MultiProjectDock(QDockWidget):
             item.setData(Qt.UserRole + 4, proj.saved_file)
             item.setData(Qt.UserRole + 5, proj.thumbnail)
             item.setData(Qt.UserRole + 6, len(proj.bookmarks))
+            item.setData(Qt.UserRole + 8, self.memory_usage.get(proj, {}).get('total'))
+            self._set_health_data(item, proj)
             self.project_list.addItem(item)
         
         if 0 <= self.current_index < self.project_list.count():
             self.project_list.setCurrentRow(self.current_index)
         
         self.search_widget.set_projects(self.projects)
+        self.file_watcher.set_paths(p.saved_file for p in self.projects)
+        self.share_cache.pin(
+            p.origin_file for p in self.projects + [entry[2] for entry in self.trash.entries]
+        )
+        self._schedule_db_sync()
+        self._schedule_memory_check()
+    
+    def _update_list_item(self, proj):
+        """Refresh the row of one project without rebuilding the list"""
+        if proj not in self.projects:
+            return
+        item = self.project_list.item(self.projects.index(proj))
+        if item is not None:
+            item.setData(Qt.UserRole + 3, proj.layer_count)
+            item.setData(Qt.UserRole + 5, proj.thumbnail)
+            item.setData(Qt.UserRole + 6, len(proj.bookmarks))
+            item.setData(Qt.UserRole + 8, self.memory_usage.get(proj, {}).get('total'))
+            self._set_health_data(item, proj)
+    
+    def _set_health_data(self, item, proj):
+        item.setData(Qt.UserRole + 7, proj.health)
+        problems = proj.health['problems'] if proj.health else []
+        item.setToolTip("\n".join(
+            f"{'⚠' if status == DatasourceHealth.BROKEN else '⏱'} {name}: {message}"
+            for name, status, message in problems[:20]
+        ))
+    
+    def check_datasources(self):
+        """Check the layer sources of every project in the background"""
+        if self._health_task is not None or not self.projects:
+            return
+        specs = [proj.health_spec() for proj in self.projects]
+        for spec in specs:
+            self.store.retain(spec['manifest'])
+        self._health_task = DatasourceScanTask(self.health, specs)
+        self._health_task.done.connect(self._on_datasources_checked)
+        QgsApplication.taskManager().addTask(self._health_task)
+    
+    def _on_datasources_checked(self, task, ok):
+        if task is not self._health_task:
+            return
+        self._health_task = None
+        for spec in task.specs:
+            self.store.release(spec['manifest'])
+        for proj, summary in task.summaries.items():
+            if proj in self.projects:
+                proj.health = summary
+                self._update_list_item(proj)
+    
+    def _render_spec(self, proj):
+        if proj not in self.projects:
+            return None
+        if self._is_active(proj):
+            settings = QgsMapSettings(self.canvas.mapSettings())
+            settings.setOutputSize(ThumbnailGenerator.SIZE)
+            return {'kind': 'live', 'settings': settings}
+        return proj.render_spec(ThumbnailGenerator.SIZE)
+    
+    def _render_priority(self, proj):
+        if self._is_active(proj):
+            return RenderScheduler.PRIORITY_ACTIVE
+        item = self.project_list.item(self.projects.index(proj)) if proj in self.projects else None
+        if item is not None and self.project_list.visualItemRect(item).intersects(self.project_list.viewport().rect()):
+            return RenderScheduler.PRIORITY_VISIBLE
+        return RenderScheduler.PRIORITY_BACKGROUND
+    
+    def _is_active(self, proj):
+        return 0 <= self.current_index < len(self.projects) and self.projects[self.current_index] is proj
+    
+    def _on_rendered(self, proj, image):
+        if proj not in self.projects:
+            return
+        proj.thumbnail = QPixmap.fromImage(image) if image is not None and proj.layer_count else None
+        self._update_list_item(proj)
+        self._schedule_memory_check()
+        if self.workspace_db:
+            try:
+                self.workspace_db.save_thumbnail(proj, image if proj.thumbnail else None)
+            except sqlite3.Error:
+                pass
+    
+    def _preview_priority(self, proj):
+        if self._is_active(proj):
+            return RenderScheduler.PRIORITY_VISIBLE
+        return RenderScheduler.PRIORITY_BACKGROUND
+    
+    def _bookmark_preview(self, store, row):
+        proj = self._project_of_bookmarks(store)
+        if proj is None:
+            return None
+        return self.preview_queue.preview(proj, store.ids[row])
+    
+    def _on_preview_ready(self, store, bookmark_id):
+        if self.bookmark_widget.model.store is store:
+            self.bookmark_widget.model.preview_ready(bookmark_id)
     
     def _toggle_thumbnails(self, checked):
         self.delegate.show_thumbnails = checked
@@ -1072,6 +6820,8 @@ class MultiProjectDock(QDockWidget):
     
     def _on_bookmark_collapsed_changed(self, collapsed):
         """Adjust splitter sizes when bookmark section is expanded/collapsed"""
+        if not collapsed:
+            self.bookmark_widget.ensure_list()
         if collapsed:
             # When collapsed, give minimal space to bookmarks
             self.splitter.setSizes([self.splitter.height() - 24, 24])
@@ -1113,12 +6863,14 @@ class MultiProjectDock(QDockWidget):
         
         self._switching = True
         self._tracking_extent = False
+        self._history_timer.stop()
         
-        if 0 <= self.current_index < len(self.projects):
-            self.projects[self.current_index].capture_state(self.project, self.canvas)
+        self._save_current_state()
         
         self.projects[index].restore_state(self.project, self.canvas, self.iface)
+        self.projects[index].last_used = time.monotonic()
         self.current_index = index
+        self.transforms.clear()
         
         self._refresh_list()
         self._update_nav_buttons()
@@ -1130,6 +6882,18 @@ class MultiProjectDock(QDockWidget):
         self.project_switched.emit(index)
     
     def _on_extent_changed(self):
+        if self._switching:
+            return
+        
+        if self.btn_link_nav.isChecked() and not self._link_timer.isActive():
+            self._link_timer.start()
+        
+        if not self._tracking_extent:
+            return
+        
+        self._history_timer.start()
+    
+    def _record_history(self):
         if not self._tracking_extent or self._switching:
             return
         
@@ -1140,6 +6904,13 @@ class MultiProjectDock(QDockWidget):
                 self.canvas.mapSettings().destinationCrs()
             )
             self._update_nav_buttons()
+            self._schedule_db_sync()
+    
+    def _record_pending_history(self):
+        """Record a not yet settled extent before navigating the history"""
+        if self._history_timer.isActive():
+            self._history_timer.stop()
+            self._record_history()
     
     def _update_nav_buttons(self):
         if 0 <= self.current_index < len(self.projects):
@@ -1154,6 +6925,7 @@ class MultiProjectDock(QDockWidget):
         if self.current_index < 0:
             return
         
+        self._record_pending_history()
         proj = self.projects[self.current_index]
         state = proj.extent_history.go_back()
         
@@ -1174,6 +6946,7 @@ class MultiProjectDock(QDockWidget):
         if self.current_index < 0:
             return
         
+        self._record_pending_history()
         proj = self.projects[self.current_index]
         state = proj.extent_history.go_forward()
         
@@ -1190,10 +6963,73 @@ class MultiProjectDock(QDockWidget):
             self._tracking_extent = True
             self._update_nav_buttons()
     
-    def sync_extent_to_all(self):
-        if self.current_index < 0:
+    def export_all_projects(self):
+        if not self.projects or self._batch_export is not None:
+            return
+        
+        dialog = BatchExportDialog(self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        
+        # Projects are rendered from their stored state: make sure the active one is current
+        self._save_current_state()
+        exporter = BatchExporter(self.projects, parent=self, **dialog.options())
+        progress = QProgressDialog(tr("Exporting projects..."), tr("Cancel"), 0, len(self.projects), self)
+        progress.setWindowTitle(tr("Export all projects"))
+        progress.setMinimumDuration(0)
+        progress.canceled.connect(exporter.cancel)
+        exporter.progress.connect(lambda done, total: progress.setValue(done))
+        exporter.done.connect(lambda e: self._on_batch_exported(e, progress))
+        self._batch_export = exporter
+        exporter.start()
+    
+    def _on_batch_exported(self, exporter, progress):
+        self._batch_export = None
+        # Closing the dialog emits canceled, which must not reach the exporter
+        progress.canceled.disconnect(exporter.cancel)
+        progress.close()
+        progress.deleteLater()
+        exporter.deleteLater()
+        
+        message = tr("{0} files exported to {1}").format(len(exporter.written), exporter.folder)
+        if exporter.failed:
+            message += " - " + tr("not exported: {0}").format(", ".join(exporter.failed))
+        level = Qgis.Warning if exporter.failed or exporter.canceled else Qgis.Success
+        self.iface.messageBar().pushMessage("Multi Project", message, level, 5)
+    
+    def compare_projects(self):
+        if len(self.projects) < 2:
+            return
+        
+        checked = list(range(self.current_index, min(self.current_index + 4, len(self.projects))))
+        if len(checked) < 2:
+            checked = list(range(max(0, len(self.projects) - 4), len(self.projects)))
+        dialog = ProjectPickerDialog(
+            self.projects, checked, tr("Compare projects"), tr("Select 2 to 9 projects to compare"),
+            2, ComparisonDialog.MAX_PROJECTS, self
+        )
+        if dialog.exec_() != QDialog.Accepted:
             return
         
+        # Cells render the stored state: make sure the active one is current
+        self._save_current_state()
+        comparison = ComparisonDialog(
+            [self.projects[i] for i in dialog.selected()], self.canvas, self.transforms, self
+        )
+        comparison.show()
+    
+    def _on_link_toggled(self, checked):
+        if checked:
+            self._propagate_linked_extent()
+    
+    def _propagate_linked_extent(self):
+        if self.current_index < 0 or self._switching:
+            return
+        self._apply_extent_to_projects([p for p in self.projects if p.linked])
+        self._schedule_db_sync()
+    
+    def _apply_extent_to_projects(self, projects):
+        """Reproject the canvas extent into each project's own CRS"""
         current_extent = self.canvas.extent()
         current_crs = self.canvas.mapSettings().destinationCrs().authid()
         
@@ -1204,12 +7040,30 @@ class MultiProjectDock(QDockWidget):
             current_extent.yMaximum()
         ]
         
-        for i, proj in enumerate(self.projects):
-            if i != self.current_index:
-                proj.extent = extent_list
-                proj.crs = current_crs
+        count = 0
+        for proj in projects:
+            if self._is_active(proj):
+                continue
+            extent = self.transforms.transform_extent(extent_list, current_crs, proj.crs)
+            if extent is None:
+                # Keep the project in its own CRS where it was
+                continue
+            proj.extent = extent
+            count += 1
+        return count
+    
+    def _toggle_linked(self, index):
+        proj = self.projects[index]
+        proj.linked = not proj.linked
+        if proj.linked and self.btn_link_nav.isChecked():
+            self._apply_extent_to_projects([proj])
+        self._schedule_db_sync()
+    
+    def sync_extent_to_all(self):
+        if self.current_index < 0:
+            return
         
-        count = len(self.projects) - 1
+        count = self._apply_extent_to_projects(self.projects)
         self.iface.messageBar().pushMessage(
             "Multi Project",
             tr("Extent synced to {0} projects").format(count),
@@ -1230,19 +7084,114 @@ class MultiProjectDock(QDockWidget):
             ]
             crs = self.canvas.mapSettings().destinationCrs().authid()
             
-            self.projects[self.current_index].add_bookmark(name, extent, crs)
-            self.bookmark_widget.refresh()
-            self._refresh_list()
+            self.bookmark_widget.do_add_bookmark(name, extent, crs)
+    
+    def _on_bookmarks_changed(self):
+        if 0 <= self.current_index < len(self.projects):
+            self._update_list_item(self.projects[self.current_index])
     
     def _on_bookmark_activated(self, bookmark):
         if bookmark is None:
             self._add_bookmark_current()
             return
         
-        extent = QgsRectangle(bookmark.extent[0], bookmark.extent[1],
-                              bookmark.extent[2], bookmark.extent[3])
-        self.canvas.setExtent(extent)
-        self.canvas.refresh()
+        canvas_crs = self.canvas.mapSettings().destinationCrs().authid()
+        values = self.transforms.transform_extent(bookmark.extent, bookmark.crs, canvas_crs)
+        extent = QgsRectangle(*(values or bookmark.extent))
+        self.canvas.setExtent(extent)
+        self.canvas.refresh()
+    
+    def _project_of_bookmarks(self, store):
+        return next((p for p in self.projects if p.bookmarks is store), None)
+    
+    def _go_to_bookmark(self, store, bookmark_id):
+        """Activate a bookmark of any project, switching project if needed"""
+        proj = self._project_of_bookmarks(store)
+        bookmark = store.get(bookmark_id)
+        if proj is None or bookmark is None:
+            return
+        if not self._is_active(proj):
+            self._switch_to(self.projects.index(proj))
+        self._on_bookmark_activated(bookmark)
+    
+    def show_bookmarks_in_view(self):
+        extent = self.canvas.extent()
+        results = self.bookmark_index.in_view(
+            [extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()],
+            self.canvas.mapSettings().destinationCrs().authid(), self.transforms
+        )
+        
+        menu = QMenu(self)
+        if not results:
+            menu.addAction(tr("No bookmarks in view")).setEnabled(False)
+        for store, bookmark_id in results[:50]:
+            proj = self._project_of_bookmarks(store)
+            row = store.row_of(bookmark_id)
+            if proj is None or row is None:
+                continue
+            action = menu.addAction(QgsApplication.getThemeIcon("/mActionBookmarks.svg"),
+                                    f"{store.names[row]} — {proj.name}")
+            action.triggered.connect(lambda _checked, s=store, b=bookmark_id: self._go_to_bookmark(s, b))
+        if len(results) > 50:
+            menu.addAction(tr("... and {0} more").format(len(results) - 50)).setEnabled(False)
+        menu.exec_(self.btn_menu.mapToGlobal(QPoint(0, 0)))
+    
+    def go_to_nearest_bookmark(self):
+        center = self.canvas.extent().center()
+        nearest = self.bookmark_index.nearest(
+            center.x(), center.y(), self.canvas.mapSettings().destinationCrs().authid(), self.transforms
+        )
+        if nearest:
+            _distance, store, bookmark_id = nearest[0]
+            self._go_to_bookmark(store, bookmark_id)
+    
+    def import_bookmarks(self):
+        if self.current_index < 0:
+            return
+        
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, tr("Import bookmarks"), "",
+            "Bookmarks (*.geojson *.json *.csv *.gpkg);;" + BookmarkExchange.FILTERS
+        )
+        if not file_path:
+            return
+        
+        proj = self.projects[self.current_index]
+        count = 0
+        try:
+            count = proj.bookmarks.extend(BookmarkExchange.read(file_path))
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, tr("Error"), f"{tr('Cannot load')}:\n{e}")
+        finally:
+            # One model reset for the whole batch
+            self.bookmark_widget.refresh()
+            self._update_list_item(proj)
+        
+        if count:
+            self.iface.messageBar().pushMessage(
+                "Multi Project", tr("{0} bookmarks imported").format(count), Qgis.Success, 3
+            )
+    
+    def export_bookmarks(self):
+        if self.current_index < 0:
+            return
+        
+        proj = self.projects[self.current_index]
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, tr("Export bookmarks"), proj.name + ".geojson", BookmarkExchange.FILTERS
+        )
+        if not file_path:
+            return
+        
+        try:
+            count = BookmarkExchange.write(file_path, proj.bookmarks, self.transforms)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, tr("Error"), f"{tr('Cannot save')}:\n{e}")
+            return
+        
+        self.iface.messageBar().pushMessage(
+            "Multi Project", tr("{0} bookmarks exported").format(count), Qgis.Success, 3
+        )
     
     def _on_search_result(self, proj_idx, extra):
         if proj_idx != self.current_index:
@@ -1253,12 +7202,9 @@ class MultiProjectDock(QDockWidget):
             if layer:
                 self.iface.setActiveLayer(layer)
         elif extra and extra.startswith("bookmark:"):
-            bm_name = extra[9:]
-            proj = self.projects[proj_idx]
-            for bm in proj.bookmarks:
-                if bm.name == bm_name:
-                    self._on_bookmark_activated(bm)
-                    break
+            bm = self.projects[proj_idx].bookmarks.get(int(extra[9:]))
+            if bm:
+                self._on_bookmark_activated(bm)
     
     def new_project(self):
         self._save_current_state()
@@ -1266,7 +7212,7 @@ class MultiProjectDock(QDockWidget):
         self.tab_counter += 1
         name = f"{tr('Project')} {self.tab_counter}"
         
-        proj = ProjectTab(name, self.temp_dir)
+        proj = ProjectTab(name, self.temp_dir, self.store, self.bookmark_index)
         
         self.project.clear()
         self.canvas.setDestinationCrs(QgsCoordinateReferenceSystem("EPSG:4326"))
@@ -1283,38 +7229,217 @@ class MultiProjectDock(QDockWidget):
         
         self.iface.messageBar().pushMessage("Multi Project", f"{tr('New')}: {name}", Qgis.Info, 2)
     
+    def _fill_template_menu(self):
+        menu = self.template_menu
+        menu.clear()
+        names = self.templates.names()
+        for name in names:
+            template = self.templates.get(name)
+            action = menu.addAction(QIcon(template.thumbnail) if template.thumbnail else QIcon(), name)
+            action.triggered.connect(lambda _checked=False, n=name: self.new_from_template(n))
+        if not names:
+            menu.addAction(tr("No templates")).setEnabled(False)
+        
+        menu.addSeparator()
+        action_save = menu.addAction(tr("Save as template..."))
+        action_save.triggered.connect(self.save_current_as_template)
+        action_save.setEnabled(self.current_index >= 0)
+        
+        remove_menu = menu.addMenu(tr("Delete template"))
+        remove_menu.setEnabled(bool(names))
+        for name in names:
+            remove_menu.addAction(name).triggered.connect(
+                lambda _checked=False, n=name: self.delete_template(n)
+            )
+    
+    def new_from_template(self, name):
+        """Open a new tab that shares the snapshot and thumbnail of a template"""
+        template = self.templates.get(name)
+        if template is None:
+            return
+        
+        self.tab_counter += 1
+        proj = template.copy(f"{name} {self.tab_counter}", self.bookmark_index)
+        self.projects.append(proj)
+        self._switch_to(len(self.projects) - 1)
+        if proj.thumbnail is None:
+            self.render_scheduler.request(proj)
+        
+        self.iface.messageBar().pushMessage("Multi Project", f"{tr('New')}: {proj.name}", Qgis.Info, 2)
+    
+    def save_current_as_template(self):
+        if self.current_index < 0:
+            return
+        
+        proj = self.projects[self.current_index]
+        name, ok = QInputDialog.getText(self, tr("Save as template"), tr("Template name:"), text=proj.name)
+        name = name.strip()
+        if not ok or not name:
+            return
+        if name in self.templates.names() and QMessageBox.question(
+                self, tr("Confirm"), tr("Replace the template '{0}'?").format(name)) != QMessageBox.Yes:
+            return
+        
+        self._save_current_state()
+        try:
+            self.templates.add(proj, name)
+        except OSError as e:
+            QMessageBox.critical(self, tr("Error"), f"{tr('Cannot save')}:\n{e}")
+            return
+        
+        self.iface.messageBar().pushMessage("Multi Project", f"{tr('Template saved')}: {name}", Qgis.Success, 2)
+    
+    def delete_template(self, name):
+        if QMessageBox.question(
+                self, tr("Confirm"), tr("Delete the template '{0}'?").format(name)) != QMessageBox.Yes:
+            return
+        try:
+            self.templates.remove(name)
+        except OSError as e:
+            QMessageBox.critical(self, tr("Error"), f"{tr('Cannot save')}:\n{e}")
+    
     def open_project(self):
-        file_path, _ = QFileDialog.getOpenFileName(
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self, tr("Open project"), "",
             "QGIS Projects (*.qgs *.qgz);;All (*.*)"
         )
         
-        if not file_path:
-            return
+        if file_paths:
+            self.open_projects(file_paths)
+    
+    def open_projects(self, file_paths, activate=None):
+        """Prepare project files in the background and list them as they become ready
         
-        self._save_current_state()
+        Only one project (activate, or the last file) is loaded into the
+        canvas once the whole batch is done.
+        """
+        if not file_paths:
+            return
         
-        name = Path(file_path).stem
-        proj = ProjectTab(name, self.temp_dir)
-        proj.saved_file = file_path
+        # Each call is its own batch, so overlapping opens do not mix
+        batch = {'tasks': [], 'ready': [], 'failed': [], 'activate': activate or file_paths[-1]}
+        for file_path in file_paths:
+            task = ProjectPrepareTask(file_path, self.share_cache)
+            task.prepared.connect(self._on_project_prepared)
+            batch['tasks'].append(task)
+            self._open_tasks[task] = batch
+            QgsApplication.taskManager().addTask(task)
+    
+    def _on_project_prepared(self, task, ok):
+        batch = self._open_tasks.pop(task, None)
+        if batch is None:
+            return
+        batch['tasks'].remove(task)
         
-        self.project.clear()
-        if self.project.read(file_path):
-            self.canvas.setDestinationCrs(self.project.crs())
-            self.iface.zoomFull()
-            
-            proj.capture_state(self.project, self.canvas)
-            
+        if ok:
+            proj = ProjectTab(Path(task.file_path).stem, self.temp_dir, self.store, self.bookmark_index)
+            proj.saved_file = task.file_path
+            proj.origin_file = task.local_path
+            proj.apply_metadata(task.metadata)
             self.projects.append(proj)
-            self.current_index = len(self.projects) - 1
-            
+            batch['ready'].append(proj)
             self._refresh_list()
-            self._update_nav_buttons()
-            self.bookmark_widget.set_project(proj)
-            
-            self.iface.messageBar().pushMessage("Multi Project", f"{tr('Opened')}: {name}", Qgis.Info, 2)
+            self.render_scheduler.request(proj)
         else:
-            QMessageBox.warning(self, tr("Error"), f"{tr('Cannot open')}:\n{file_path}")
+            batch['failed'].append(task.file_path)
+        
+        if not batch['tasks']:
+            self._finish_open_batch(batch)
+    
+    def _finish_open_batch(self, batch):
+        # Projects of the batch may have been closed while it was loading
+        ready = [p for p in batch['ready'] if p in self.projects]
+        failed = batch['failed']
+        
+        chosen = next((p for p in ready if p.saved_file == batch['activate']), None)
+        if chosen is None and ready:
+            chosen = ready[-1]
+        
+        if chosen is not None:
+            self._switch_to(self.projects.index(chosen))
+            if chosen.extent is None:
+                self.iface.zoomFull()
+            
+            if len(ready) == 1:
+                message = f"{tr('Opened')}: {chosen.name}"
+            else:
+                message = tr("Opened {0} projects").format(len(ready))
+            self.iface.messageBar().pushMessage("Multi Project", message, Qgis.Info, 2)
+        
+        if failed:
+            QMessageBox.warning(self, tr("Error"), f"{tr('Cannot open')}:\n" + "\n".join(failed))
+        
+        self._index_in_catalog([p.saved_file for p in ready])
+        self.check_datasources()
+    
+    def _index_in_catalog(self, paths=(), root=None):
+        """Add opened or saved files (or a whole folder) to the catalog in the background"""
+        if self.catalog is None or not (paths or root):
+            return
+        task = CatalogIndexTask(self.catalog.path, paths, root)
+        task.done.connect(self._on_catalog_indexed)
+        self._catalog_tasks.append(task)
+        QgsApplication.taskManager().addTask(task)
+    
+    def _on_catalog_indexed(self, task, ok):
+        if task in self._catalog_tasks:
+            self._catalog_tasks.remove(task)
+        if task.error:
+            self.iface.messageBar().pushMessage(
+                "Multi Project", f"{tr('Catalog')}: {task.error}", Qgis.Warning, 5
+            )
+        elif task.root:
+            self.iface.messageBar().pushMessage(
+                "Multi Project", tr("{0} projects indexed").format(task.indexed), Qgis.Success, 3
+            )
+    
+    def scan_folder_into_catalog(self):
+        folder = QFileDialog.getExistingDirectory(self, tr("Add folder to catalog..."))
+        if folder:
+            self._index_in_catalog(root=folder)
+    
+    def open_catalog_result(self, path, key):
+        """Open a catalog hit in a new tab: a project file, or one project of a workspace"""
+        if not os.path.exists(path):
+            QMessageBox.warning(self, tr("Error"), f"{tr('Cannot open')}:\n{path}")
+            return
+        
+        if Path(path).suffix.lower() in ProjectCatalog.PROJECT_SUFFIXES:
+            opened = next((i for i, p in enumerate(self.projects) if path in (p.origin_file, p.saved_file)), None)
+            if opened is not None:
+                self._switch_to(opened)
+            else:
+                self.open_projects([path])
+            return
+        
+        try:
+            proj = self._project_from_workspace(path, key)
+        except (OSError, ValueError, KeyError, IndexError, TypeError, sqlite3.Error) as e:
+            QMessageBox.warning(self, tr("Error"), f"{tr('Cannot open')}:\n{e}")
+            return
+        
+        self.projects.append(proj)
+        self._refresh_list()
+        self._switch_to(len(self.projects) - 1)
+        self.render_scheduler.request(proj)
+    
+    def _project_from_workspace(self, path, key):
+        proj = ProjectTab(tr('Project'), self.temp_dir, self.store, self.bookmark_index)
+        if path.lower().endswith(WorkspaceDatabase.SUFFIX):
+            db = WorkspaceDatabase(path)
+            try:
+                db.load_project(int(key), proj, self.store, 0)
+            finally:
+                db.close()
+            return proj
+        
+        with open(path, 'r') as f:
+            data = json.load(f)['projects'][int(key)]
+        proj.from_dict(data)
+        ws_dir = WorkspaceDatabase.chunk_folder(path)
+        if data.get('snapshot') and ws_dir.is_dir():
+            proj.snapshot = self.store.import_manifest(data['snapshot'], SnapshotStore.on_disk(str(ws_dir)))
+        return proj
     
     def save_current(self):
         if self.current_index < 0:
@@ -1350,13 +7475,134 @@ class MultiProjectDock(QDockWidget):
                 proj.name = Path(file_path).stem
                 proj.is_modified = False
                 self._refresh_list()
+                self._index_in_catalog([file_path])
                 self.iface.messageBar().pushMessage(
                     "Multi Project", f"{tr('Saved')}: {file_path}", Qgis.Success, 2
                 )
     
+    def _on_project_file_changed(self, path, change):
+        """A saved file was changed elsewhere: swap in the new content where it is safe"""
+        manifest = change['manifest']
+        metadata = change['metadata']
+        reloaded = []
+        for proj in [p for p in self.projects if p.saved_file and os.path.abspath(p.saved_file) == path]:
+            active = self._is_active(proj)
+            if (active or proj.is_modified) and not self._confirm_external_reload(proj, change['diff']):
+                # Keeping the local version: saving it will overwrite the file knowingly
+                proj.is_modified = True
+                continue
+            
+            self.store.retain(manifest)
+            if active:
+                # Keep the current view, reload the layers
+                proj.capture_metadata(self.project, self.canvas)
+                proj.set_snapshot(manifest)
+                self._switching = True
+                proj.restore_state(self.project, self.canvas, self.iface)
+                self._switching = False
+            else:
+                proj.set_snapshot(manifest)
+                proj.layer_count = len(metadata.get('layers', []))
+            proj.is_modified = False
+            self.render_scheduler.request(proj)
+            reloaded.append(proj.name)
+        self.store.release(manifest)
+        
+        self._refresh_list()
+        if reloaded:
+            self._index_in_catalog([path])
+            self.check_datasources()
+            self.iface.messageBar().pushMessage(
+                "Multi Project", tr("Reloaded after an external change: {0}").format(", ".join(reloaded)),
+                Qgis.Info, 4
+            )
+    
+    def _confirm_external_reload(self, proj, diff):
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Question)
+        box.setWindowTitle(tr("Project changed on disk"))
+        box.setText(tr("{0} was changed by another program.").format(proj.name))
+        summary = tr("{0} layers added, {1} removed, {2} changed.").format(
+            len(diff['added']), len(diff['removed']), len(diff['modified'])
+        )
+        if proj.is_modified:
+            summary += "\n" + tr("Your unsaved changes to this project will be lost.")
+        box.setInformativeText(summary)
+        details = (
+            [f"+ {name}" for name in diff['added']] +
+            [f"- {name}" for name in diff['removed']] +
+            [f"* {name}" for name in diff['modified']]
+        )
+        if details:
+            box.setDetailedText("\n".join(details))
+        button_reload = box.addButton(tr("Reload"), QMessageBox.AcceptRole)
+        box.addButton(tr("Keep my version"), QMessageBox.RejectRole)
+        box.exec_()
+        return box.clickedButton() is button_reload
+    
+    # Uploads to network shares
+    
+    def _update_sync_button(self):
+        pending = self.share_cache.pending()
+        self.sync_button.setVisible(bool(pending))
+        if not pending:
+            return
+        labels = {
+            'pending': tr("Waiting"),
+            'uploading': tr("Uploading"),
+            'conflict': tr("Changed on the share"),
+            'failed': tr("Upload failed"),
+        }
+        conflicts = sum(1 for _path, state, _error in pending if state in ('conflict', 'failed'))
+        text = tr("{0} to sync").format(len(pending))
+        if conflicts:
+            text += f" ({tr('{0} need attention').format(conflicts)})"
+        self.sync_button.setText(text)
+        self.sync_button.setToolTip("\n".join(
+            f"{path}: {labels[state]}" + (f" - {error}" if error else "")
+            for path, state, error in pending
+        ))
+    
+    def resolve_pending_syncs(self):
+        """Ask about conflicting uploads and retry failed ones"""
+        for path, state, _error in self.share_cache.pending():
+            if state == 'conflict':
+                self._on_share_conflict(path)
+            elif state == 'failed':
+                self.share_cache.retry(path)
+    
+    def _on_share_uploaded(self, path):
+        self._index_in_catalog([path])
+        self.iface.messageBar().pushMessage(
+            "Multi Project", f"{tr('Uploaded')}: {path}", Qgis.Success, 2
+        )
+    
+    def _on_share_failed(self, path, error):
+        self.iface.messageBar().pushMessage(
+            "Multi Project", f"{tr('Upload failed, retrying later')}: {path}\n{error}", Qgis.Warning, 5
+        )
+    
+    def _on_share_conflict(self, path):
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Warning)
+        box.setWindowTitle(tr("Workspace changed on the share"))
+        box.setText(tr("{0} was changed by someone else since you opened or saved it.").format(path))
+        box.setInformativeText(tr("Your version is kept locally until you decide."))
+        button_overwrite = box.addButton(tr("Overwrite"), QMessageBox.DestructiveRole)
+        button_discard = box.addButton(tr("Keep their version"), QMessageBox.RejectRole)
+        box.addButton(tr("Decide later"), QMessageBox.NoRole)
+        box.exec_()
+        if box.clickedButton() is button_overwrite:
+            self.share_cache.overwrite(path)
+        elif box.clickedButton() is button_discard:
+            self.share_cache.discard(path)
+    
     def _save_current_state(self):
         if 0 <= self.current_index < len(self.projects):
-            self.projects[self.current_index].capture_state(self.project, self.canvas)
+            proj = self.projects[self.current_index]
+            proj.capture_state(self.project, self.canvas)
+            self.render_scheduler.request(proj)
+            self._schedule_db_sync()
     
     def _on_modified(self, *args):
         if self._switching:
@@ -1367,12 +7613,11 @@ class MultiProjectDock(QDockWidget):
             proj.is_modified = True
             proj.layer_count = len(self.project.mapLayers())
             self._refresh_list()
+            self.render_scheduler.request(proj)
     
     def _refresh_current_thumbnail(self):
         if 0 <= self.current_index < len(self.projects):
-            proj = self.projects[self.current_index]
-            proj.thumbnail = ThumbnailGenerator.generate(self.project, self.canvas)
-            self._refresh_list()
+            self.render_scheduler.request(self.projects[self.current_index])
     
     def _show_context_menu(self, pos):
         item = self.project_list.itemAt(pos)
@@ -1407,6 +7652,23 @@ class MultiProjectDock(QDockWidget):
         
         menu.addSeparator()
         
+        if index != self.current_index:
+            selected = self.iface.layerTreeView().selectedLayers()
+            action_copy_layers = menu.addAction(tr("Copy selected layers here"))
+            action_copy_layers.triggered.connect(lambda: self.send_layers(index, selected, move=False))
+            action_copy_layers.setEnabled(bool(selected))
+            action_move_layers = menu.addAction(tr("Move selected layers here"))
+            action_move_layers.triggered.connect(lambda: self.send_layers(index, selected, move=True))
+            action_move_layers.setEnabled(bool(selected))
+            menu.addSeparator()
+        
+        action_linked = menu.addAction(tr("Linked navigation"))
+        action_linked.setCheckable(True)
+        action_linked.setChecked(proj.linked)
+        action_linked.triggered.connect(lambda: self._toggle_linked(index))
+        
+        menu.addSeparator()
+        
         if proj.saved_file:
             action_show = menu.addAction(tr("Show in Explorer"))
             action_show.triggered.connect(lambda: self._show_in_explorer(proj.saved_file))
@@ -1418,6 +7680,76 @@ class MultiProjectDock(QDockWidget):
         
         menu.exec_(self.project_list.mapToGlobal(pos))
     
+    def _on_layers_dropped(self, index, layer_ids, move):
+        layers = [self.project.mapLayer(layer_id) for layer_id in layer_ids]
+        self.send_layers(index, [layer for layer in layers if layer is not None], move)
+    
+    def send_layers(self, index, layers, move=False):
+        """Copy (or move) live layers of the current project into a stored project
+        
+        The receiving snapshot is patched in place; layers that vector joins
+        depend on are copied along so the joins still resolve.
+        """
+        if not layers or index == self.current_index or not 0 <= index < len(self.projects):
+            return
+        
+        proj = self.projects[index]
+        if proj.snapshot:
+            base = proj.snapshot
+            self.store.retain(base)
+        elif proj.origin_file and os.path.exists(proj.origin_file):
+            base = self.store.ingest(proj.origin_file)
+        else:
+            self.iface.messageBar().pushMessage(
+                "Multi Project", tr("{0} has no stored state yet: activate it once first").format(proj.name),
+                Qgis.Warning, 4
+            )
+            return
+        
+        entries = [LayerTransfer.serialize(self.project, layer)
+                   for layer in LayerTransfer.with_join_layers(self.project, layers)]
+        added = []
+        
+        def patch(xml_data):
+            xml_data, ids = LayerTransfer.insert(xml_data, entries)
+            # Never store a document QGIS could not read back
+            ET.fromstring(xml_data)
+            added.extend(ids)
+            return xml_data
+        
+        try:
+            patched = self.store.patch_xml(base, patch)
+        except (OSError, ValueError, ET.ParseError) as e:
+            self.iface.messageBar().pushMessage(
+                "Multi Project", f"{tr('Cannot transfer layers')}: {e}", Qgis.Warning, 4
+            )
+            return
+        finally:
+            self.store.release(base)
+        
+        if not added:
+            self.store.release(patched)
+            self.iface.messageBar().pushMessage(
+                "Multi Project", tr("The layers are already in {0}").format(proj.name), Qgis.Info, 3
+            )
+            return
+        
+        proj.set_snapshot(patched)
+        proj.layer_count += len(added)
+        proj.is_modified = True
+        
+        if move:
+            self.project.removeMapLayers([layer.id() for layer in layers])
+        
+        self._refresh_list()
+        self.render_scheduler.request(proj)
+        self._schedule_db_sync()
+        
+        message = tr("{0} layers moved to {1}") if move else tr("{0} layers copied to {1}")
+        self.iface.messageBar().pushMessage(
+            "Multi Project", message.format(len(added), proj.name), Qgis.Info, 3
+        )
+    
     def _rename_project(self, index):
         if index < 0 or index >= len(self.projects):
             return
@@ -1438,20 +7770,10 @@ class MultiProjectDock(QDockWidget):
         source = self.projects[index]
         
         if index == self.current_index:
-            source.capture_state(self.project, self.canvas)
+            self._save_current_state()
         
         new_name = f"{source.name} ({tr('copy')})"
-        proj = ProjectTab(new_name, self.temp_dir)
-        proj.extent = source.extent.copy() if source.extent else None
-        proj.crs = source.crs
-        proj.layer_count = source.layer_count
-        proj.bookmarks = [
-            ProjectBookmark(b.name, b.extent.copy(), b.crs) 
-            for b in source.bookmarks
-        ]
-        
-        if os.path.exists(source.temp_file):
-            shutil.copy(source.temp_file, proj.temp_file)
+        proj = source.copy(new_name, self.bookmark_index)
         
         self.projects.insert(index + 1, proj)
         self._refresh_list()
@@ -1494,8 +7816,12 @@ class MultiProjectDock(QDockWidget):
             elif reply == QMessageBox.Cancel:
                 return
         
-        proj.cleanup()
+        self.render_scheduler.cancel(proj)
+        self.preview_queue.forget(proj)
+        if index == self.current_index:
+            proj.capture_state(self.project, self.canvas)
         self.projects.pop(index)
+        self.trash.add(proj, index)
         
         if index < self.current_index:
             self.current_index -= 1
@@ -1508,6 +7834,10 @@ class MultiProjectDock(QDockWidget):
         
         self._refresh_list()
         self._update_nav_buttons()
+        
+        self.iface.messageBar().pushMessage(
+            "Multi Project", f"{tr('Closed')}: {proj.name} ({tr('Ctrl+Shift+T to reopen')})", Qgis.Info, 3
+        )
     
     def close_others(self):
         if len(self.projects) <= 1:
@@ -1525,12 +7855,76 @@ class MultiProjectDock(QDockWidget):
         
         for i, proj in enumerate(self.projects):
             if i != self.current_index:
-                proj.cleanup()
+                self.render_scheduler.cancel(proj)
+                self.preview_queue.forget(proj)
+                self.trash.add(proj, i)
         
         self.projects = [current]
         self.current_index = 0
         self._refresh_list()
     
+    def _setup_switcher(self):
+        self.switcher = ProjectSwitcher(self)
+        self.switcher.chosen.connect(self._on_switcher_chosen)
+        
+        action_next = QAction(tr("Switch project"), self)
+        action_next.setShortcut("Ctrl+Tab")
+        action_next.triggered.connect(lambda: self.show_switcher(1))
+        self.addAction(action_next)
+        
+        action_previous = QAction(tr("Switch project backwards"), self)
+        action_previous.setShortcut("Ctrl+Shift+Tab")
+        action_previous.triggered.connect(lambda: self.show_switcher(-1))
+        self.addAction(action_previous)
+    
+    def show_switcher(self, step=1):
+        """Cycle through projects by recent use; the choice is only loaded on release"""
+        if len(self.projects) < 2:
+            return
+        if self.switcher.isVisible():
+            self.switcher.step(step)
+        else:
+            self.switcher.open(self.projects, self.current_index, step)
+    
+    def _on_switcher_chosen(self, proj):
+        if proj in self.projects:
+            self._switch_to(self.projects.index(proj))
+    
+    def _fill_closed_menu(self):
+        menu = self.closed_menu
+        menu.clear()
+        self.trash.evict()
+        for row in range(len(self.trash) - 1, -1, -1):
+            proj = self.trash.entries[row][2]
+            action = menu.addAction(QIcon(proj.thumbnail) if proj.thumbnail else QIcon(), proj.name)
+            action.triggered.connect(lambda _checked=False, r=row: self.reopen_closed_project(r))
+        if not len(self.trash):
+            menu.addAction(tr("No closed projects")).setEnabled(False)
+    
+    def _trash_size(self, proj):
+        """What a closed project holds: its memory without the snapshot, plus the snapshot as stored"""
+        usage = self.memory_budget.usage(proj)
+        return usage['total'] - usage['snapshot'] + proj.store.stored_size(proj.snapshot)
+    
+    def reopen_closed_project(self, row=-1):
+        """Bring back a closed project as it was, next to where it used to be"""
+        if not len(self.trash):
+            return
+        
+        proj, position = self.trash.pop(row)
+        self.trash.evict()
+        proj.bookmarks.set_index(self.bookmark_index)
+        proj.last_used = time.monotonic()
+        position = min(position, len(self.projects))
+        self.projects.insert(position, proj)
+        if position <= self.current_index:
+            self.current_index += 1
+        self._switch_to(position)
+        if proj.thumbnail is None:
+            self.render_scheduler.request(proj)
+        
+        self.iface.messageBar().pushMessage("Multi Project", f"{tr('Reopened')}: {proj.name}", Qgis.Info, 2)
+    
     def _show_in_explorer(self, file_path):
         import subprocess
         import platform
@@ -1542,10 +7936,32 @@ class MultiProjectDock(QDockWidget):
         else:
             subprocess.run(["xdg-open", os.path.dirname(file_path)])
     
+    WORKSPACE_FILTERS = "Multi Project Workspace (*.mpw);;Multi Project Workspace database (*.mpdb)"
+    
+    def _schedule_db_sync(self):
+        if self.workspace_db:
+            self._db_timer.start()
+    
+    def _sync_workspace_db(self):
+        if not self.workspace_db:
+            return
+        try:
+            self.workspace_db.sync(self.projects, self.current_index)
+        except sqlite3.Error as e:
+            self.iface.messageBar().pushMessage(
+                "Multi Project", f"{tr('Cannot save')}: {e}", Qgis.Warning, 5
+            )
+    
+    def _bind_workspace_db(self, db):
+        """Make db the workspace that follows every change (None to stop)"""
+        self._db_timer.stop()
+        if self.workspace_db:
+            self.workspace_db.close()
+        self.workspace_db = db
+    
     def save_workspace(self):
-        file_path, _ = QFileDialog.getSaveFileName(
-            self, tr("Save workspace"), "",
-            "Multi Project Workspace (*.mpw)"
+        file_path, selected = QFileDialog.getSaveFileName(
+            self, tr("Save workspace"), "", self.WORKSPACE_FILTERS
         )
         
         if not file_path:
@@ -1553,91 +7969,193 @@ class MultiProjectDock(QDockWidget):
         
         self._save_current_state()
         
-        ws_dir = Path(file_path).parent / (Path(file_path).stem + "_projects")
-        ws_dir.mkdir(exist_ok=True)
+        if file_path.lower().endswith(WorkspaceDatabase.SUFFIX) or (
+                not file_path.lower().endswith(".mpw") and "mpdb" in selected):
+            self._save_workspace_db(file_path)
+            return
         
-        workspace = {
-            'version': '7.0',
-            'current': self.current_index,
-            'projects': []
-        }
+        # On a share the workspace is written locally first and uploaded after
+        staged = self.share_cache.staging_path(file_path) if self.share_cache.is_remote(file_path) else None
+        ws_dir = WorkspaceTool.write_mpw(staged or file_path, self.projects, self.current_index)
+        self.preview_cache.export_to(str(ws_dir / "previews"), [proj.revision() for proj in self.projects])
+        if staged:
+            self.share_cache.upload(file_path, staged)
+            self.iface.messageBar().pushMessage(
+                "Multi Project", f"{tr('Workspace saved, uploading in the background')}: {file_path}", Qgis.Info, 3
+            )
+            return
+        self._index_in_catalog([file_path])
         
-        for i, proj in enumerate(self.projects):
-            proj_file = ws_dir / f"{proj.name.replace(' ', '_')}_{i}.qgz"
-            
-            if i == self.current_index:
-                self.project.write(str(proj_file))
-            else:
-                shutil.copy(proj.temp_file, str(proj_file))
-            
-            proj_data = proj.to_dict()
-            proj_data['workspace_file'] = str(proj_file)
-            workspace['projects'].append(proj_data)
+        self.iface.messageBar().pushMessage(
+            "Multi Project", f"{tr('Workspace saved')}: {file_path}", Qgis.Success, 3
+        )
+    
+    def _save_workspace_db(self, file_path):
+        if not file_path.lower().endswith(WorkspaceDatabase.SUFFIX):
+            file_path += WorkspaceDatabase.SUFFIX
         
-        with open(file_path, 'w') as f:
-            json.dump(workspace, f, indent=2)
+        if self.workspace_db and os.path.abspath(self.workspace_db.path) == os.path.abspath(file_path):
+            db = self.workspace_db
+        else:
+            self._bind_workspace_db(None)
+            try:
+                WorkspaceDatabase.remove(file_path)
+                db = WorkspaceDatabase(file_path)
+            except (OSError, sqlite3.Error) as e:
+                QMessageBox.critical(self, tr("Error"), f"{tr('Cannot save')}:\n{e}")
+                return
+            self.workspace_db = db
+        
+        self._db_timer.stop()
+        try:
+            db.sync(self.projects, self.current_index)
+            for proj in self.projects:
+                db.save_thumbnail(proj, proj.thumbnail.toImage() if proj.thumbnail else None)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, tr("Error"), f"{tr('Cannot save')}:\n{e}")
+            return
+        self._index_in_catalog([file_path])
         
         self.iface.messageBar().pushMessage(
             "Multi Project", f"{tr('Workspace saved')}: {file_path}", Qgis.Success, 3
         )
     
+    def _clear_projects(self):
+        """Drop every open project before loading a workspace"""
+        self._bind_workspace_db(None)
+        self.render_scheduler.clear()
+        self.preview_queue.clear()
+        for proj in self.projects:
+            proj.cleanup()
+        self.projects.clear()
+    
+    def _activate_loaded(self, current):
+        if current >= len(self.projects):
+            current = 0
+        
+        self.current_index = current
+        self._switching = True
+        if self.projects:
+            self.projects[current].restore_state(self.project, self.canvas, self.iface)
+            self.bookmark_widget.set_project(self.projects[current])
+        self._switching = False
+        
+        self._refresh_list()
+        self._update_nav_buttons()
+        
+        for proj in self.projects:
+            if proj.thumbnail is None or self._is_active(proj):
+                self.render_scheduler.request(proj)
+    
     def load_workspace(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, tr("Load workspace"), "",
-            "Multi Project Workspace (*.mpw)"
+            "Multi Project Workspace (*.mpw *.mpdb);;" + self.WORKSPACE_FILTERS
         )
         
         if not file_path:
             return
         
+        if file_path.lower().endswith(WorkspaceDatabase.SUFFIX):
+            self._load_workspace_db(file_path)
+            return
+        
+        # A save still waiting for upload is newer than what the share holds
+        staged = self.share_cache.staged_file(file_path)
         try:
-            with open(file_path, 'r') as f:
+            with open(staged or self.share_cache.fetch(file_path), 'r') as f:
                 workspace = json.load(f)
         except Exception as e:
             QMessageBox.critical(self, tr("Error"), f"{tr('Cannot load')}:\n{e}")
             return
         
-        for proj in self.projects:
-            proj.cleanup()
-        self.projects.clear()
+        self._clear_projects()
+        
+        # Chunks are only read from the share when the local store lacks them
+        ws_dir = WorkspaceDatabase.chunk_folder(staged or file_path)
+        ws_store = SnapshotStore.on_disk(str(ws_dir)) if ws_dir.is_dir() else None
+        self.preview_cache.import_from(str(ws_dir / "previews"))
         
         for proj_data in workspace.get('projects', []):
             name = proj_data.get('name', tr('Project'))
-            proj = ProjectTab(name, self.temp_dir)
+            proj = ProjectTab(name, self.temp_dir, self.store, self.bookmark_index)
             proj.from_dict(proj_data)
             
+            manifest = proj_data.get('snapshot')
             source = proj_data.get('workspace_file')
-            if source and os.path.exists(source):
-                shutil.copy(source, proj.temp_file)
+            if manifest and ws_store:
+                try:
+                    proj.snapshot = self.store.import_manifest(manifest, ws_store)
+                except OSError:
+                    proj.snapshot = None
+            elif source and os.path.exists(source):
+                proj.snapshot = self.store.ingest(source)
+            proj.thumbnail = WorkspaceTool.load_mpw_thumbnail(ws_dir, proj.revision())
             
             self.projects.append(proj)
         
-        current = workspace.get('current', 0)
-        if current >= len(self.projects):
-            current = 0
+        self._activate_loaded(workspace.get('current', 0))
+        self.check_datasources()
+        self._index_in_catalog([file_path])
         
-        self.current_index = current
-        self._switching = True
-        if self.projects:
-            self.projects[current].restore_state(self.project, self.canvas, self.iface)
-            self.bookmark_widget.set_project(self.projects[current])
-        self._switching = False
+        self.iface.messageBar().pushMessage(
+            "Multi Project", f"{tr('Workspace loaded')}: {file_path}", Qgis.Success, 3
+        )
+    
+    def _load_workspace_db(self, file_path):
+        try:
+            db = WorkspaceDatabase(file_path)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, tr("Error"), f"{tr('Cannot load')}:\n{e}")
+            return
         
-        self._refresh_list()
-        self._update_nav_buttons()
+        # The open projects are only dropped once the whole workspace is read
+        projects = []
+        try:
+            for position, (project_id, name, _layer_count) in enumerate(db.projects()):
+                proj = ProjectTab(name, self.temp_dir, self.store, self.bookmark_index)
+                projects.append(proj)
+                db.load_project(project_id, proj, self.store, position)
+        except Exception as e:
+            db.close()
+            for proj in projects:
+                proj.cleanup()
+            QMessageBox.critical(self, tr("Error"), f"{tr('Cannot load')}:\n{e}")
+            return
+        
+        self._clear_projects()
+        self.projects.extend(projects)
+        self.workspace_db = db
+        self._activate_loaded(db.current())
+        self.check_datasources()
+        self._index_in_catalog([file_path])
         
         self.iface.messageBar().pushMessage(
             "Multi Project", f"{tr('Workspace loaded')}: {file_path}", Qgis.Success, 3
         )
     
     def cleanup(self):
+        self.file_watcher.stop()
+        self.share_cache.stop()
+        self.templates.close()
+        self._memory_timer.stop()
+        self._health_timer.stop()
+        if self._health_task is not None:
+            self._health_task.cancel()
+        for task in self._catalog_tasks:
+            task.cancel()
+        if self.catalog:
+            self.catalog.close()
+        if self.workspace_db:
+            self._sync_workspace_db()
+        self._bind_workspace_db(None)
+        self.render_scheduler.clear()
+        self.preview_queue.clear()
         for proj in self.projects:
             proj.cleanup()
+        self.trash.clear()
         
-        try:
-            shutil.rmtree(self.temp_dir)
-        except:
-            pass
+        self.session.cleanup()
 
 
 class MultiProjectCanvasPlugin:
@@ -1713,3 +8231,106 @@ class MultiProjectCanvasPlugin:
     
     def _on_visibility_changed(self, visible):
         self.action.setChecked(visible)
+
+
+def main(argv=None):
+    """Command line entry point: python multi_project_canvas.py <command> ..."""
+    parser = argparse.ArgumentParser(
+        prog="multi_project_canvas", description="Build, inspect and maintain Multi Project workspaces"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    build = commands.add_parser("build", help="create a workspace from a folder of projects")
+    build.add_argument("workspace", help="workspace to create (.mpw or .mpdb)")
+    build.add_argument("folder", help="folder holding .qgs/.qgz projects")
+    build.add_argument("--no-recursive", action="store_true", help="ignore subfolders")
+    build.add_argument("--jobs", type=int, default=None, help="parallel parsing jobs")
+    build.add_argument("--thumbnails", action="store_true", help="also render thumbnails")
+    build.add_argument("--index", action="store_true", help="also add to the project catalog")
+    
+    listing = commands.add_parser("list", help="list the projects of a workspace")
+    listing.add_argument("workspace")
+    listing.add_argument("--layers", action="store_true", help="include layer names")
+    listing.add_argument("--json", action="store_true", help="print JSON")
+    
+    thumbnails = commands.add_parser("thumbnails", help="pre-render project thumbnails")
+    thumbnails.add_argument("workspace")
+    thumbnails.add_argument("--size", default="180x120", help="WIDTHxHEIGHT in pixels")
+    
+    index = commands.add_parser("index", help="add a workspace to the project catalog")
+    index.add_argument("workspace")
+    index.add_argument("--catalog", default=None, help="catalog database (default: the QGIS profile one)")
+    
+    verify = commands.add_parser("verify", help="check that every snapshot chunk is present and intact")
+    verify.add_argument("workspace")
+    
+    convert = commands.add_parser("convert", help="convert a .mpw workspace to .mpdb or back")
+    convert.add_argument("source", help="workspace to read (.mpw or .mpdb)")
+    convert.add_argument("target", help="workspace to write, of the other kind")
+    
+    compact = commands.add_parser("compact", help="drop orphaned data and recompress snapshots")
+    compact.add_argument("workspace")
+    compact.add_argument("--no-recompress", action="store_true", help="only drop orphaned data")
+    
+    args = parser.parse_args(argv)
+    
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QgsApplication([], False)
+    app.initQgis()
+    try:
+        return _run_command(args)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        app.exitQgis()
+
+
+def _run_command(args):
+    def report(done, total, name):
+        print(f"[{done}/{total}] {name}", file=sys.stderr)
+    
+    if args.command == "build":
+        count = WorkspaceTool.build(
+            args.workspace, args.folder, not args.no_recursive, args.jobs, report
+        )
+        print(f"{count} projects written to {args.workspace}")
+        tool = WorkspaceTool(args.workspace)
+        if args.thumbnails:
+            print(f"{tool.render_thumbnails(progress=report)} thumbnails rendered")
+        if args.index:
+            tool.index()
+    elif args.command == "list":
+        projects = WorkspaceTool(args.workspace).list(args.layers)
+        if args.json:
+            print(json.dumps(projects, indent=2))
+            return 0
+        for entry in projects:
+            print(f"{entry['name']}\t{entry['layers']} layers\t{entry['bookmarks']} bookmarks\t"
+                  f"{entry['crs'] or ''}\t{entry['saved_file'] or ''}")
+            for name in entry.get('layer_names', []):
+                print(f"    {name}")
+    elif args.command == "thumbnails":
+        width, _x, height = args.size.lower().partition("x")
+        size = QSize(int(width), int(height or width))
+        count = WorkspaceTool(args.workspace).render_thumbnails(size, report)
+        print(f"{count} thumbnails rendered")
+    elif args.command == "index":
+        WorkspaceTool(args.workspace).index(args.catalog)
+    elif args.command == "verify":
+        problems = WorkspaceTool(args.workspace).verify()
+        for problem in problems:
+            print(problem)
+        print("ok" if not problems else f"{len(problems)} problems found")
+        return 1 if problems else 0
+    elif args.command == "convert":
+        WorkspaceTool.convert(args.source, args.target)
+        print(f"{args.source} converted to {args.target}")
+    elif args.command == "compact":
+        saved = WorkspaceTool(args.workspace).compact(not args.no_recompress)
+        print(f"{format_size(max(0, saved))} reclaimed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())